@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Bulk UPDATE throughput with row-level vs statement-level audit triggers
+
+Creates --trees benchmark trees with one stem each, then for each trigger mode
+times bulk UPDATEs of audited fields and counts the AuditLog rows they wrote:
+  row        shared.audit_update_trigger FOR EACH ROW (17-audit-functions.sql)
+  statement  shared.audit_update_statement_trigger over transition tables
+             (25-statement-level-audit.sql)
+
+Everything runs in one transaction that is rolled back at the end, including the
+trigger swaps, so the database is left as it was. Needs the full schema from
+docker compose (DB_* variables) and a role that may create triggers.
+
+Usage:
+  python benchmarks/bench_audit.py                     # 50,000 trees, both modes
+  python benchmarks/bench_audit.py --trees 200000 --repeat 3 --json audit.json
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import psycopg2
+
+AUDITED_TABLES = {
+    "trigger_trees_audit": "trees.Trees",
+    "trigger_stems_audit": "trees.Stems",
+    "trigger_environments_audit": "environments.Environments",
+    "trigger_pointclouds_audit": "pointclouds.PointClouds",
+}
+
+TRIGGER_MODES = {
+    "row": "AFTER UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION shared.audit_update_trigger()",
+    "statement": (
+        "AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION shared.audit_update_statement_trigger()"
+    ),
+}
+
+# Each update changes every audited value it touches, so each row yields an audit row per field
+UPDATES = {
+    "trees": (
+        """
+        UPDATE trees.Trees
+        SET Height_m = Height_m + 0.5, HealthScore = 1 - HealthScore
+        WHERE LocationID = %(location_id)s
+    """,
+        2,
+    ),
+    "stems": (
+        """
+        UPDATE trees.Stems s SET DBH_cm = s.DBH_cm + 1
+        FROM trees.Trees t
+        WHERE t.VariantID = s.TreeVariantID AND t.LocationID = %(location_id)s
+    """,
+        1,
+    ),
+}
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.environ.get("DB_HOST", "localhost"),
+        port=os.environ.get("DB_PORT", "5432"),
+        database=os.environ.get("DB_NAME", "postgres"),
+        user=os.environ.get("DB_USER", "postgres"),
+        password=os.environ.get("DB_PASSWORD", "postgres"),
+    )
+
+
+def create_trees(cur, count: int) -> int:
+    cur.execute(
+        """
+        INSERT INTO shared.Locations (LocationName, Description)
+        VALUES ('Audit_Bench', 'Audit trigger benchmark (rolled back)')
+        RETURNING LocationID
+    """
+    )
+    location_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO trees.Trees (LocationID, VariantTypeID, Height_m, HealthScore, Position)
+        SELECT %(location_id)s,
+               (SELECT VariantTypeID FROM shared.VariantTypes WHERE VariantTypeName = 'original'),
+               10 + (i %% 300) / 10.0,
+               (i %% 100) / 100.0,
+               extensions.ST_SetSRID(extensions.ST_MakePoint(8.0 + i * 1e-6, 48.0), 4326)
+        FROM generate_series(1, %(count)s) AS i
+    """,
+        {"location_id": location_id, "count": count},
+    )
+    cur.execute(
+        """
+        INSERT INTO trees.Stems (TreeVariantID, StemNumber, DBH_cm, StemHeight_m)
+        SELECT VariantID, 1, 20 + VariantID %% 40, Height_m
+        FROM trees.Trees WHERE LocationID = %s
+    """,
+        (location_id,),
+    )
+    return location_id
+
+
+def use_triggers(cur, mode: str):
+    for trigger, table in AUDITED_TABLES.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        cur.execute(f"CREATE TRIGGER {trigger} " + TRIGGER_MODES[mode].format(table=table))
+
+
+def audit_rows(cur) -> int:
+    cur.execute("SELECT COUNT(*) FROM shared.AuditLog")
+    return cur.fetchone()[0]
+
+
+def bench_mode(cur, mode: str, location_id: int, repeat: int) -> List[Dict]:
+    results = []
+    for name, (sql, fields) in UPDATES.items():
+        best = None
+        for _ in range(repeat):
+            cur.execute("SAVEPOINT bench")
+            use_triggers(cur, mode)
+            before = audit_rows(cur)
+            started = time.perf_counter()
+            cur.execute(sql, {"location_id": location_id})
+            seconds = time.perf_counter() - started
+            updated = cur.rowcount
+            logged = audit_rows(cur) - before
+            cur.execute("ROLLBACK TO SAVEPOINT bench")
+            if best is None or seconds < best["seconds"]:
+                best = {
+                    "benchmark": f"{mode}:{name}",
+                    "rows": updated,
+                    "audit_rows": logged,
+                    "expected_audit_rows": updated * fields,
+                    "seconds": round(seconds, 3),
+                    "rows_per_second": round(updated / seconds, 1) if seconds else 0.0,
+                }
+        print(
+            f"{best['benchmark']:<18} {best['rows']:>10,} rows {best['audit_rows']:>10,} audit rows "
+            f"{best['seconds']:>8.2f}s {best['rows_per_second']:>12,.1f} rows/s"
+        )
+        if best["audit_rows"] != best["expected_audit_rows"]:
+            print(f"  expected {best['expected_audit_rows']:,} audit rows")
+        results.append(best)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit trigger bulk UPDATE benchmark")
+    parser.add_argument("--trees", type=int, default=50000, help="Benchmark trees (one stem each)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per update; the best is kept")
+    parser.add_argument(
+        "--mode",
+        choices=["all", *TRIGGER_MODES],
+        default="all",
+        help="Which trigger mode to benchmark",
+    )
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    conn = connect()
+    results = []
+    try:
+        with conn.cursor() as cur:
+            location_id = create_trees(cur, args.trees)
+            print(f"{args.trees:,} trees with one stem each (rolled back afterwards)")
+            modes = list(TRIGGER_MODES) if args.mode == "all" else [args.mode]
+            for mode in modes:
+                results.extend(bench_mode(cur, mode, location_id, args.repeat))
+    finally:
+        conn.rollback()
+        conn.close()
+
+    by_name = {r["benchmark"]: r for r in results}
+    for name in UPDATES:
+        row, statement = by_name.get(f"row:{name}"), by_name.get(f"statement:{name}")
+        if row and statement and statement["seconds"]:
+            print(f"{name}: statement-level is {row['seconds'] / statement['seconds']:.1f}x faster")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+End-to-end sync benchmarks against the local fakes and a local Postgres
+
+Measures points per second for:
+  service   EcosenseSync.sync_readings (services/ecosense-sync), cold and warm run
+  stage1    ecosense_sync.py Aquarius -> local DB
+  stage2    ecosense_sync.py local DB -> production proxy
+
+Points are counted as parsed by the service (ecosense_points_parsed_total), as new
+local rows for stage 1 and as points accepted by the fake proxy for stage 2.
+
+The service benchmark needs the full schema (docker compose database, DB_* variables).
+The script benchmarks use LOCAL_DB_* and create ecosense.timeseries_data if missing.
+Benchmark sensors live under Ecosense_Bench_* locations; --cleanup removes them.
+
+Usage:
+  python benchmarks/bench_sync.py                          # All targets, 100 series, 7 days
+  python benchmarks/bench_sync.py --target service --series 500 --latency-ms 30
+  python benchmarks/bench_sync.py --rate-limit 20 --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import psycopg2
+
+from fake_servers import add_config_arguments, config_from_args, series_descriptions, start_servers
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOCAL_TABLE_DDL = """
+CREATE SCHEMA IF NOT EXISTS ecosense;
+CREATE TABLE IF NOT EXISTS ecosense.timeseries_data (
+    id BIGSERIAL PRIMARY KEY,
+    timeseries_id TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    value DOUBLE PRECISION,
+    parameter TEXT,
+    sensor_label TEXT,
+    location_identifier TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (timeseries_id, timestamp)
+);
+"""
+
+
+def configure_environment(aquarius_url: str, proxy_url: str, unthrottled: bool):
+    """Point both sync implementations at the fakes"""
+    os.environ["AQUARIUS_HOSTNAME"] = aquarius_url
+    os.environ["AQUARIUS_USERNAME"] = "bench"
+    os.environ["AQUARIUS_PASSWORD"] = "bench"
+    os.environ["REMOTE_DB_URL"] = proxy_url
+    os.environ["PG_PROXY_TOKEN"] = "bench"
+    for name in ("DB_HOST", "LOCAL_DB_HOST"):
+        os.environ.setdefault(name, "localhost")
+    for name in ("DB_PORT", "LOCAL_DB_PORT"):
+        os.environ.setdefault(name, "5432")
+    os.environ.setdefault("DB_NAME", "postgres")
+    os.environ.setdefault("LOCAL_DB_NAME", "sensors")
+    for name in ("DB_USER", "LOCAL_DB_USER"):
+        os.environ.setdefault(name, "postgres")
+    for name in ("DB_PASSWORD", "LOCAL_DB_PASSWORD"):
+        os.environ.setdefault(name, "postgres")
+    if unthrottled:
+        # Measure raw throughput instead of the client-side budgets
+        os.environ["RATE_LIMIT_DEFAULT_PER_SECOND"] = "100000"
+        os.environ["RATE_LIMIT_BUDGETS"] = "{}"
+        for bucket in ("AQUARIUS_DATA", "AQUARIUS_METADATA", "PRODUCTION_BULK_INSERT"):
+            os.environ[f"RATE_LIMIT_{bucket}"] = "100000"
+
+
+def timed(name: str, points_fn: Callable[[], int], run: Callable[[], Any]) -> Dict:
+    before = points_fn()
+    started = time.perf_counter()
+    ok = run()
+    seconds = time.perf_counter() - started
+    points = points_fn() - before
+    result = {
+        "benchmark": name,
+        "ok": ok is not False,
+        "points": points,
+        "seconds": round(seconds, 3),
+        "points_per_second": round(points / seconds, 1) if seconds else 0.0,
+    }
+    print(
+        f"{name:<16} {points:>12,} points {seconds:>9.2f}s "
+        f"{result['points_per_second']:>12,.1f} pts/s"
+    )
+    return result
+
+
+def bench_service(days: int, unique_ids: List[str]) -> List[Dict]:
+    sys.path.insert(0, os.path.join(REPO_ROOT, "services", "ecosense-sync"))
+    from prometheus_client import REGISTRY
+    from src.sync import EcosenseSync
+
+    def points_parsed() -> int:
+        return int(REGISTRY.get_sample_value("ecosense_points_parsed_total") or 0)
+
+    sync = EcosenseSync()
+    sync.sync_metadata()
+    run = lambda: sync.sync_readings(days_back=days, sensor_external_ids=unique_ids)
+    # The warm run fetches the same data again and skips unchanged windows
+    return [timed(name, points_parsed, run) for name in ("service-cold", "service-warm")]
+
+
+def bench_script(days: int, proxy) -> List[Dict]:
+    sys.path.insert(0, os.path.join(REPO_ROOT, "tmp", "data-sync"))
+    import ecosense_sync
+
+    sync = ecosense_sync.EcosenseSync()
+    conn = sync.local_db.get_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute(LOCAL_TABLE_DDL)
+    conn.close()
+
+    def local_points() -> int:
+        conn = sync.local_db.get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT COUNT(*) FROM ecosense.timeseries_data
+                WHERE location_identifier LIKE 'Ecosense_Bench_%'
+            """
+            )
+            count = cur.fetchone()[0]
+        conn.close()
+        return count
+
+    proxy_points = lambda: proxy.RequestHandlerClass.stats["points_received"]
+    return [
+        timed("stage1", local_points, lambda: sync.sync_aquarius_to_local(days_back=days)),
+        timed(
+            "stage2",
+            proxy_points,
+            lambda: sync.sync_local_to_production(batch_size=1000, days_back=days),
+        ),
+    ]
+
+
+def cleanup():
+    """Remove benchmark sensors and readings from both databases"""
+    conn = psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        port=os.environ["DB_PORT"],
+        database=os.environ["DB_NAME"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+    )
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM sensor.Sensors
+            WHERE LocationID IN (
+                SELECT LocationID FROM shared.Locations WHERE LocationName LIKE 'Ecosense_Bench_%'
+            )
+        """
+        )
+    conn.close()
+
+    conn = psycopg2.connect(
+        host=os.environ["LOCAL_DB_HOST"],
+        port=os.environ["LOCAL_DB_PORT"],
+        database=os.environ["LOCAL_DB_NAME"],
+        user=os.environ["LOCAL_DB_USER"],
+        password=os.environ["LOCAL_DB_PASSWORD"],
+    )
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM ecosense.timeseries_data WHERE location_identifier LIKE 'Ecosense_Bench_%'"
+        )
+    conn.close()
+    print("Removed benchmark sensors and readings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ecosense sync benchmarks")
+    add_config_arguments(parser)
+    parser.add_argument("--days", type=int, default=7, help="Days of readings to sync")
+    parser.add_argument(
+        "--target",
+        choices=["all", "service", "script"],
+        default="all",
+        help="Which sync implementation to benchmark",
+    )
+    parser.add_argument(
+        "--unthrottled",
+        action="store_true",
+        help="Raise client-side rate-limit budgets so only the fake limits apply",
+    )
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument(
+        "--cleanup", action="store_true", help="Delete benchmark data and exit"
+    )
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    aquarius, proxy = start_servers(config)
+    configure_environment(
+        f"http://127.0.0.1:{aquarius.server_port}",
+        f"http://127.0.0.1:{proxy.server_port}/api/db",
+        args.unthrottled,
+    )
+    if args.cleanup:
+        cleanup()
+        return
+
+    points_per_series = args.days * 86400 // args.interval
+    print(
+        f"{args.series} series x ~{points_per_series:,} points, "
+        f"latency {args.latency_ms} ms, rate limit {args.rate_limit or 'none'}"
+    )
+
+    results = []
+    if args.target in ("all", "service"):
+        unique_ids = [d["UniqueId"] for d in series_descriptions(config)]
+        results.extend(bench_service(args.days, unique_ids))
+    if args.target in ("all", "script"):
+        results.extend(bench_script(args.days, proxy))
+
+    for server in (aquarius, proxy):
+        gate = server.RequestHandlerClass.gate
+        print(f"fake {server.server_port}: {gate.requests} requests, {gate.throttled} throttled")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
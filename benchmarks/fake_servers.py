@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Aquarius Publish v2 API and the production /api/db proxy
+
+Serves the endpoints the sync code uses, with synthetic data and configurable
+latency, rate limits and series sizes, so syncs can be benchmarked without
+touching live servers.
+
+Aquarius (under /AQUARIUS/Publish/v2):
+  POST/DELETE session, GET GetTimeSeriesDescriptionList, GET GetTimeSeriesCorrectedData
+Production proxy (under /api/db):
+  GET health, GET timeseries/stats, POST timeseries/bulk-insert
+
+Usage:
+  python fake_servers.py                               # Aquarius on :8081, proxy on :8082
+  python fake_servers.py --series 500 --interval 300   # 500 series, 5-minute samples
+  python fake_servers.py --latency-ms 50 --rate-limit 20
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# Parameters the service and the script map to sensor types
+PARAMETERS = {
+    "Sapflow": "cm/h",
+    "StemRadialVar_Volt": "V",
+    "BarPressure": "hPa",
+    "SoilMoisture": "%",
+    "SoilTemp": "degC",
+}
+
+
+class FakeConfig:
+    """Knobs shared by both fake servers"""
+
+    def __init__(
+        self,
+        series: int = 100,
+        interval_seconds: int = 900,
+        latency_ms: float = 0.0,
+        rate_limit: float = 0.0,
+        gap_fraction: float = 0.02,
+    ):
+        self.series = series
+        self.interval_seconds = interval_seconds
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit  # requests per second, 0 = unlimited
+        self.gap_fraction = gap_fraction
+
+
+class RequestGate:
+    """Adds latency and answers 429 once the configured request rate is exceeded"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.tokens = max(config.rate_limit, 1.0)
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+
+    def admit(self) -> bool:
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        with self.lock:
+            self.requests += 1
+            if not self.config.rate_limit:
+                return True
+            now = time.monotonic()
+            self.tokens = min(
+                max(self.config.rate_limit, 1.0),
+                self.tokens + (now - self.updated) * self.config.rate_limit,
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+
+def series_descriptions(config: FakeConfig) -> List[Dict[str, Any]]:
+    """Deterministic Ecosense-like time series descriptions"""
+    descriptions = []
+    parameters = list(PARAMETERS)
+    for i in range(config.series):
+        parameter = parameters[i % len(parameters)]
+        location = f"Ecosense_Bench_{i // len(parameters):04d}"
+        label = f"Bench_{i:05d}"
+        descriptions.append(
+            {
+                "UniqueId": uuid.UUID(
+                    hashlib.md5(f"{parameter}.{label}@{location}".encode()).hexdigest()
+                ).hex,
+                "Identifier": f"{parameter}.{label}@{location}",
+                "LocationIdentifier": location,
+                "Parameter": parameter,
+                "Label": label,
+                "Unit": PARAMETERS[parameter],
+                "LastModified": "2024-01-01T00:00:00.0000000+00:00",
+            }
+        )
+    return descriptions
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def corrected_points(
+    unique_id: str, query_from: datetime, query_to: datetime, config: FakeConfig
+) -> List[Dict[str, Any]]:
+    """Diurnal signal with noise and gaps, identical for repeated queries"""
+    step = config.interval_seconds
+    seed = int(unique_id[:8], 16)
+    first = math.ceil(query_from.timestamp() / step) * step
+    points = []
+    for ts in range(first, int(query_to.timestamp()) + 1, step):
+        noise = ((seed ^ ts) * 2654435761 % 2**32) / 2**32
+        if noise < config.gap_fraction:
+            continue
+        hour = (ts % 86400) / 3600
+        value = 10 + 8 * math.sin((hour - 8) / 24 * 2 * math.pi) + noise
+        points.append(
+            {
+                "Timestamp": datetime.fromtimestamp(ts, timezone.utc)
+                .isoformat()
+                .replace("+00:00", ".0000000+00:00"),
+                "Value": {"Numeric": round(value, 4), "Display": f"{value:.2f}"},
+            }
+        )
+    return points
+
+
+class FakeAquariusHandler(BaseHTTPRequestHandler):
+    config: FakeConfig
+    gate: RequestGate
+    tokens: set
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any = None, raw: Optional[str] = None):
+        payload = (raw if raw is not None else json.dumps(body or {})).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self) -> Tuple[str, Dict[str, List[str]]]:
+        url = urlparse(self.path)
+        prefix = "/AQUARIUS/Publish/v2/"
+        return url.path[len(prefix) :] if url.path.startswith(prefix) else "", parse_qs(
+            url.query
+        )
+
+    def _authorized(self) -> bool:
+        return self.headers.get("X-Authentication-Token") in self.tokens
+
+    def do_POST(self):
+        endpoint, _ = self._route()
+        if not self.gate.admit():
+            return self._send(429, {"ResponseStatus": {"ErrorCode": "TooManyRequests"}})
+        if endpoint != "session":
+            return self._send(404)
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        self._send(200, raw=f'"{token}"')
+
+    def do_DELETE(self):
+        endpoint, _ = self._route()
+        if endpoint == "session":
+            self.tokens.discard(self.headers.get("X-Authentication-Token"))
+        self._send(200)
+
+    def do_GET(self):
+        endpoint, query = self._route()
+        if not self.gate.admit():
+            return self._send(429, {"ResponseStatus": {"ErrorCode": "TooManyRequests"}})
+        if not self._authorized():
+            return self._send(401, {"ResponseStatus": {"ErrorCode": "Unauthorized"}})
+
+        if endpoint == "GetTimeSeriesDescriptionList":
+            return self._send(
+                200, {"TimeSeriesDescriptions": series_descriptions(self.config)}
+            )
+        if endpoint == "GetTimeSeriesCorrectedData":
+            unique_id = query.get("TimeSeriesUniqueId", [""])[0]
+            query_to = (
+                _parse_time(query["QueryTo"][0])
+                if "QueryTo" in query
+                else datetime.now(timezone.utc)
+            )
+            query_from = (
+                _parse_time(query["QueryFrom"][0])
+                if "QueryFrom" in query
+                else query_to - timedelta(days=1)
+            )
+            points = corrected_points(unique_id, query_from, query_to, self.config)
+            return self._send(200, {"UniqueId": unique_id, "Points": points})
+        self._send(404)
+
+
+class FakeProxyHandler(BaseHTTPRequestHandler):
+    config: FakeConfig
+    gate: RequestGate
+    seen_batches: set
+    stats: Dict[str, int]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any = None):
+        payload = json.dumps(body or {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _endpoint(self) -> str:
+        path = urlparse(self.path).path
+        return path[len("/api/db/") :] if path.startswith("/api/db/") else ""
+
+    def do_GET(self):
+        if not self.gate.admit():
+            return self._send(429, {"error": "rate limited"})
+        endpoint = self._endpoint()
+        if endpoint == "health":
+            return self._send(200, {"status": "ok"})
+        if endpoint == "timeseries/stats":
+            return self._send(200, {"data": [], **self.stats})
+        self._send(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if not self.gate.admit():
+            return self._send(429, {"error": "rate limited"})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(401, {"error": "missing token"})
+        if self._endpoint() != "timeseries/bulk-insert":
+            return self._send(404)
+
+        points = json.loads(body).get("data_points", [])
+        batch_id = self.headers.get("Idempotency-Key")
+        if batch_id and batch_id in self.seen_batches:
+            return self._send(200, {"inserted_count": 0, "duplicate": True})
+        if batch_id:
+            self.seen_batches.add(batch_id)
+        self.stats["points_received"] += len(points)
+        self._send(200, {"inserted_count": len(points)})
+
+
+def start_servers(
+    config: FakeConfig, aquarius_port: int = 0, proxy_port: int = 0
+) -> Tuple[ThreadingHTTPServer, ThreadingHTTPServer]:
+    """Start both fakes on daemon threads; port 0 picks a free port"""
+    aquarius_handler = type(
+        "AquariusHandler",
+        (FakeAquariusHandler,),
+        {"config": config, "gate": RequestGate(config), "tokens": set()},
+    )
+    proxy_handler = type(
+        "ProxyHandler",
+        (FakeProxyHandler,),
+        {
+            "config": config,
+            "gate": RequestGate(config),
+            "seen_batches": set(),
+            "stats": {"points_received": 0},
+        },
+    )
+    aquarius = ThreadingHTTPServer(("127.0.0.1", aquarius_port), aquarius_handler)
+    proxy = ThreadingHTTPServer(("127.0.0.1", proxy_port), proxy_handler)
+    for server in (aquarius, proxy):
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return aquarius, proxy
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--series", type=int, default=100, help="Number of time series")
+    parser.add_argument(
+        "--interval", type=int, default=900, help="Sampling interval in seconds"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Added latency per request"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="Requests per second before answering 429 (0 = unlimited)",
+    )
+    parser.add_argument(
+        "--gap-fraction", type=float, default=0.02, help="Share of missing samples"
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        series=args.series,
+        interval_seconds=args.interval,
+        latency_ms=args.latency_ms,
+        rate_limit=args.rate_limit,
+        gap_fraction=args.gap_fraction,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Aquarius and production proxy")
+    add_config_arguments(parser)
+    parser.add_argument("--aquarius-port", type=int, default=8081)
+    parser.add_argument("--proxy-port", type=int, default=8082)
+    args = parser.parse_args()
+
+    start_servers(config_from_args(args), args.aquarius_port, args.proxy_port)
+    print(f"Fake Aquarius: http://127.0.0.1:{args.aquarius_port}/AQUARIUS")
+    print(f"Fake proxy:    http://127.0.0.1:{args.proxy_port}/api/db")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+-- Sync Window Fingerprints Migration
+-- Lets the Aquarius sync skip unchanged (sensor, day) windows and makes reading upserts idempotent
+
+SET search_path TO sensor, shared, public;
+
+-- 1. One real reading per sensor and timestamp (simulated readings carry a ScenarioID)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sensor_readings_sensor_timestamp
+    ON sensor.SensorReadings(SensorID, Timestamp)
+    WHERE ScenarioID IS NULL;
+
+-- 2. Content hash per sensor and UTC day, written by the sync after each changed window
+CREATE TABLE IF NOT EXISTS sensor.SyncWindowFingerprints (
+    SensorID INTEGER NOT NULL REFERENCES sensor.Sensors(SensorID) ON DELETE CASCADE,
+    WindowDate DATE NOT NULL,
+    ContentHash CHAR(64) NOT NULL,
+    PointCount INTEGER NOT NULL CHECK (PointCount >= 0),
+    UpdatedAt TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (SensorID, WindowDate)
+);
+
+COMMENT ON TABLE sensor.SyncWindowFingerprints IS 'SHA-256 of the readings fetched per sensor and UTC day; unchanged windows are not rewritten';
+COMMENT ON COLUMN sensor.SyncWindowFingerprints.ContentHash IS 'SHA-256 hex digest over the sorted (timestamp, value) pairs of the window';
+
+-- 3. Grant permissions
+GRANT ALL ON sensor.SyncWindowFingerprints TO service_role;
+GRANT SELECT ON sensor.SyncWindowFingerprints TO authenticated;
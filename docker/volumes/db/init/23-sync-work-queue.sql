@@ -0,0 +1,24 @@
+-- Sync Work Queue Migration
+-- Per-sensor sync state used by sharded ecosense-sync workers to lease disjoint sensor batches
+
+SET search_path TO sensor, shared, public;
+
+-- 1. One row per synced sensor; workers claim rows with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS sensor.SensorSyncState (
+    SensorID INTEGER PRIMARY KEY REFERENCES sensor.Sensors(SensorID) ON DELETE CASCADE,
+    LastSyncedAt TIMESTAMPTZ,
+    ClaimedBy VARCHAR(200),
+    ClaimedUntil TIMESTAMPTZ
+);
+
+COMMENT ON TABLE sensor.SensorSyncState IS 'Aquarius sync progress and worker leases per sensor';
+COMMENT ON COLUMN sensor.SensorSyncState.ClaimedBy IS 'Worker ID (hostname-pid) currently holding the lease';
+COMMENT ON COLUMN sensor.SensorSyncState.ClaimedUntil IS 'Lease expiry; expired leases of crashed workers can be reclaimed';
+
+-- 2. Create index for picking the stalest unclaimed sensors first
+CREATE INDEX IF NOT EXISTS idx_sensor_sync_state_last_synced
+    ON sensor.SensorSyncState(LastSyncedAt NULLS FIRST);
+
+-- 3. Grant permissions
+GRANT ALL ON sensor.SensorSyncState TO service_role;
+GRANT SELECT ON sensor.SensorSyncState TO authenticated;
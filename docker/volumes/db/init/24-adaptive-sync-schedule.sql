@@ -0,0 +1,22 @@
+-- Adaptive Sync Schedule Migration
+-- Persists per-sensor next-due times so the adaptive ecosense-sync scheduler survives restarts
+
+SET search_path TO sensor, shared, public;
+
+-- 1. Scheduling state next to the existing per-sensor sync state
+ALTER TABLE sensor.SensorSyncState
+    ADD COLUMN IF NOT EXISTS NextDueAt TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS PollIntervalSeconds INTEGER CHECK (PollIntervalSeconds > 0),
+    ADD COLUMN IF NOT EXISTS IdleRuns INTEGER NOT NULL DEFAULT 0 CHECK (IdleRuns >= 0),
+    ADD COLUMN IF NOT EXISTS AvgLatencyMs REAL,
+    ADD COLUMN IF NOT EXISTS NewestReadingAt TIMESTAMPTZ;
+
+COMMENT ON COLUMN sensor.SensorSyncState.NextDueAt IS 'When the adaptive scheduler polls this sensor next';
+COMMENT ON COLUMN sensor.SensorSyncState.PollIntervalSeconds IS 'Current poll interval derived from SamplingInterval_seconds, change rate and latency';
+COMMENT ON COLUMN sensor.SensorSyncState.IdleRuns IS 'Consecutive polls that returned no new readings; drives exponential backoff';
+COMMENT ON COLUMN sensor.SensorSyncState.AvgLatencyMs IS 'Moving average of Aquarius GetTimeSeriesCorrectedData latency for this sensor';
+COMMENT ON COLUMN sensor.SensorSyncState.NewestReadingAt IS 'Timestamp of the newest stored reading after the last poll';
+
+-- 2. Create index for loading the schedule in due order
+CREATE INDEX IF NOT EXISTS idx_sensor_sync_state_next_due
+    ON sensor.SensorSyncState(NextDueAt NULLS FIRST);
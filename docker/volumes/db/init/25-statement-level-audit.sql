@@ -0,0 +1,195 @@
+-- Statement-Level Audit Migration
+-- Replaces the FOR EACH ROW audit triggers from 17-audit-functions.sql with
+-- FOR EACH STATEMENT triggers over transition tables. A bulk UPDATE now writes
+-- all of its AuditLog rows and junction links with two set-based inserts
+-- instead of two single-row inserts per changed field and row.
+
+SET search_path TO shared, public;
+
+-- 1. Batched counterpart of shared.create_audit_log
+CREATE OR REPLACE FUNCTION shared.create_audit_logs(
+    table_name_param VARCHAR,
+    record_ids INTEGER[],
+    field_names VARCHAR[],
+    old_values TEXT[],
+    new_values TEXT[],
+    change_reason_param TEXT DEFAULT NULL,
+    change_type_param VARCHAR DEFAULT 'field_update'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    user_id TEXT := auth.uid()::TEXT;
+    client_addr INET := inet_client_addr();
+    audit_sequence REGCLASS := pg_get_serial_sequence('shared.auditlog', 'auditid')::REGCLASS;
+    logged INTEGER;
+BEGIN
+    -- AuditIDs are drawn up front so both inserts can use them; the CTE is
+    -- referenced twice and therefore evaluated (and nextval called) once per row
+    CASE table_name_param
+        WHEN 'Trees' THEN
+            WITH changes AS (
+                SELECT nextval(audit_sequence) AS audit_id, c.*
+                FROM unnest(record_ids, field_names, old_values, new_values)
+                    AS c(record_id, field_name, old_value, new_value)
+            ), logged_rows AS (
+                INSERT INTO shared.AuditLog (AuditID, FieldName, OldValue, NewValue, ChangeReason, UserID, ChangeType, IPAddress)
+                SELECT audit_id, field_name, old_value, new_value, change_reason_param, user_id, change_type_param, client_addr
+                FROM changes
+            )
+            INSERT INTO shared.AuditLog_Trees (AuditID, VariantID)
+            SELECT audit_id, record_id FROM changes;
+        WHEN 'Stems' THEN
+            WITH changes AS (
+                SELECT nextval(audit_sequence) AS audit_id, c.*
+                FROM unnest(record_ids, field_names, old_values, new_values)
+                    AS c(record_id, field_name, old_value, new_value)
+            ), logged_rows AS (
+                INSERT INTO shared.AuditLog (AuditID, FieldName, OldValue, NewValue, ChangeReason, UserID, ChangeType, IPAddress)
+                SELECT audit_id, field_name, old_value, new_value, change_reason_param, user_id, change_type_param, client_addr
+                FROM changes
+            )
+            INSERT INTO shared.AuditLog_Stems (AuditID, StemID)
+            SELECT audit_id, record_id FROM changes;
+        WHEN 'Environments' THEN
+            WITH changes AS (
+                SELECT nextval(audit_sequence) AS audit_id, c.*
+                FROM unnest(record_ids, field_names, old_values, new_values)
+                    AS c(record_id, field_name, old_value, new_value)
+            ), logged_rows AS (
+                INSERT INTO shared.AuditLog (AuditID, FieldName, OldValue, NewValue, ChangeReason, UserID, ChangeType, IPAddress)
+                SELECT audit_id, field_name, old_value, new_value, change_reason_param, user_id, change_type_param, client_addr
+                FROM changes
+            )
+            INSERT INTO shared.AuditLog_Environments (AuditID, VariantID)
+            SELECT audit_id, record_id FROM changes;
+        WHEN 'PointClouds' THEN
+            WITH changes AS (
+                SELECT nextval(audit_sequence) AS audit_id, c.*
+                FROM unnest(record_ids, field_names, old_values, new_values)
+                    AS c(record_id, field_name, old_value, new_value)
+            ), logged_rows AS (
+                INSERT INTO shared.AuditLog (AuditID, FieldName, OldValue, NewValue, ChangeReason, UserID, ChangeType, IPAddress)
+                SELECT audit_id, field_name, old_value, new_value, change_reason_param, user_id, change_type_param, client_addr
+                FROM changes
+            )
+            INSERT INTO shared.AuditLog_PointClouds (AuditID, VariantID)
+            SELECT audit_id, record_id FROM changes;
+    END CASE;
+
+    GET DIAGNOSTICS logged = ROW_COUNT;
+    RETURN logged;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION shared.create_audit_logs IS 'Creates many audit log entries and their junction links with two set-based inserts; returns the number written';
+
+-- 2. Statement-level trigger function over the OLD/NEW transition tables
+CREATE OR REPLACE FUNCTION shared.audit_update_statement_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    record_ids INTEGER[];
+    field_names VARCHAR[];
+    old_values TEXT[];
+    new_values TEXT[];
+    table_name VARCHAR;
+BEGIN
+    -- Same audited fields as shared.audit_update_trigger; rows are matched on their key
+    CASE TG_TABLE_NAME
+        WHEN 'trees' THEN
+            table_name := 'Trees';
+            SELECT array_agg(n.VariantID), array_agg(f.field_name), array_agg(f.old_value), array_agg(f.new_value)
+            INTO record_ids, field_names, old_values, new_values
+            FROM new_rows n
+            JOIN old_rows o ON o.VariantID = n.VariantID
+            CROSS JOIN LATERAL (VALUES
+                ('Height_m', o.Height_m::TEXT, n.Height_m::TEXT),
+                ('CrownWidth_m', o.CrownWidth_m::TEXT, n.CrownWidth_m::TEXT),
+                ('HealthScore', o.HealthScore::TEXT, n.HealthScore::TEXT),
+                ('TreeStatusID', o.TreeStatusID::TEXT, n.TreeStatusID::TEXT)
+            ) AS f(field_name, old_value, new_value)
+            WHERE f.old_value IS DISTINCT FROM f.new_value;
+
+        WHEN 'stems' THEN
+            table_name := 'Stems';
+            SELECT array_agg(n.StemID), array_agg(f.field_name), array_agg(f.old_value), array_agg(f.new_value)
+            INTO record_ids, field_names, old_values, new_values
+            FROM new_rows n
+            JOIN old_rows o ON o.StemID = n.StemID
+            CROSS JOIN LATERAL (VALUES
+                ('DBH_cm', o.DBH_cm::TEXT, n.DBH_cm::TEXT),
+                ('StemHeight_m', o.StemHeight_m::TEXT, n.StemHeight_m::TEXT)
+            ) AS f(field_name, old_value, new_value)
+            WHERE f.old_value IS DISTINCT FROM f.new_value;
+
+        WHEN 'environments' THEN
+            table_name := 'Environments';
+            SELECT array_agg(n.VariantID), array_agg(f.field_name), array_agg(f.old_value), array_agg(f.new_value)
+            INTO record_ids, field_names, old_values, new_values
+            FROM new_rows n
+            JOIN old_rows o ON o.VariantID = n.VariantID
+            CROSS JOIN LATERAL (VALUES
+                ('AvgTemperature_C', o.AvgTemperature_C::TEXT, n.AvgTemperature_C::TEXT),
+                ('StressFactor', o.StressFactor::TEXT, n.StressFactor::TEXT)
+            ) AS f(field_name, old_value, new_value)
+            WHERE f.old_value IS DISTINCT FROM f.new_value;
+
+        WHEN 'pointclouds' THEN
+            table_name := 'PointClouds';
+            SELECT array_agg(n.VariantID), array_agg(f.field_name), array_agg(f.old_value), array_agg(f.new_value)
+            INTO record_ids, field_names, old_values, new_values
+            FROM new_rows n
+            JOIN old_rows o ON o.VariantID = n.VariantID
+            CROSS JOIN LATERAL (VALUES
+                ('ProcessingStatus', o.ProcessingStatus::TEXT, n.ProcessingStatus::TEXT)
+            ) AS f(field_name, old_value, new_value)
+            WHERE f.old_value IS DISTINCT FROM f.new_value;
+
+        ELSE
+            RETURN NULL;
+    END CASE;
+
+    IF record_ids IS NOT NULL THEN
+        PERFORM shared.create_audit_logs(
+            table_name, record_ids, field_names, old_values, new_values,
+            NULL, 'field_update'
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION shared.audit_update_statement_trigger IS 'Statement-level audit of critical field updates using transition tables';
+
+-- 3. Swap the row-level audit triggers for statement-level ones
+-- (shared.audit_update_trigger is kept for reference and the benchmark)
+DROP TRIGGER IF EXISTS trigger_trees_audit ON trees.Trees;
+CREATE TRIGGER trigger_trees_audit
+    AFTER UPDATE ON trees.Trees
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.audit_update_statement_trigger();
+
+DROP TRIGGER IF EXISTS trigger_stems_audit ON trees.Stems;
+CREATE TRIGGER trigger_stems_audit
+    AFTER UPDATE ON trees.Stems
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.audit_update_statement_trigger();
+
+DROP TRIGGER IF EXISTS trigger_environments_audit ON environments.Environments;
+CREATE TRIGGER trigger_environments_audit
+    AFTER UPDATE ON environments.Environments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.audit_update_statement_trigger();
+
+DROP TRIGGER IF EXISTS trigger_pointclouds_audit ON pointclouds.PointClouds;
+CREATE TRIGGER trigger_pointclouds_audit
+    AFTER UPDATE ON pointclouds.PointClouds
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.audit_update_statement_trigger();
+
+-- 4. Grant permissions
+GRANT EXECUTE ON FUNCTION shared.create_audit_logs TO authenticated, service_role;
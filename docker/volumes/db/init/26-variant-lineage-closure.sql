@@ -0,0 +1,342 @@
+-- Variant Lineage Closure Tables Migration
+-- Adds closure tables (ancestor, descendant, depth) for the ParentVariantID
+-- chains of PointClouds, Trees and Environments. Every variant has a depth-0
+-- row for itself plus one row per ancestor, so "all descendants of X" and
+-- "root of Y" become indexed lookups instead of recursive walks.
+-- The tables are kept current by triggers; loaders that bypass triggers
+-- (session_replication_role = replica) call shared.rebuild_variant_lineage().
+
+SET search_path TO shared, public;
+
+-- 1. Closure tables
+CREATE TABLE IF NOT EXISTS pointclouds.PointCloudLineage (
+    AncestorID INTEGER NOT NULL REFERENCES pointclouds.PointClouds(VariantID) ON DELETE CASCADE,
+    DescendantID INTEGER NOT NULL REFERENCES pointclouds.PointClouds(VariantID) ON DELETE CASCADE,
+    Depth INTEGER NOT NULL CHECK (Depth >= 0),
+    PRIMARY KEY (AncestorID, DescendantID)
+);
+
+CREATE TABLE IF NOT EXISTS trees.TreeLineage (
+    AncestorID INTEGER NOT NULL REFERENCES trees.Trees(VariantID) ON DELETE CASCADE,
+    DescendantID INTEGER NOT NULL REFERENCES trees.Trees(VariantID) ON DELETE CASCADE,
+    Depth INTEGER NOT NULL CHECK (Depth >= 0),
+    PRIMARY KEY (AncestorID, DescendantID)
+);
+
+CREATE TABLE IF NOT EXISTS environments.EnvironmentLineage (
+    AncestorID INTEGER NOT NULL REFERENCES environments.Environments(VariantID) ON DELETE CASCADE,
+    DescendantID INTEGER NOT NULL REFERENCES environments.Environments(VariantID) ON DELETE CASCADE,
+    Depth INTEGER NOT NULL CHECK (Depth >= 0),
+    PRIMARY KEY (AncestorID, DescendantID)
+);
+
+-- The primary key serves descendant lookups; this index serves ancestor and root lookups
+CREATE INDEX IF NOT EXISTS idx_pointcloud_lineage_descendant ON pointclouds.PointCloudLineage(DescendantID, Depth);
+CREATE INDEX IF NOT EXISTS idx_tree_lineage_descendant ON trees.TreeLineage(DescendantID, Depth);
+CREATE INDEX IF NOT EXISTS idx_environment_lineage_descendant ON environments.EnvironmentLineage(DescendantID, Depth);
+
+COMMENT ON TABLE pointclouds.PointCloudLineage IS 'Closure table of point cloud ParentVariantID chains (one row per ancestor/descendant pair, including self at depth 0)';
+COMMENT ON TABLE trees.TreeLineage IS 'Closure table of tree variant ParentVariantID chains (one row per ancestor/descendant pair, including self at depth 0)';
+COMMENT ON TABLE environments.EnvironmentLineage IS 'Closure table of environment variant ParentVariantID chains (one row per ancestor/descendant pair, including self at depth 0)';
+COMMENT ON COLUMN pointclouds.PointCloudLineage.Depth IS 'Number of ParentVariantID steps from ancestor to descendant';
+COMMENT ON COLUMN trees.TreeLineage.Depth IS 'Number of ParentVariantID steps from ancestor to descendant';
+COMMENT ON COLUMN environments.EnvironmentLineage.Depth IS 'Number of ParentVariantID steps from ancestor to descendant';
+
+-- 2. Maintenance triggers (the closure table is passed as trigger argument)
+CREATE OR REPLACE FUNCTION shared.variant_lineage_insert_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Walk up through the inserted rows (a bulk load may insert whole chains),
+    -- then append the stored ancestors of the first pre-existing variant reached
+    EXECUTE format($sql$
+        WITH RECURSIVE chain AS (
+            SELECT VariantID AS ancestor, VariantID AS descendant, 0 AS depth
+            FROM new_rows
+            UNION ALL
+            SELECT n.ParentVariantID, c.descendant, c.depth + 1
+            FROM chain c
+            JOIN new_rows n ON n.VariantID = c.ancestor
+            WHERE n.ParentVariantID IS NOT NULL
+        )
+        INSERT INTO %1$s (AncestorID, DescendantID, Depth)
+        SELECT ancestor, descendant, depth FROM chain
+        UNION ALL
+        SELECT l.AncestorID, c.descendant, c.depth + l.Depth
+        FROM chain c
+        JOIN %1$s l ON l.DescendantID = c.ancestor AND l.Depth > 0
+        WHERE NOT EXISTS (SELECT 1 FROM new_rows n WHERE n.VariantID = c.ancestor)
+    $sql$, TG_ARGV[0]);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION shared.variant_lineage_insert_trigger IS 'Adds closure rows for inserted variants (statement-level, reads the new_rows transition table)';
+
+CREATE OR REPLACE FUNCTION shared.variant_lineage_update_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    creates_cycle BOOLEAN;
+BEGIN
+    IF NEW.ParentVariantID IS NOT NULL THEN
+        EXECUTE format(
+            'SELECT EXISTS (SELECT 1 FROM %s WHERE AncestorID = $1 AND DescendantID = $2)',
+            TG_ARGV[0]
+        ) INTO creates_cycle USING NEW.VariantID, NEW.ParentVariantID;
+
+        IF creates_cycle THEN
+            RAISE EXCEPTION 'Variant % cannot take its own descendant % as parent', NEW.VariantID, NEW.ParentVariantID;
+        END IF;
+    END IF;
+
+    -- Detach the moved subtree from its old ancestors
+    EXECUTE format($sql$
+        DELETE FROM %1$s l
+        USING %1$s sub
+        WHERE sub.AncestorID = $1
+          AND l.DescendantID = sub.DescendantID
+          AND l.AncestorID NOT IN (SELECT DescendantID FROM %1$s WHERE AncestorID = $1)
+    $sql$, TG_ARGV[0]) USING NEW.VariantID;
+
+    -- Attach it below the new parent's ancestors
+    IF NEW.ParentVariantID IS NOT NULL THEN
+        EXECUTE format($sql$
+            INSERT INTO %1$s (AncestorID, DescendantID, Depth)
+            SELECT super.AncestorID, sub.DescendantID, super.Depth + sub.Depth + 1
+            FROM %1$s super
+            CROSS JOIN %1$s sub
+            WHERE super.DescendantID = $1 AND sub.AncestorID = $2
+        $sql$, TG_ARGV[0]) USING NEW.ParentVariantID, NEW.VariantID;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION shared.variant_lineage_update_trigger IS 'Moves a variant and its descendants in the closure table when ParentVariantID changes';
+
+-- 3. Full rebuild for bulk loaders
+CREATE OR REPLACE FUNCTION shared.rebuild_variant_lineage(family_param VARCHAR)
+RETURNS BIGINT AS $$
+DECLARE
+    variant_table TEXT;
+    lineage_table TEXT;
+    written BIGINT;
+BEGIN
+    CASE family_param
+        WHEN 'pointclouds' THEN
+            variant_table := 'pointclouds.PointClouds';
+            lineage_table := 'pointclouds.PointCloudLineage';
+        WHEN 'trees' THEN
+            variant_table := 'trees.Trees';
+            lineage_table := 'trees.TreeLineage';
+        WHEN 'environments' THEN
+            variant_table := 'environments.Environments';
+            lineage_table := 'environments.EnvironmentLineage';
+        ELSE
+            RAISE EXCEPTION 'Unknown variant family: %', family_param;
+    END CASE;
+
+    EXECUTE format('LOCK TABLE %s IN SHARE MODE', variant_table);
+    EXECUTE format('DELETE FROM %s', lineage_table);
+    EXECUTE format($sql$
+        WITH RECURSIVE chain AS (
+            SELECT VariantID AS ancestor, VariantID AS descendant, 0 AS depth
+            FROM %2$s
+            UNION ALL
+            SELECT v.ParentVariantID, c.descendant, c.depth + 1
+            FROM chain c
+            JOIN %2$s v ON v.VariantID = c.ancestor
+            WHERE v.ParentVariantID IS NOT NULL
+        )
+        INSERT INTO %1$s (AncestorID, DescendantID, Depth)
+        SELECT ancestor, descendant, depth FROM chain
+    $sql$, lineage_table, variant_table);
+
+    GET DIAGNOSTICS written = ROW_COUNT;
+    EXECUTE format('ANALYZE %s', lineage_table);
+    RETURN written;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION shared.rebuild_variant_lineage IS 'Recomputes the closure table of a variant family (pointclouds, trees, environments); returns rows written';
+
+-- 4. Triggers
+DROP TRIGGER IF EXISTS trigger_pointclouds_lineage_insert ON pointclouds.PointClouds;
+CREATE TRIGGER trigger_pointclouds_lineage_insert
+    AFTER INSERT ON pointclouds.PointClouds
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.variant_lineage_insert_trigger('pointclouds.PointCloudLineage');
+
+DROP TRIGGER IF EXISTS trigger_pointclouds_lineage_update ON pointclouds.PointClouds;
+CREATE TRIGGER trigger_pointclouds_lineage_update
+    AFTER UPDATE OF ParentVariantID ON pointclouds.PointClouds
+    FOR EACH ROW
+    WHEN (OLD.ParentVariantID IS DISTINCT FROM NEW.ParentVariantID)
+    EXECUTE FUNCTION shared.variant_lineage_update_trigger('pointclouds.PointCloudLineage');
+
+DROP TRIGGER IF EXISTS trigger_trees_lineage_insert ON trees.Trees;
+CREATE TRIGGER trigger_trees_lineage_insert
+    AFTER INSERT ON trees.Trees
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.variant_lineage_insert_trigger('trees.TreeLineage');
+
+DROP TRIGGER IF EXISTS trigger_trees_lineage_update ON trees.Trees;
+CREATE TRIGGER trigger_trees_lineage_update
+    AFTER UPDATE OF ParentVariantID ON trees.Trees
+    FOR EACH ROW
+    WHEN (OLD.ParentVariantID IS DISTINCT FROM NEW.ParentVariantID)
+    EXECUTE FUNCTION shared.variant_lineage_update_trigger('trees.TreeLineage');
+
+DROP TRIGGER IF EXISTS trigger_environments_lineage_insert ON environments.Environments;
+CREATE TRIGGER trigger_environments_lineage_insert
+    AFTER INSERT ON environments.Environments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.variant_lineage_insert_trigger('environments.EnvironmentLineage');
+
+DROP TRIGGER IF EXISTS trigger_environments_lineage_update ON environments.Environments;
+CREATE TRIGGER trigger_environments_lineage_update
+    AFTER UPDATE OF ParentVariantID ON environments.Environments
+    FOR EACH ROW
+    WHEN (OLD.ParentVariantID IS DISTINCT FROM NEW.ParentVariantID)
+    EXECUTE FUNCTION shared.variant_lineage_update_trigger('environments.EnvironmentLineage');
+
+-- 5. Populate from the variants loaded so far
+SELECT shared.rebuild_variant_lineage('pointclouds');
+SELECT shared.rebuild_variant_lineage('trees');
+SELECT shared.rebuild_variant_lineage('environments');
+
+-- 6. Lookup functions
+CREATE OR REPLACE FUNCTION pointclouds.variant_descendants(variant_id_param INTEGER, max_depth_param INTEGER DEFAULT NULL)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT DescendantID, Depth FROM pointclouds.PointCloudLineage
+    WHERE AncestorID = variant_id_param AND Depth > 0
+      AND (max_depth_param IS NULL OR Depth <= max_depth_param)
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION pointclouds.variant_ancestors(variant_id_param INTEGER)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT AncestorID, Depth FROM pointclouds.PointCloudLineage
+    WHERE DescendantID = variant_id_param AND Depth > 0
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION pointclouds.variant_root(variant_id_param INTEGER)
+RETURNS INTEGER AS $$
+    SELECT AncestorID FROM pointclouds.PointCloudLineage
+    WHERE DescendantID = variant_id_param
+    ORDER BY Depth DESC
+    LIMIT 1
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION trees.variant_descendants(variant_id_param INTEGER, max_depth_param INTEGER DEFAULT NULL)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT DescendantID, Depth FROM trees.TreeLineage
+    WHERE AncestorID = variant_id_param AND Depth > 0
+      AND (max_depth_param IS NULL OR Depth <= max_depth_param)
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION trees.variant_ancestors(variant_id_param INTEGER)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT AncestorID, Depth FROM trees.TreeLineage
+    WHERE DescendantID = variant_id_param AND Depth > 0
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION trees.variant_root(variant_id_param INTEGER)
+RETURNS INTEGER AS $$
+    SELECT AncestorID FROM trees.TreeLineage
+    WHERE DescendantID = variant_id_param
+    ORDER BY Depth DESC
+    LIMIT 1
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION environments.variant_descendants(variant_id_param INTEGER, max_depth_param INTEGER DEFAULT NULL)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT DescendantID, Depth FROM environments.EnvironmentLineage
+    WHERE AncestorID = variant_id_param AND Depth > 0
+      AND (max_depth_param IS NULL OR Depth <= max_depth_param)
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION environments.variant_ancestors(variant_id_param INTEGER)
+RETURNS TABLE (VariantID INTEGER, Depth INTEGER) AS $$
+    SELECT AncestorID, Depth FROM environments.EnvironmentLineage
+    WHERE DescendantID = variant_id_param AND Depth > 0
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION environments.variant_root(variant_id_param INTEGER)
+RETURNS INTEGER AS $$
+    SELECT AncestorID FROM environments.EnvironmentLineage
+    WHERE DescendantID = variant_id_param
+    ORDER BY Depth DESC
+    LIMIT 1
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION pointclouds.variant_descendants IS 'Descendants of a point cloud variant with their distance, optionally limited to max_depth';
+COMMENT ON FUNCTION pointclouds.variant_ancestors IS 'Ancestors of a point cloud variant with their distance';
+COMMENT ON FUNCTION pointclouds.variant_root IS 'Original point cloud a variant was derived from (itself if it has no parent)';
+COMMENT ON FUNCTION trees.variant_descendants IS 'Descendants of a tree variant with their distance, optionally limited to max_depth';
+COMMENT ON FUNCTION trees.variant_ancestors IS 'Ancestors of a tree variant with their distance';
+COMMENT ON FUNCTION trees.variant_root IS 'Original tree variant a variant was derived from (itself if it has no parent)';
+COMMENT ON FUNCTION environments.variant_descendants IS 'Descendants of an environment variant with their distance, optionally limited to max_depth';
+COMMENT ON FUNCTION environments.variant_ancestors IS 'Ancestors of an environment variant with their distance';
+COMMENT ON FUNCTION environments.variant_root IS 'Original environment variant a variant was derived from (itself if it has no parent)';
+
+-- 7. Lineage views as joins on the closure tables
+-- Same columns as the recursive view from 12-pointclouds-schema.sql
+CREATE OR REPLACE VIEW pointclouds.processing_lineage AS
+SELECT
+    pc.VariantID,
+    pc.ParentVariantID,
+    pc.VariantName,
+    pc.ProcessID,
+    pc.ProcessingStatus,
+    1 + MAX(l.Depth) AS depth,
+    array_agg(l.AncestorID ORDER BY l.Depth DESC) AS lineage_path
+FROM pointclouds.PointClouds pc
+JOIN pointclouds.PointCloudLineage l ON l.DescendantID = pc.VariantID
+GROUP BY pc.VariantID;
+
+COMMENT ON VIEW pointclouds.processing_lineage IS 'Point cloud processing lineage and depth, read from the PointCloudLineage closure table';
+
+CREATE OR REPLACE VIEW trees.variant_lineage AS
+SELECT
+    t.VariantID,
+    t.ParentVariantID,
+    t.LocationID,
+    t.VariantTypeID,
+    t.ProcessID,
+    1 + MAX(l.Depth) AS depth,
+    array_agg(l.AncestorID ORDER BY l.Depth DESC) AS lineage_path
+FROM trees.Trees t
+JOIN trees.TreeLineage l ON l.DescendantID = t.VariantID
+GROUP BY t.VariantID;
+
+COMMENT ON VIEW trees.variant_lineage IS 'Tree variant lineage and depth, read from the TreeLineage closure table';
+
+CREATE OR REPLACE VIEW environments.variant_lineage AS
+SELECT
+    e.VariantID,
+    e.ParentVariantID,
+    e.VariantName,
+    e.LocationID,
+    e.VariantTypeID,
+    e.ProcessID,
+    1 + MAX(l.Depth) AS depth,
+    array_agg(l.AncestorID ORDER BY l.Depth DESC) AS lineage_path
+FROM environments.Environments e
+JOIN environments.EnvironmentLineage l ON l.DescendantID = e.VariantID
+GROUP BY e.VariantID;
+
+COMMENT ON VIEW environments.variant_lineage IS 'Environment variant lineage and depth, read from the EnvironmentLineage closure table';
+
+-- 8. Grant permissions
+GRANT SELECT ON pointclouds.PointCloudLineage, pointclouds.processing_lineage TO anon, authenticated;
+GRANT SELECT ON trees.TreeLineage, trees.variant_lineage TO anon, authenticated;
+GRANT SELECT ON environments.EnvironmentLineage, environments.variant_lineage TO anon, authenticated;
+GRANT ALL ON pointclouds.PointCloudLineage, trees.TreeLineage, environments.EnvironmentLineage TO service_role;
+GRANT EXECUTE ON FUNCTION pointclouds.variant_descendants, pointclouds.variant_ancestors, pointclouds.variant_root TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION trees.variant_descendants, trees.variant_ancestors, trees.variant_root TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION environments.variant_descendants, environments.variant_ancestors, environments.variant_root TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION shared.rebuild_variant_lineage TO service_role;
@@ -0,0 +1,152 @@
+-- Sensor-Tree KNN Linking Migration
+-- Fills sensor.SensorTreeLinks from sensor and tree positions instead of by
+-- hand: every active sensor whose type has a linking rule is linked to its
+-- nearest trees within the rule's distance. Candidates come from the GiST
+-- indexes on sensor.Sensors.Position and trees.Trees.Position (bounding box
+-- plus KNN ordering), and the exact distance is checked on the spheroid.
+-- Also adds lookups for sensors and readings within R metres of a tree.
+
+SET search_path TO sensor, trees, shared, public;
+
+-- 1. Metre-based bounding box usable with the geometry GiST indexes
+CREATE OR REPLACE FUNCTION shared.metre_bbox(geom extensions.GEOMETRY, metres DOUBLE PRECISION)
+RETURNS extensions.GEOMETRY AS $$
+    -- Away from the equator a metre spans more degrees of longitude than of
+    -- latitude, so expanding by the longitude conversion covers both axes
+    SELECT extensions.ST_Expand(
+        geom,
+        metres / (111320.0 * GREATEST(cos(radians(extensions.ST_Y(geom))), 0.01))
+    )
+$$ LANGUAGE sql IMMUTABLE STRICT;
+
+COMMENT ON FUNCTION shared.metre_bbox IS 'Box around a WGS84 point that contains every point within the given metres (index prefilter for ST_DWithin on geography)';
+
+-- 2. Linking rules per sensor type
+CREATE TABLE IF NOT EXISTS sensor.SensorTypeLinkRules (
+    SensorTypeID INTEGER PRIMARY KEY REFERENCES sensor.SensorTypes(SensorTypeID) ON DELETE CASCADE,
+    MaxDistance_m NUMERIC(8, 2) NOT NULL CHECK (MaxDistance_m > 0),
+    MaxTrees INTEGER NOT NULL DEFAULT 1 CHECK (MaxTrees >= 1)
+);
+
+COMMENT ON TABLE sensor.SensorTypeLinkRules IS 'Distance threshold and number of nearest trees linked per sensor type';
+
+-- Stem-mounted sensors belong to one tree; soil sensors describe the trees around them
+INSERT INTO sensor.SensorTypeLinkRules (SensorTypeID, MaxDistance_m, MaxTrees)
+SELECT SensorTypeID, rule.MaxDistance_m, rule.MaxTrees
+FROM sensor.SensorTypes
+JOIN (VALUES
+    ('Sap_Flow', 1.5, 1),
+    ('Stem_Radial_Variation', 1.5, 1),
+    ('Leaf_Wetness', 5.0, 1),
+    ('Soil_Moisture', 5.0, 3),
+    ('Soil_Temperature', 5.0, 3)
+) AS rule(SensorTypeName, MaxDistance_m, MaxTrees) USING (SensorTypeName)
+ON CONFLICT (SensorTypeID) DO NOTHING;
+
+-- 3. Track how a link was made, so rebuilds never touch manual links
+ALTER TABLE sensor.SensorTreeLinks
+ADD COLUMN IF NOT EXISTS LinkMethod VARCHAR(20) NOT NULL DEFAULT 'manual' CHECK (LinkMethod IN ('manual', 'knn')),
+ADD COLUMN IF NOT EXISTS Distance_m NUMERIC(8, 2);
+
+COMMENT ON COLUMN sensor.SensorTreeLinks.LinkMethod IS 'manual (entered by hand) or knn (sensor.build_sensor_tree_links)';
+COMMENT ON COLUMN sensor.SensorTreeLinks.Distance_m IS 'Sensor to tree distance in metres when the link was made';
+
+CREATE INDEX IF NOT EXISTS idx_sensor_tree_links_tree ON sensor.SensorTreeLinks(TreeVariantID);
+
+-- 4. Bulk linking
+CREATE OR REPLACE FUNCTION sensor.build_sensor_tree_links(location_id_param INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    linked INTEGER;
+BEGIN
+    -- Replace the KNN links of the sensors in scope; manual links stay
+    DELETE FROM sensor.SensorTreeLinks l
+    USING sensor.Sensors s
+    WHERE l.SensorID = s.SensorID
+      AND l.LinkMethod = 'knn'
+      AND (location_id_param IS NULL OR s.LocationID = location_id_param);
+
+    -- Only measured trees without a parent variant are linked, and sensors still
+    -- at the (0, 0) placeholder position from the metadata sync are skipped
+    INSERT INTO sensor.SensorTreeLinks (SensorID, TreeVariantID, Description, LinkMethod, Distance_m)
+    SELECT s.SensorID, nearest.VariantID, 'Nearest tree within ' || r.MaxDistance_m || ' m', 'knn', nearest.Distance_m
+    FROM sensor.Sensors s
+    JOIN sensor.SensorTypeLinkRules r ON r.SensorTypeID = s.SensorTypeID
+    CROSS JOIN LATERAL (
+        SELECT t.VariantID,
+               extensions.ST_Distance(t.Position::extensions.geography, s.Position::extensions.geography) AS Distance_m
+        FROM trees.Trees t
+        WHERE t.Position OPERATOR(extensions.&&) shared.metre_bbox(s.Position, r.MaxDistance_m)
+          AND extensions.ST_DWithin(t.Position::extensions.geography, s.Position::extensions.geography, r.MaxDistance_m)
+          AND t.ParentVariantID IS NULL
+          AND t.ScenarioID IS NULL
+        ORDER BY t.Position OPERATOR(extensions.<->) s.Position
+        LIMIT r.MaxTrees
+    ) nearest
+    WHERE s.IsActive = TRUE
+      AND NOT (extensions.ST_X(s.Position) = 0 AND extensions.ST_Y(s.Position) = 0)
+      AND (location_id_param IS NULL OR s.LocationID = location_id_param)
+    ON CONFLICT (SensorID, TreeVariantID) DO NOTHING;
+
+    GET DIAGNOSTICS linked = ROW_COUNT;
+    RETURN linked;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION sensor.build_sensor_tree_links IS 'Rebuilds KNN sensor-tree links for one plot (or all plots when NULL) in one set-based pass; returns links created';
+
+-- 5. Lookups within R metres of a tree
+CREATE OR REPLACE FUNCTION sensor.sensors_near_tree(
+    tree_variant_id_param INTEGER,
+    radius_m_param DOUBLE PRECISION
+)
+RETURNS TABLE (SensorID INTEGER, SensorTypeName VARCHAR, Distance_m DOUBLE PRECISION) AS $$
+    SELECT s.SensorID,
+           st.SensorTypeName,
+           extensions.ST_Distance(s.Position::extensions.geography, t.Position::extensions.geography)
+    FROM trees.Trees t
+    JOIN sensor.Sensors s
+      ON s.Position OPERATOR(extensions.&&) shared.metre_bbox(t.Position, radius_m_param)
+     AND extensions.ST_DWithin(s.Position::extensions.geography, t.Position::extensions.geography, radius_m_param)
+    JOIN sensor.SensorTypes st ON st.SensorTypeID = s.SensorTypeID
+    WHERE t.VariantID = tree_variant_id_param
+      AND s.IsActive = TRUE
+    ORDER BY 3
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION sensor.sensors_near_tree IS 'Active sensors within radius_m metres of a tree variant, nearest first';
+
+CREATE OR REPLACE FUNCTION sensor.readings_near_tree(
+    tree_variant_id_param INTEGER,
+    radius_m_param DOUBLE PRECISION,
+    start_time_param TIMESTAMPTZ,
+    end_time_param TIMESTAMPTZ DEFAULT NOW(),
+    sensor_type_param VARCHAR DEFAULT NULL
+)
+RETURNS TABLE (
+    SensorID INTEGER,
+    SensorTypeName VARCHAR,
+    Distance_m DOUBLE PRECISION,
+    Timestamp TIMESTAMPTZ,
+    Value NUMERIC,
+    Quality VARCHAR
+) AS $$
+    SELECT n.SensorID, n.SensorTypeName, n.Distance_m, r.Timestamp, r.Value, r.Quality
+    FROM sensor.sensors_near_tree(tree_variant_id_param, radius_m_param) n
+    JOIN sensor.SensorReadings r
+      ON r.SensorID = n.SensorID
+     AND r.Timestamp >= start_time_param
+     AND r.Timestamp < end_time_param
+     AND r.ScenarioID IS NULL
+    WHERE sensor_type_param IS NULL OR n.SensorTypeName = sensor_type_param
+    ORDER BY n.Distance_m, n.SensorID, r.Timestamp
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION sensor.readings_near_tree IS 'Real readings between start_time and end_time from sensors within radius_m metres of a tree variant';
+
+-- 6. Grant permissions
+GRANT SELECT ON sensor.SensorTypeLinkRules TO authenticated, anon;
+GRANT ALL ON sensor.SensorTypeLinkRules TO service_role;
+GRANT EXECUTE ON FUNCTION shared.metre_bbox TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION sensor.sensors_near_tree, sensor.readings_near_tree TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION sensor.build_sensor_tree_links TO service_role;
@@ -0,0 +1,199 @@
+-- Tree Metrics Projection Migration
+-- trees.trees_with_metrics used to aggregate stems and call the metric
+-- functions on every read. Its rows are now kept in trees.TreeMetricsProjection
+-- and refreshed incrementally: triggers on Trees, Stems and Species queue the
+-- affected VariantIDs in trees.TreeMetricsPending, and
+-- trees.refresh_tree_metrics() recomputes only those. Until a queued tree is
+-- refreshed, the view computes that one row live, so reads never see stale
+-- metrics. A plot load is an index scan on the projection's LocationID.
+
+SET search_path TO trees, shared, public;
+
+-- 1. The original computation, kept as the source of projected rows
+CREATE OR REPLACE VIEW trees.trees_with_metrics_live AS
+SELECT
+    t.*,
+    s.ScientificName,
+    s.CommonName,
+    COUNT(st.StemID) AS stem_count,
+    SUM(trees.calculate_basal_area(st.DBH_cm)) AS total_basal_area_m2,
+    trees.calculate_crown_volume(t.CrownWidth_m, t.Height_m - t.CrownBaseHeight_m) AS crown_volume_m3
+FROM trees.Trees t
+LEFT JOIN shared.Species s ON t.SpeciesID = s.SpeciesID
+LEFT JOIN trees.Stems st ON t.VariantID = st.TreeVariantID
+GROUP BY t.VariantID, s.SpeciesID;
+
+COMMENT ON VIEW trees.trees_with_metrics_live IS 'Trees with metrics computed on read; source of trees.TreeMetricsProjection';
+
+-- 2. Projection and refresh queue
+CREATE TABLE IF NOT EXISTS trees.TreeMetricsProjection AS
+SELECT * FROM trees.trees_with_metrics_live WITH NO DATA;
+
+ALTER TABLE trees.TreeMetricsProjection ADD PRIMARY KEY (VariantID);
+CREATE INDEX IF NOT EXISTS idx_tree_metrics_location ON trees.TreeMetricsProjection(LocationID);
+CREATE INDEX IF NOT EXISTS idx_tree_metrics_position ON trees.TreeMetricsProjection USING GIST (Position);
+
+COMMENT ON TABLE trees.TreeMetricsProjection IS 'Materialized rows of trees.trees_with_metrics, refreshed by trees.refresh_tree_metrics()';
+
+CREATE TABLE IF NOT EXISTS trees.TreeMetricsPending (
+    VariantID INTEGER PRIMARY KEY,
+    QueuedAt TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE trees.TreeMetricsPending IS 'Tree variants changed since their projection row was last refreshed (deleted trees included)';
+
+-- 3. Change tracking
+CREATE OR REPLACE FUNCTION trees.queue_tree_metrics()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Transition tables are per event, so each trigger reads the ones it declares.
+    -- Already queued rows are updated, not skipped: the writer then holds the row
+    -- lock until it commits, so a concurrent refresh (FOR UPDATE SKIP LOCKED)
+    -- cannot claim and dequeue the variant before the change is visible.
+    IF TG_TABLE_NAME = 'trees' THEN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO trees.TreeMetricsPending (VariantID)
+            SELECT VariantID FROM new_rows
+            ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+        ELSE
+            INSERT INTO trees.TreeMetricsPending (VariantID)
+            SELECT VariantID FROM old_rows
+            ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+        END IF;
+    ELSIF TG_TABLE_NAME = 'stems' THEN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO trees.TreeMetricsPending (VariantID)
+            SELECT DISTINCT TreeVariantID FROM new_rows
+            ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO trees.TreeMetricsPending (VariantID)
+            SELECT TreeVariantID FROM new_rows
+            UNION
+            SELECT TreeVariantID FROM old_rows
+            ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+        ELSE
+            INSERT INTO trees.TreeMetricsPending (VariantID)
+            SELECT DISTINCT TreeVariantID FROM old_rows
+            ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+        END IF;
+    ELSIF TG_TABLE_NAME = 'species' THEN
+        INSERT INTO trees.TreeMetricsPending (VariantID)
+        SELECT t.VariantID
+        FROM trees.Trees t
+        JOIN new_rows n ON n.SpeciesID = t.SpeciesID
+        JOIN old_rows o ON o.SpeciesID = n.SpeciesID
+        WHERE n.ScientificName IS DISTINCT FROM o.ScientificName
+           OR n.CommonName IS DISTINCT FROM o.CommonName
+        ON CONFLICT (VariantID) DO UPDATE SET QueuedAt = NOW();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION trees.queue_tree_metrics IS 'Queues tree variants whose trees_with_metrics row changed (statement-level, transition tables)';
+
+DROP TRIGGER IF EXISTS trigger_trees_metrics_insert ON trees.Trees;
+CREATE TRIGGER trigger_trees_metrics_insert
+    AFTER INSERT ON trees.Trees
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_trees_metrics_update ON trees.Trees;
+CREATE TRIGGER trigger_trees_metrics_update
+    AFTER UPDATE ON trees.Trees
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_trees_metrics_delete ON trees.Trees;
+CREATE TRIGGER trigger_trees_metrics_delete
+    AFTER DELETE ON trees.Trees
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_stems_metrics_insert ON trees.Stems;
+CREATE TRIGGER trigger_stems_metrics_insert
+    AFTER INSERT ON trees.Stems
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_stems_metrics_update ON trees.Stems;
+CREATE TRIGGER trigger_stems_metrics_update
+    AFTER UPDATE ON trees.Stems
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_stems_metrics_delete ON trees.Stems;
+CREATE TRIGGER trigger_stems_metrics_delete
+    AFTER DELETE ON trees.Stems
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+DROP TRIGGER IF EXISTS trigger_species_metrics_update ON shared.Species;
+CREATE TRIGGER trigger_species_metrics_update
+    AFTER UPDATE ON shared.Species
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trees.queue_tree_metrics();
+
+-- 4. Incremental refresh
+CREATE OR REPLACE FUNCTION trees.refresh_tree_metrics(max_rows_param INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    variant_ids INTEGER[];
+BEGIN
+    -- Concurrent refreshes take disjoint sets of queued trees
+    WITH claimed AS (
+        DELETE FROM trees.TreeMetricsPending
+        WHERE VariantID IN (
+            SELECT VariantID FROM trees.TreeMetricsPending
+            ORDER BY QueuedAt
+            LIMIT max_rows_param
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING VariantID
+    )
+    SELECT array_agg(VariantID) INTO variant_ids FROM claimed;
+
+    IF variant_ids IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM trees.TreeMetricsProjection WHERE VariantID = ANY(variant_ids);
+    INSERT INTO trees.TreeMetricsProjection
+    SELECT * FROM trees.trees_with_metrics_live WHERE VariantID = ANY(variant_ids);
+
+    RETURN cardinality(variant_ids);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION trees.refresh_tree_metrics IS 'Recomputes projection rows of queued tree variants (oldest first, at most max_rows); returns trees processed';
+
+-- 5. Initial load (trees loaded by earlier migrations)
+TRUNCATE trees.TreeMetricsPending;
+TRUNCATE trees.TreeMetricsProjection;
+INSERT INTO trees.TreeMetricsProjection SELECT * FROM trees.trees_with_metrics_live;
+ANALYZE trees.TreeMetricsProjection;
+
+-- 6. Serve the view from the projection; queued trees are computed live
+CREATE OR REPLACE VIEW trees.trees_with_metrics AS
+SELECT p.*
+FROM trees.TreeMetricsProjection p
+WHERE NOT EXISTS (SELECT 1 FROM trees.TreeMetricsPending q WHERE q.VariantID = p.VariantID)
+UNION ALL
+SELECT l.*
+FROM trees.trees_with_metrics_live l
+WHERE l.VariantID IN (SELECT VariantID FROM trees.TreeMetricsPending);
+
+COMMENT ON VIEW trees.trees_with_metrics IS 'Trees with computed metrics (basal area, crown volume, stem count), read from trees.TreeMetricsProjection';
+
+-- 7. Grant permissions
+GRANT SELECT ON trees.trees_with_metrics_live, trees.TreeMetricsProjection TO anon, authenticated;
+GRANT ALL ON trees.TreeMetricsProjection, trees.TreeMetricsPending TO service_role;
+GRANT EXECUTE ON FUNCTION trees.refresh_tree_metrics TO service_role;
@@ -0,0 +1,90 @@
+-- Tile Invalidation Migration
+-- The sync service renders Mapbox vector tiles of trees.Trees and
+-- sensor.Sensors (GET /tiles/{z}/{x}/{y}.mvt) and caches them in memory.
+-- These statement-level triggers NOTIFY the service with the WGS84 bounding
+-- box of every write to either table, so only the cached tiles that overlap
+-- it are dropped.
+
+SET search_path TO shared, public;
+
+-- 1. Notification function
+CREATE OR REPLACE FUNCTION shared.notify_tile_invalidation()
+RETURNS TRIGGER AS $$
+DECLARE
+    extent extensions.BOX2D;
+BEGIN
+    -- Transition tables are per event, so each branch reads the ones its trigger declares
+    IF TG_OP = 'INSERT' THEN
+        SELECT extensions.ST_Extent(Position) INTO extent FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT extensions.ST_Extent(Position) INTO extent FROM old_rows;
+    ELSE
+        SELECT extensions.ST_Extent(Position) INTO extent
+        FROM (
+            SELECT Position FROM new_rows
+            UNION ALL
+            SELECT Position FROM old_rows
+        ) changed;
+    END IF;
+
+    IF extent IS NOT NULL THEN
+        PERFORM pg_notify(
+            'tile_invalidation',
+            json_build_object(
+                'layer', TG_TABLE_NAME,
+                'bbox', json_build_array(
+                    extensions.ST_XMin(extent), extensions.ST_YMin(extent),
+                    extensions.ST_XMax(extent), extensions.ST_YMax(extent)
+                )
+            )::TEXT
+        );
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION shared.notify_tile_invalidation IS 'Sends the layer and bounding box of changed trees or sensors on the tile_invalidation channel';
+
+-- 2. Triggers (one per event, since transition tables need single-event triggers)
+DROP TRIGGER IF EXISTS trigger_trees_tiles_insert ON trees.Trees;
+CREATE TRIGGER trigger_trees_tiles_insert
+    AFTER INSERT ON trees.Trees
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
+
+DROP TRIGGER IF EXISTS trigger_trees_tiles_update ON trees.Trees;
+CREATE TRIGGER trigger_trees_tiles_update
+    AFTER UPDATE ON trees.Trees
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
+
+DROP TRIGGER IF EXISTS trigger_trees_tiles_delete ON trees.Trees;
+CREATE TRIGGER trigger_trees_tiles_delete
+    AFTER DELETE ON trees.Trees
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
+
+DROP TRIGGER IF EXISTS trigger_sensors_tiles_insert ON sensor.Sensors;
+CREATE TRIGGER trigger_sensors_tiles_insert
+    AFTER INSERT ON sensor.Sensors
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
+
+DROP TRIGGER IF EXISTS trigger_sensors_tiles_update ON sensor.Sensors;
+CREATE TRIGGER trigger_sensors_tiles_update
+    AFTER UPDATE ON sensor.Sensors
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
+
+DROP TRIGGER IF EXISTS trigger_sensors_tiles_delete ON sensor.Sensors;
+CREATE TRIGGER trigger_sensors_tiles_delete
+    AFTER DELETE ON sensor.Sensors
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION shared.notify_tile_invalidation();
@@ -0,0 +1,12 @@
+-- Point Cloud File Catalog Migration
+-- tools/scan_pointclouds.py fills pointclouds.PointClouds from LAS/LAZ/PLY
+-- headers read straight from object storage. Scans are identified by their
+-- S3 URI, so re-running the scanner updates the existing rows instead of
+-- adding duplicates.
+
+SET search_path TO pointclouds, shared, public;
+
+-- 1. One catalogue row per file
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pointclouds_file_path ON pointclouds.PointClouds(FilePath);
+
+COMMENT ON INDEX pointclouds.idx_pointclouds_file_path IS 'Each S3 object is catalogued once; upsert key of tools/scan_pointclouds.py';
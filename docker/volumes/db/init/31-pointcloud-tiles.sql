@@ -0,0 +1,123 @@
+-- Point Cloud Tiles Migration
+-- A registered point cloud is one .las/.laz object that can be gigabytes, so
+-- reading the points around one tree meant fetching the whole file.
+-- tools/tile_pointclouds.py splits a cloud into LAZ tiles on a regular grid or
+-- an octree and registers them here. The lookups below return only the tiles
+-- whose bounds intersect a geometry, a tree's crown or a buffer around either,
+-- so clients fetch a few small objects instead of the full scan.
+
+SET search_path TO pointclouds, shared, public;
+
+-- 1. Tile registry
+CREATE TABLE IF NOT EXISTS pointclouds.PointCloudTiles (
+    TileID SERIAL PRIMARY KEY,
+    VariantID INTEGER NOT NULL REFERENCES pointclouds.PointClouds(VariantID) ON DELETE CASCADE,
+    Scheme VARCHAR(10) NOT NULL CHECK (Scheme IN ('grid', 'octree')),
+    Level SMALLINT NOT NULL DEFAULT 0 CHECK (Level >= 0),
+    TileX INTEGER NOT NULL,
+    TileY INTEGER NOT NULL,
+    TileZ INTEGER NOT NULL DEFAULT 0,
+    Bounds extensions.GEOMETRY(Polygon, 4326) NOT NULL,
+    MinZ DOUBLE PRECISION,
+    MaxZ DOUBLE PRECISION,
+    PointCount BIGINT NOT NULL CHECK (PointCount >= 0),
+    FilePath TEXT NOT NULL,
+    FileSizeMB NUMERIC(12, 2) CHECK (FileSizeMB >= 0),
+    CreatedAt TIMESTAMPTZ DEFAULT NOW(),
+    CONSTRAINT uq_pointcloud_tile UNIQUE (VariantID, Level, TileX, TileY, TileZ),
+    CONSTRAINT chk_tile_filepath CHECK (FilePath ~ '^s3://[a-z0-9][a-z0-9\-]*[a-z0-9]/.*\.(las|laz)$')
+);
+
+COMMENT ON TABLE pointclouds.PointCloudTiles IS 'Spatial tiles of a point cloud variant, each stored as its own LAZ object';
+COMMENT ON COLUMN pointclouds.PointCloudTiles.Scheme IS 'grid (fixed tile size, Level 0) or octree (Level is the depth, TileX/Y/Z the cell at that depth)';
+COMMENT ON COLUMN pointclouds.PointCloudTiles.Bounds IS 'Horizontal extent of the points in the tile, in WGS84';
+COMMENT ON COLUMN pointclouds.PointCloudTiles.MinZ IS 'Lowest point elevation in the tile, in source CRS units';
+COMMENT ON COLUMN pointclouds.PointCloudTiles.MaxZ IS 'Highest point elevation in the tile, in source CRS units';
+
+CREATE INDEX IF NOT EXISTS idx_pointcloud_tiles_bounds ON pointclouds.PointCloudTiles USING GIST (Bounds);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pointcloud_tiles_file_path ON pointclouds.PointCloudTiles(FilePath);
+
+-- 2. Tile lookups
+CREATE OR REPLACE FUNCTION pointclouds.tiles_intersecting(
+    geom_param extensions.GEOMETRY,
+    buffer_m_param DOUBLE PRECISION DEFAULT 0,
+    variant_id_param INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    TileID INTEGER,
+    VariantID INTEGER,
+    Level SMALLINT,
+    FilePath TEXT,
+    PointCount BIGINT,
+    MinZ DOUBLE PRECISION,
+    MaxZ DOUBLE PRECISION,
+    Bounds extensions.GEOMETRY
+) AS $$
+    WITH area AS (
+        SELECT CASE
+                   WHEN buffer_m_param > 0
+                   THEN extensions.ST_Buffer(geom_param::extensions.geography, buffer_m_param)::extensions.GEOMETRY
+                   ELSE geom_param
+               END AS geom
+    )
+    SELECT t.TileID, t.VariantID, t.Level, t.FilePath, t.PointCount, t.MinZ, t.MaxZ, t.Bounds
+    FROM pointclouds.PointCloudTiles t, area
+    WHERE t.Bounds OPERATOR(extensions.&&) area.geom
+      AND extensions.ST_Intersects(t.Bounds, area.geom)
+      AND (variant_id_param IS NULL OR t.VariantID = variant_id_param)
+    ORDER BY t.VariantID, t.Level, t.TileX, t.TileY, t.TileZ
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION pointclouds.tiles_intersecting IS 'Tiles whose bounds intersect a WGS84 geometry widened by buffer_m metres, optionally of one point cloud variant';
+
+CREATE OR REPLACE FUNCTION pointclouds.tiles_for_tree(
+    tree_variant_id_param INTEGER,
+    buffer_m_param DOUBLE PRECISION DEFAULT 0,
+    pointcloud_variant_id_param INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    TileID INTEGER,
+    VariantID INTEGER,
+    Level SMALLINT,
+    FilePath TEXT,
+    PointCount BIGINT,
+    MinZ DOUBLE PRECISION,
+    MaxZ DOUBLE PRECISION,
+    Bounds extensions.GEOMETRY
+) AS $$
+    -- Trees without a crown polygon use a circle of their crown width around the stem position
+    SELECT tiles.*
+    FROM trees.Trees t
+    CROSS JOIN LATERAL pointclouds.tiles_intersecting(
+        COALESCE(t.CrownBoundary, t.Position),
+        buffer_m_param + CASE
+            WHEN t.CrownBoundary IS NULL THEN COALESCE(t.CrownWidth_m / 2, 0)
+            ELSE 0
+        END,
+        pointcloud_variant_id_param
+    ) tiles
+    WHERE t.VariantID = tree_variant_id_param
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION pointclouds.tiles_for_tree IS 'Tiles intersecting a tree crown (CrownBoundary, else a crown-width circle) widened by buffer_m metres';
+
+-- 3. Row level security (same access as pointclouds.PointClouds)
+ALTER TABLE pointclouds.PointCloudTiles ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Point cloud tiles are viewable by everyone" ON pointclouds.PointCloudTiles;
+CREATE POLICY "Point cloud tiles are viewable by everyone"
+    ON pointclouds.PointCloudTiles FOR SELECT
+    USING (true);
+
+DROP POLICY IF EXISTS "Service role can manage all point cloud tiles" ON pointclouds.PointCloudTiles;
+CREATE POLICY "Service role can manage all point cloud tiles"
+    ON pointclouds.PointCloudTiles FOR ALL
+    TO service_role
+    USING (true)
+    WITH CHECK (true);
+
+-- 4. Grant permissions
+GRANT SELECT ON pointclouds.PointCloudTiles TO anon, authenticated;
+GRANT ALL ON pointclouds.PointCloudTiles TO service_role;
+GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA pointclouds TO authenticated, service_role;
+GRANT EXECUTE ON FUNCTION pointclouds.tiles_intersecting, pointclouds.tiles_for_tree TO anon, authenticated, service_role;
@@ -0,0 +1,49 @@
+-- Inventory Source Keys Migration
+-- tools/load_inventory.py imports ODK/inventory CSV exports incrementally.
+-- Each tree row remembers the key it had in its source file (EcoSense full_id,
+-- Mathisle QR code), so a later export updates the trees it already contains
+-- and only adds the new ones. Trees loaded by 19-load-csv-data.sql get their
+-- keys from the FieldNotes written at that import.
+
+SET search_path TO trees, shared, public;
+
+-- 1. Source key column
+ALTER TABLE trees.Trees ADD COLUMN IF NOT EXISTS SourceKey VARCHAR(200);
+
+COMMENT ON COLUMN trees.Trees.SourceKey IS 'Identifier of the tree in its inventory export (full_id, QR code); unique per location';
+
+-- 2. Keys of the trees imported at container init
+-- Matches the keys built by tools/load_inventory.py: full_id or fid:<fid> for
+-- EcoSense, QR code or measured:<date_time> for Mathisle. Re-measured trees
+-- appear twice in the exports; the last row wins, as in the loader.
+WITH candidates AS (
+    SELECT VariantID, LocationID,
+           CASE CreatedBy
+               WHEN 'ecosense_csv_import' THEN COALESCE(
+                   substring(FieldNotes FROM 'TreeID: ([^ |]+)'),
+                   'fid:' || substring(FieldNotes FROM 'FID: ([0-9]+)')
+               )
+               WHEN 'mathisle_csv_import' THEN COALESCE(
+                   substring(FieldNotes FROM 'QR Code: ([^ |]+)'),
+                   'measured:' || substring(FieldNotes FROM 'Measured: ([^|]+?) \|')
+               )
+           END AS SourceKey
+    FROM trees.Trees
+    WHERE CreatedBy IN ('ecosense_csv_import', 'mathisle_csv_import')
+      AND SourceKey IS NULL
+),
+latest AS (
+    SELECT DISTINCT ON (LocationID, SourceKey) VariantID, SourceKey
+    FROM candidates
+    WHERE SourceKey IS NOT NULL
+    ORDER BY LocationID, SourceKey, VariantID DESC
+)
+UPDATE trees.Trees t
+SET SourceKey = latest.SourceKey
+FROM latest
+WHERE t.VariantID = latest.VariantID;
+
+-- 3. One tree per key and location
+CREATE UNIQUE INDEX IF NOT EXISTS idx_trees_source_key
+    ON trees.Trees(LocationID, SourceKey)
+    WHERE SourceKey IS NOT NULL;
@@ -0,0 +1,54 @@
+-- Aquarius CSV Imports Migration
+-- tools/import_aquarius.py loads any number of Aquarius CSV exports
+-- (---,TimeStamp,Value,Parameter,TimeseriesID) without a migration per file.
+-- Each file is resolved to sensors by its TimeseriesID and remembered by
+-- content hash, so archives can be re-run and only new or changed files load.
+
+SET search_path TO sensor, shared, public;
+
+-- 1. Imported files
+CREATE TABLE IF NOT EXISTS sensor.AquariusImports (
+    FileHash CHAR(64) PRIMARY KEY,
+    FileName TEXT NOT NULL,
+    RowCount INTEGER NOT NULL CHECK (RowCount >= 0),
+    WrittenCount INTEGER NOT NULL CHECK (WrittenCount >= 0),
+    ImportedAt TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE sensor.AquariusImports IS 'Aquarius CSV exports loaded by tools/import_aquarius.py; files with a known hash are skipped';
+COMMENT ON COLUMN sensor.AquariusImports.FileHash IS 'SHA-256 hex digest of the file content';
+COMMENT ON COLUMN sensor.AquariusImports.WrittenCount IS 'Readings inserted or changed by the import (unchanged rows are not rewritten)';
+
+-- 2. Time series identifiers of the sensors created by 20-load-sensor-data.sql
+-- Stored in ExternalMetadata, like the descriptions written by the sync, so the
+-- importer finds these sensors. ExternalID (the Aquarius UniqueId) stays NULL;
+-- the sync's metadata run adopts the sensor when it sees the same series. A
+-- series the sync already created a sensor for keeps that one.
+WITH series (SerialNumber, SensorTypeName, Identifier) AS (
+    VALUES
+        ('DouglasFir_Mixed_5', 'Sap_Flow', 'Sapflow.DouglasFir_Mixed_5_Total_SapFlow@Ecosense_MixedPlot'),
+        ('DouglasFir_Mixed_5_edge_E', 'Soil_Moisture', 'SoilMoisture.DouglasFir_Mixed_5_edge_E@Ecosense_MixedPlot'),
+        ('DouglasFir_Mixed_5_edge_E', 'Soil_Temperature', 'SoilTemp.DouglasFir_Mixed_5_edge_E@Ecosense_MixedPlot'),
+        ('DouglasFir_Mixed_5', 'Stem_Radial_Variation', 'StemRadialVar.DouglasFir_Mixed_5_Dendrometer@Ecosense_MixedPlot')
+)
+UPDATE sensor.Sensors s
+SET ExternalMetadata = COALESCE(s.ExternalMetadata, '{}'::jsonb) || jsonb_build_object('Identifier', series.Identifier)
+FROM series, sensor.SensorTypes st
+WHERE st.SensorTypeName = series.SensorTypeName
+  AND s.SensorTypeID = st.SensorTypeID
+  AND s.SerialNumber = series.SerialNumber
+  AND s.CreatedBy = 'ecosense_sensor_import'
+  AND s.ExternalMetadata->>'Identifier' IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM sensor.Sensors other
+      WHERE other.ExternalMetadata->>'Identifier' = series.Identifier
+  );
+
+-- 3. One sensor per time series identifier
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sensors_external_identifier
+    ON sensor.Sensors((ExternalMetadata->>'Identifier'))
+    WHERE ExternalMetadata->>'Identifier' IS NOT NULL;
+
+-- 4. Grant permissions
+GRANT ALL ON sensor.AquariusImports TO service_role;
+GRANT SELECT ON sensor.AquariusImports TO authenticated;
@@ -0,0 +1,180 @@
+"""Asyncio Aquarius Publish client.
+
+One httpx.AsyncClient (HTTP/2 where the server negotiates it) is shared for
+the lifetime of the FastAPI app, so connections are reused across requests.
+get_data_many fans out over many series with a bounded number of requests in
+flight instead of one thread per request.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from .auth import TOKEN_HEADER, aquarius_base_url, tokens
+from .config import settings
+from .metrics import AQUARIUS_REQUEST_SECONDS, AQUARIUS_REQUESTS_TOTAL, RATE_LIMIT_HITS_TOTAL
+from .profiling import stage
+from .ratelimit import limits, retry_after_seconds
+from .sync import MAX_THROTTLED_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+def _aquarius_time(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class AsyncAquariusClient:
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.base_url = aquarius_base_url()
+        self.max_concurrency = max_concurrency or settings.AQUARIUS_MAX_CONCURRENCY
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "AsyncAquariusClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        """Open the shared connection pool"""
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=settings.AQUARIUS_HTTP2,
+            timeout=httpx.Timeout(settings.AQUARIUS_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Send an authenticated, rate-limited request (see AquariusClient._request)"""
+        if self._client is None:
+            raise RuntimeError("AsyncAquariusClient.start() has not been called")
+        bucket = limits.bucket(f"aquarius:{endpoint}")
+        reauthenticated = False
+        for _ in range(MAX_THROTTLED_RETRIES + 1):
+            await bucket.acquire_async()
+            # Logins are rare and blocking, so they run off the event loop
+            token = tokens.cached() or await asyncio.to_thread(tokens.token)
+            started = time.perf_counter()
+            with stage(f"aquarius:{endpoint}"):
+                response = await self._client.request(
+                    method, f"/{endpoint}", headers={TOKEN_HEADER: token}, **kwargs
+                )
+            AQUARIUS_REQUEST_SECONDS.labels(endpoint).observe(
+                time.perf_counter() - started
+            )
+            AQUARIUS_REQUESTS_TOTAL.labels(endpoint, str(response.status_code)).inc()
+            if response.status_code == 429:
+                RATE_LIMIT_HITS_TOTAL.labels("aquarius").inc()
+                bucket.on_throttled(retry_after_seconds(response.headers))
+            elif response.status_code == 401 and not reauthenticated:
+                tokens.invalidate(token)
+                reauthenticated = True
+            else:
+                bucket.on_success()
+                return response
+        return response
+
+    async def connect(self) -> bool:
+        """Make sure the process-wide session is authenticated"""
+        return await asyncio.to_thread(tokens.try_token) is not None
+
+    async def disconnect(self):
+        # The session token is shared per process and outlives single sync runs
+        pass
+
+    async def get_time_series_descriptions(self) -> List[Dict]:
+        try:
+            response = await self._request("GET", "GetTimeSeriesDescriptionList")
+            if response.status_code == 200:
+                return response.json().get("TimeSeriesDescriptions", [])
+            return []
+        except Exception as e:
+            logger.error(f"Error fetching descriptions: {e}")
+            return []
+
+    async def get_data(
+        self, unique_id: str, start_time: datetime, end_time: datetime
+    ) -> List[Dict]:
+        try:
+            params = {
+                "TimeSeriesUniqueId": unique_id,
+                "QueryFrom": _aquarius_time(start_time),
+                "QueryTo": _aquarius_time(end_time),
+            }
+            response = await self._request(
+                "GET", "GetTimeSeriesCorrectedData", params=params
+            )
+            if response.status_code == 200:
+                with stage("json_decode"):
+                    return response.json().get("Points", [])
+            return []
+        except Exception as e:
+            logger.error(f"Error fetching data for {unique_id}: {e}")
+            return []
+
+    async def iter_data(
+        self, unique_ids: Iterable[str], start_time: datetime, end_time: datetime
+    ):
+        """Yield (unique_id, points) as fetches complete, at most max_concurrency at a time
+
+        Ids are fed to max_concurrency workers through a bounded queue and results
+        wait in another, so a slow consumer holds back fetching: at most
+        max_concurrency requests and max_concurrency unconsumed results exist.
+        """
+        workers = self.max_concurrency
+        pending: asyncio.Queue = asyncio.Queue(maxsize=workers)
+        results: asyncio.Queue = asyncio.Queue(maxsize=workers)
+
+        async def feed():
+            for unique_id in unique_ids:
+                await pending.put(unique_id)
+            for _ in range(workers):
+                await pending.put(None)
+
+        async def work():
+            # get_data logs and swallows request errors, so every worker reaches the end
+            while True:
+                unique_id = await pending.get()
+                if unique_id is None:
+                    break
+                points = await self.get_data(unique_id, start_time, end_time)
+                await results.put((unique_id, points))
+            await results.put(None)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks += [asyncio.create_task(work()) for _ in range(workers)]
+        try:
+            running = workers
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_data_many(
+        self, unique_ids: Iterable[str], start_time: datetime, end_time: datetime
+    ) -> Dict[str, List[Dict]]:
+        return {
+            unique_id: points
+            async for unique_id, points in self.iter_data(
+                unique_ids, start_time, end_time
+            )
+        }
@@ -0,0 +1,103 @@
+"""Process-wide Aquarius session token.
+
+Both the blocking and the asyncio client take their X-Authentication-Token from
+one AquariusTokenManager, so a process logs in once instead of once per sync
+call. The token is refreshed shortly before AQUARIUS_SESSION_TTL_SECONDS runs
+out, or straight away when a request comes back 401. A lock ensures that
+concurrent workers hitting an expired token trigger a single login.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from .config import settings
+from .metrics import AQUARIUS_REQUEST_SECONDS, AQUARIUS_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Authentication-Token"
+
+
+def aquarius_base_url() -> str:
+    hostname = settings.AQUARIUS_HOSTNAME.rstrip("/")
+    if "/AQUARIUS" in hostname:
+        return f"{hostname}/Publish/v2"
+    return f"{hostname}/AQUARIUS/Publish/v2"
+
+
+class AquariusTokenManager:
+    def __init__(self):
+        self.base_url = aquarius_base_url()
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+
+    def token(self) -> str:
+        """Return a valid token, logging in if there is none or it is about to expire"""
+        with self._lock:
+            if self._token is None or time.monotonic() >= self._expires_at:
+                self._login()
+            return self._token
+
+    def cached(self) -> Optional[str]:
+        """The current token if it is still fresh, without taking the lock"""
+        token, expires_at = self._token, self._expires_at
+        if token is not None and time.monotonic() < expires_at:
+            return token
+        return None
+
+    def try_token(self) -> Optional[str]:
+        try:
+            return self.token()
+        except Exception as e:
+            logger.error(f"Aquarius connection error: {e}")
+            return None
+
+    def invalidate(self, token: str):
+        """Drop a token the server rejected; a no-op if another thread already refreshed"""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def logout(self):
+        with self._lock:
+            token, self._token = self._token, None
+        if token:
+            try:
+                self._send("DELETE", headers={TOKEN_HEADER: token})
+            except Exception:
+                pass
+
+    def _login(self):
+        response = self._send(
+            "POST",
+            json={
+                "Username": settings.AQUARIUS_USERNAME,
+                "EncryptedPassword": settings.AQUARIUS_PASSWORD,
+            },
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Aquarius login failed with HTTP {response.status_code}")
+        self._token = response.text.strip('\\"')
+        self._expires_at = time.monotonic() + max(
+            settings.AQUARIUS_SESSION_TTL_SECONDS
+            - settings.AQUARIUS_SESSION_REFRESH_MARGIN_SECONDS,
+            0,
+        )
+        logger.info("Authenticated Aquarius session")
+
+    def _send(self, method: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        response = requests.request(
+            method, f"{self.base_url}/session", timeout=30, **kwargs
+        )
+        AQUARIUS_REQUEST_SECONDS.labels("session").observe(time.perf_counter() - started)
+        AQUARIUS_REQUESTS_TOTAL.labels("session", str(response.status_code)).inc()
+        return response
+
+
+tokens = AquariusTokenManager()
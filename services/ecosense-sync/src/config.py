@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 
@@ -6,6 +8,19 @@ class Settings(BaseSettings):
     AQUARIUS_HOSTNAME: str
     AQUARIUS_USERNAME: str
     AQUARIUS_PASSWORD: str
+    AQUARIUS_ASYNC: bool = False  # fetch readings with the asyncio client
+    AQUARIUS_HTTP2: bool = True
+    AQUARIUS_MAX_CONCURRENCY: int = 16
+    AQUARIUS_TIMEOUT_SECONDS: float = 60.0
+    AQUARIUS_SESSION_TTL_SECONDS: int = 3600
+    AQUARIUS_SESSION_REFRESH_MARGIN_SECONDS: int = 300
+
+    # Rate Limits (requests per second per bucket, shared by all clients in the process)
+    RATE_LIMIT_DEFAULT_PER_SECOND: float = 5.0
+    RATE_LIMIT_BUDGETS: Dict[str, float] = {
+        "aquarius:GetTimeSeriesCorrectedData": 10.0,
+        "aquarius:GetTimeSeriesDescriptionList": 1.0,
+    }
 
     # Database Settings
     DB_HOST: str
@@ -18,6 +33,53 @@ class Settings(BaseSettings):
     SYNC_INTERVAL_MINUTES: int = 60
     DEFAULT_DAYS_BACK: int = 30
 
+    # Job Manager Settings
+    SYNC_MAX_CONCURRENT_JOBS: int = 1  # more than one only makes sense with SYNC_SHARDED
+    SYNC_JOB_HISTORY: int = 100  # finished jobs kept for GET /sync/jobs/{id}
+
+    # Sharded Sync Settings (several workers sharing sensor.SensorSyncState)
+    SYNC_SHARDED: bool = False
+    SYNC_WORKER_ID: str = ""  # defaults to <hostname>-<pid>
+    SYNC_SHARD_CLAIM_SIZE: int = 10
+    SYNC_SHARD_LEASE_SECONDS: int = 900
+    SYNC_SHARD_FRESHNESS_MINUTES: int = 30
+
+    # Adaptive Scheduling Settings (per-sensor polling instead of the hourly burst)
+    SYNC_ADAPTIVE: bool = False
+    SYNC_ADAPTIVE_TICK_SECONDS: int = 30
+    SYNC_ADAPTIVE_MIN_INTERVAL_SECONDS: int = 300
+    SYNC_ADAPTIVE_MAX_INTERVAL_SECONDS: int = 6 * 3600
+    SYNC_ADAPTIVE_MAX_PER_TICK: int = 50
+    SYNC_ADAPTIVE_LATENCY_FACTOR: float = 50.0  # interval >= factor * avg latency
+
+    # Push Ingestion Settings (POST /ingest)
+    INGEST_TOKEN: str = ""  # if set, gateways must send Authorization: Bearer <token>
+    INGEST_BATCH_ROWS: int = 10000  # rows per COPY batch
+    INGEST_SENSOR_CACHE_SECONDS: int = 300  # ExternalID -> SensorID map lifetime
+
+    # Live Feed Settings (LISTEN/NOTIFY -> GET /live/readings)
+    LIVE_FEED: bool = True
+    LIVE_CHANNEL: str = "sensor_readings"
+    LIVE_QUEUE_SIZE: int = 100  # events buffered per client before the oldest are dropped
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Vector Tile Settings (GET /tiles/{z}/{x}/{y}.mvt, see src/tiles.py)
+    TILE_MIN_ZOOM: int = 12  # lower zooms return empty tiles
+    TILE_CACHE_MAX_TILES: int = 5000
+    TILE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TILE_CACHE_TTL_SECONDS: int = 600  # cached tiles older than this are re-rendered
+    TILE_DB_POOL_SIZE: int = 4
+    TILE_MAX_AGE_SECONDS: int = 60  # Cache-Control max-age sent to clients
+
+    # Projection Settings (trees.TreeMetricsProjection, see src/projections.py)
+    TREE_METRICS_REFRESH_SECONDS: int = 60  # 0 disables the refresh job
+    TREE_METRICS_REFRESH_BATCH: int = 5000  # tree variants per committed batch
+
+    # Profiling Settings (per-stage timings and folded stacks, see src/profiling.py)
+    SYNC_PROFILE: bool = False  # profile every job, not only ?profile=true requests
+    SYNC_PROFILE_DIR: str = "/tmp/ecosense-profiles"
+    SYNC_PROFILE_INTERVAL_MS: float = 5.0
+
     class Config:
         env_file = ".env"
 
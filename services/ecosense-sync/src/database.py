@@ -1,6 +1,10 @@
 import logging
+import select
+import threading
+from typing import Callable, Iterable, Optional
 
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 
 from .config import settings
@@ -21,3 +25,46 @@ def get_db_connection():
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise e
+
+
+def listen(
+    channels: Iterable[str],
+    on_notify: Callable[[str, str], None],
+    stop: threading.Event,
+    on_connect: Optional[Callable[[], None]] = None,
+):
+    """LISTEN on a dedicated connection until stop is set, reconnecting with backoff.
+
+    on_notify(channel, payload) runs on the calling thread for every notification.
+    on_connect() runs after every (re)connect, once LISTEN is active: notifications
+    sent while the connection was down are lost, so state derived from them
+    should be reset there.
+    """
+    channels = list(channels)
+    backoff = 1.0
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                for channel in channels:
+                    cur.execute(f"LISTEN {channel}")
+            logger.info(f"Listening on channels {', '.join(channels)}")
+            if on_connect is not None:
+                on_connect()
+            backoff = 1.0
+            while not stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    on_notify(notify.channel, notify.payload)
+        except Exception as e:
+            logger.error(f"LISTEN connection on {', '.join(channels)} lost: {e}")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+        finally:
+            if conn is not None:
+                conn.close()
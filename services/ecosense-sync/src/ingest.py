@@ -0,0 +1,360 @@
+"""Push ingestion of sensor readings from field gateways.
+
+POST /ingest accepts a (chunked) NDJSON or CSV body of readings keyed by
+sensor ExternalID:
+
+  {"external_id": "...", "timestamp": "2024-05-01T12:00:00Z", "value": 12.3, "quality": "good"}
+
+  external_id,timestamp,value,quality
+  ...,2024-05-01T12:00:00Z,12.3,good
+
+The body is parsed while it streams in. ExternalIDs are resolved from an
+in-process map that is reloaded every INGEST_SENSOR_CACHE_SECONDS, or sooner
+when an unknown ID shows up. Valid rows are sent in batches of
+INGEST_BATCH_ROWS: COPY into a temporary staging table, then one upsert into
+sensor.SensorReadings. Retransmitted rows are therefore harmless, and
+unchanged values are not rewritten. While one batch is written, the next is
+parsed.
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .config import settings
+from .database import get_db_connection
+from .live import notify_readings
+from .metrics import DB_ROWS_PER_BATCH, DB_WRITE_SECONDS, INGEST_ROWS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+QUALITIES = {"good", "suspect", "bad", "missing", "calibration"}
+# Rejected-row messages returned to the gateway
+MAX_REPORTED_ERRORS = 20
+# Minimum time between cache reloads triggered by unknown ExternalIDs
+MISS_RELOAD_SECONDS = 5.0
+
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS ingest_readings (
+    SensorID INTEGER NOT NULL,
+    Timestamp TIMESTAMPTZ NOT NULL,
+    Value NUMERIC(12, 4) NOT NULL,
+    Quality VARCHAR(50) NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+
+# The staging batch can hold one sensor/timestamp twice; the last row wins
+UPSERT_SQL = """
+INSERT INTO sensor.SensorReadings (SensorID, Timestamp, Value, Quality)
+SELECT DISTINCT ON (SensorID, Timestamp) SensorID, Timestamp, Value, Quality
+FROM ingest_readings
+ORDER BY SensorID, Timestamp, ctid DESC
+ON CONFLICT (SensorID, Timestamp) WHERE ScenarioID IS NULL
+DO UPDATE SET Value = EXCLUDED.Value, Quality = EXCLUDED.Quality
+WHERE sensor.SensorReadings.Value IS DISTINCT FROM EXCLUDED.Value
+   OR sensor.SensorReadings.Quality IS DISTINCT FROM EXCLUDED.Quality
+RETURNING SensorID, Timestamp, Value
+"""
+
+
+class IngestError(ValueError):
+    """The request as a whole cannot be ingested (bad format or header)"""
+
+
+class SensorIdCache:
+    """ExternalID -> SensorID for active sensors, shared by all ingest requests
+
+    Reloads use their own short-lived connection, so they never interleave with
+    a batch that is being written on the request's connection.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.INGEST_SENSOR_CACHE_SECONDS
+        self._ids: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, external_id: str) -> Optional[int]:
+        return self._ids.get(external_id)
+
+    def age(self) -> float:
+        if self._loaded_at is None:
+            return math.inf
+        return time.monotonic() - self._loaded_at
+
+    def stale(self) -> bool:
+        return self.age() >= self.ttl_seconds
+
+    def refresh(self, min_age: float):
+        """Reload unless another request reloaded within min_age seconds"""
+        with self._lock:
+            if self.age() < min_age:
+                return
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        SELECT ExternalID, SensorID FROM sensor.Sensors
+                        WHERE ExternalID IS NOT NULL AND IsActive = TRUE
+                    """
+                    )
+                    self._ids = dict(cur.fetchall())
+            finally:
+                conn.close()
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(self._ids)} sensor ExternalIDs for ingestion")
+
+
+sensor_ids = SensorIdCache()
+
+
+class IngestResult:
+    def __init__(self):
+        self.received = 0
+        self.written = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.batches = 0
+        self.unknown_external_ids: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self._started = time.perf_counter()
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def to_dict(self) -> Dict:
+        seconds = time.perf_counter() - self._started
+        return {
+            "received": self.received,
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "unknown_sensors": sum(self.unknown_external_ids.values()),
+            "unknown_external_ids": sorted(self.unknown_external_ids)[:MAX_REPORTED_ERRORS],
+            "errors": self.errors,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.received / seconds, 1) if seconds else 0.0,
+        }
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines as chunks arrive"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _parse_timestamp(value) -> str:
+    if not isinstance(value, str) or not value:
+        raise ValueError("missing timestamp")
+    ts = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.isoformat()
+
+
+def _parse_value(value) -> float:
+    if value is None or value == "":
+        raise ValueError("missing value")
+    number = float(value)
+    # SensorReadings.Value is NUMERIC(12, 4)
+    if not math.isfinite(number) or abs(number) >= 1e8:
+        raise ValueError(f"value {value!r} is out of range")
+    return number
+
+
+def _parse_quality(value) -> str:
+    if value is None or value == "":
+        return "good"
+    quality = str(value).strip().lower()
+    if quality not in QUALITIES:
+        raise ValueError(f"unknown quality {value!r}")
+    return quality
+
+
+class _Columns:
+    """Positions of the known columns in a CSV header"""
+
+    ALIASES = {
+        "external_id": "external_id",
+        "externalid": "external_id",
+        "timestamp": "timestamp",
+        "value": "value",
+        "quality": "quality",
+    }
+
+    def __init__(self, header: List[str]):
+        positions = {}
+        for index, name in enumerate(header):
+            key = self.ALIASES.get(name.strip().lower())
+            if key:
+                positions[key] = index
+        missing = {"external_id", "timestamp", "value"} - set(positions)
+        if missing:
+            raise IngestError(f"CSV header is missing {', '.join(sorted(missing))}")
+        self.positions = positions
+
+    def record(self, fields: List[str]) -> Dict[str, Optional[str]]:
+        return {
+            key: fields[index] if index < len(fields) else None
+            for key, index in self.positions.items()
+        }
+
+
+def _record_from_ndjson(line: str) -> Dict:
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    return {
+        "external_id": record.get("external_id", record.get("ExternalID")),
+        "timestamp": record.get("timestamp", record.get("Timestamp")),
+        "value": record.get("value", record.get("Value")),
+        "quality": record.get("quality", record.get("Quality")),
+    }
+
+
+def _copy_batch(conn, batch: List[Tuple[int, str, float, str]]) -> int:
+    """COPY one batch into the staging table and upsert it; returns rows written"""
+    buffer = io.StringIO()
+    for sensor_id, ts, value, quality in batch:
+        buffer.write(f"{sensor_id}\t{ts}\t{value!r}\t{quality}\n")
+    buffer.seek(0)
+
+    DB_ROWS_PER_BATCH.labels("SensorReadings").observe(len(batch))
+    with DB_WRITE_SECONDS.labels("SensorReadings").time():
+        with conn.cursor() as cur:
+            cur.execute(STAGING_DDL)
+            cur.copy_expert(
+                "COPY ingest_readings (SensorID, Timestamp, Value, Quality) FROM STDIN",
+                buffer,
+            )
+            cur.execute(UPSERT_SQL)
+            # Only inserted or changed rows come back; unchanged and duplicate
+            # rows are not announced on the live feed
+            written = cur.fetchall()
+            if written:
+                notify_readings(cur, written)
+        conn.commit()
+    return len(written)
+
+
+async def ingest_stream(
+    chunks: AsyncIterator[bytes], content_type: str, result: IngestResult
+) -> IngestResult:
+    """Parse an NDJSON or CSV stream and write it in COPY batches.
+
+    Batches committed before an error stay written; result holds the counts so far.
+    """
+    is_csv = "csv" in content_type.lower()
+    conn = await asyncio.to_thread(get_db_connection)
+    pending_write: Optional[asyncio.Task] = None
+
+    async def flush(batch: List[Tuple[int, str, float, str]]):
+        nonlocal pending_write
+        await collect()
+        pending_write = asyncio.create_task(asyncio.to_thread(_copy_batch, conn, batch))
+
+    async def collect():
+        nonlocal pending_write
+        task, pending_write = pending_write, None
+        if task is not None:
+            result.written += await task
+            result.batches += 1
+
+    try:
+        columns: Optional[_Columns] = None
+        batch: List[Tuple[int, str, float, str]] = []
+        batch_size = settings.INGEST_BATCH_ROWS
+        line_number = 0
+        if sensor_ids.stale():
+            await asyncio.to_thread(sensor_ids.refresh, sensor_ids.ttl_seconds)
+
+        async for line in _lines(chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            if is_csv and columns is None:
+                columns = _Columns(next(csv.reader([line])))
+                continue
+
+            result.received += 1
+            try:
+                if is_csv:
+                    record = columns.record(next(csv.reader([line])))
+                else:
+                    record = _record_from_ndjson(line)
+                external_id = record["external_id"]
+                if not external_id:
+                    raise ValueError("missing external_id")
+                row = (
+                    _parse_timestamp(record["timestamp"]),
+                    _parse_value(record["value"]),
+                    _parse_quality(record.get("quality")),
+                )
+            except (ValueError, TypeError) as e:
+                result.reject(line_number, str(e))
+                continue
+
+            external_id = str(external_id)
+            sensor_id = sensor_ids.get(external_id)
+            if sensor_id is None and sensor_ids.age() >= MISS_RELOAD_SECONDS:
+                # The sensor may have been created since the last reload
+                await asyncio.to_thread(sensor_ids.refresh, MISS_RELOAD_SECONDS)
+                sensor_id = sensor_ids.get(external_id)
+            if sensor_id is None:
+                unknown = result.unknown_external_ids
+                unknown[external_id] = unknown.get(external_id, 0) + 1
+                continue
+
+            batch.append((sensor_id, *row))
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+
+        if batch:
+            await flush(batch)
+        await collect()
+    except Exception:
+        # Let the in-flight write finish before the connection is closed
+        try:
+            await collect()
+        except Exception:
+            pass
+        await asyncio.to_thread(conn.rollback)
+        raise
+    finally:
+        await asyncio.to_thread(conn.close)
+
+    valid = result.received - result.rejected - sum(result.unknown_external_ids.values())
+    result.unchanged = max(valid - result.written, 0)
+    INGEST_ROWS_TOTAL.labels("written").inc(result.written)
+    INGEST_ROWS_TOTAL.labels("unchanged").inc(result.unchanged)
+    INGEST_ROWS_TOTAL.labels("rejected").inc(result.rejected)
+    INGEST_ROWS_TOTAL.labels("unknown_sensor").inc(
+        sum(result.unknown_external_ids.values())
+    )
+    logger.info(
+        f"Ingested {result.received} rows: {result.written} written, "
+        f"{result.unchanged} unchanged, {result.rejected} rejected, "
+        f"{sum(result.unknown_external_ids.values())} for unknown sensors"
+    )
+    return result
@@ -0,0 +1,255 @@
+"""In-process job manager for sync runs.
+
+Every trigger (HTTP endpoints and the APScheduler interval job) goes through
+the manager. Requests identical to a queued or running job are coalesced onto
+it. SYNC_MAX_CONCURRENT_JOBS slots cap how many syncs run at once; the adaptive
+scheduler takes a slot for each of its polls, so both paths share one limit.
+Each job gets its own EcosenseSync and database connections, but the Aquarius
+session token is process-wide (auth.tokens): all jobs and polls log in once
+and share it, and a token refreshed by one is used by the others.
+Jobs submitted with profile=True (or every job with SYNC_PROFILE) run under a
+SyncProfile, and its stage timings are reported with the job.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+from .metrics import QUEUE_DEPTH
+from .profiling import SyncProfile
+from .sync import EcosenseSync
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class SyncJob:
+    def __init__(self, kind: str, params: Dict, key: Tuple):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.sensors_done = 0
+        self.sensors_total: Optional[int] = None
+        self.coalesced_requests = 0
+        self.profile_requested = False
+        self.profile: Optional[Dict] = None
+        self.profile_folded: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def report_progress(self, done: int, total: Optional[int]):
+        self.sensors_done = done
+        self.sensors_total = total
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or datetime.now(timezone.utc)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "progress": {
+                "sensors_done": self.sensors_done,
+                "sensors_total": self.sensors_total,
+            },
+            "coalesced_requests": self.coalesced_requests,
+            "profile": self.profile,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "queued_seconds": (
+                ((self.started_at or end) - self.created_at).total_seconds()
+            ),
+            "run_seconds": (
+                (end - self.started_at).total_seconds() if self.started_at else None
+            ),
+        }
+
+
+class JobManager:
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        history: Optional[int] = None,
+        sync_factory: Callable[[], EcosenseSync] = EcosenseSync,
+    ):
+        self.max_concurrent = max_concurrent or settings.SYNC_MAX_CONCURRENT_JOBS
+        self.history = history or settings.SYNC_JOB_HISTORY
+        self.sync_factory = sync_factory
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent, thread_name_prefix="sync-job"
+        )
+        # Shared with the adaptive scheduler's polls
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self._async_client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach_async_client(self, client, loop: asyncio.AbstractEventLoop):
+        """Run readings fetches on a shared AsyncAquariusClient in the app's event loop"""
+        self._async_client = client
+        self._loop = loop
+
+    def submit(
+        self, kind: str, profile: bool = False, **params
+    ) -> Tuple[SyncJob, bool]:
+        """Queue a sync job; returns (job, coalesced).
+
+        If an identical job is already queued or running, no new job is created
+        and the existing one is returned with coalesced=True. A profile request
+        coalesced onto a queued job turns profiling on for it; a running job is
+        left as it is.
+        """
+        if kind not in ("all", "metadata", "readings", "links"):
+            raise ValueError(f"Unknown sync job kind: {kind}")
+        key = (kind, tuple(sorted((k, _freeze(v)) for k, v in params.items())))
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.active and job.key == key:
+                    job.coalesced_requests += 1
+                    if job.status == QUEUED:
+                        job.profile_requested |= profile
+                    logger.info(f"Coalesced {kind} sync request onto job {job.id}")
+                    return job, True
+
+            job = SyncJob(kind, params, key)
+            job.profile_requested = profile
+            self._jobs[job.id] = job
+            self._prune()
+            self._update_queue_depth()
+
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued {kind} sync job {job.id} with {params}")
+        return job, False
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self) -> List[Dict]:
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the SYNC_MAX_CONCURRENT_JOBS sync slots"""
+        self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: SyncJob):
+        # Stays queued while adaptive polls hold the slots
+        with self.slot():
+            self._execute(job)
+
+    def _execute(self, job: SyncJob):
+        with self._lock:
+            job.status = RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            self._update_queue_depth()
+
+        profile = None
+        if job.profile_requested or settings.SYNC_PROFILE:
+            profile = SyncProfile(f"{job.kind}-{job.id}")
+            profile.start()
+
+        started = time.perf_counter()
+        try:
+            service = self.sync_factory()
+            if job.kind == "metadata":
+                ok = service.sync_metadata()
+            elif job.kind == "links":
+                ok = service.link_sensors_to_trees(job.params.get("location_id"))
+            elif job.kind == "readings":
+                ok = self._sync_readings(
+                    service, job, sensor_external_ids=job.params.get("sensor_ids")
+                )
+            else:
+                ok = service.sync_metadata()
+                ok = self._sync_readings(service, job) and ok
+            if ok:
+                status, error = SUCCEEDED, None
+            else:
+                status, error = FAILED, "Sync did not complete, see service logs"
+        except Exception as e:
+            logger.error(f"Sync job {job.id} failed: {e}")
+            status, error = FAILED, str(e)
+
+        if profile is not None:
+            job.profile = profile.stop()
+            job.profile_folded = profile.folded_path
+
+        with self._lock:
+            job.status = status
+            job.error = error
+            job.finished_at = datetime.now(timezone.utc)
+            self._update_queue_depth()
+        logger.info(
+            f"Sync job {job.id} ({job.kind}) {status} in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+    def _sync_readings(
+        self, service: EcosenseSync, job: SyncJob, sensor_external_ids=None
+    ) -> bool:
+        if self._async_client is None or settings.SYNC_SHARDED:
+            return service.sync_readings(
+                days_back=job.params["days_back"],
+                sensor_external_ids=sensor_external_ids,
+                on_progress=job.report_progress,
+            )
+        future = asyncio.run_coroutine_threadsafe(
+            service.sync_readings_async(
+                self._async_client,
+                days_back=job.params["days_back"],
+                sensor_external_ids=sensor_external_ids,
+                on_progress=job.report_progress,
+            ),
+            self._loop,
+        )
+        return future.result()
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond the history limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _update_queue_depth(self):
+        QUEUE_DEPTH.labels("sync_jobs").set(
+            sum(1 for job in self._jobs.values() if job.status == QUEUED)
+        )
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(value))
+    return value
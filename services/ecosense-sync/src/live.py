@@ -0,0 +1,201 @@
+"""Live readings feed: LISTEN/NOTIFY fanned out over Server-Sent Events.
+
+Writers call notify_readings() inside the transaction of each batch they
+write, so one notification per committed batch reaches the LISTEN
+connection, and none for a batch that rolls back. They pass the rows their
+upsert RETURNed, so readings that were already stored unchanged are never
+announced. The payload lists, per sensor, the time range written and the
+newest value:
+
+  {"readings": [{"sensor_id": 12, "from": "...", "to": "...", "count": 96,
+                 "last_value": 3.21}]}
+
+Payloads above the 8000-byte NOTIFY limit are split across several
+notifications.
+
+ReadingsFeed keeps one LISTEN connection on a background thread and hands
+notifications to the event loop. There, subscribers are indexed by sensor ID,
+so a client only receives entries for the sensors it asked for. A slow
+client's queue drops its oldest events instead of holding up the others.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+from .database import listen
+from .metrics import LIVE_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+# Stay below PostgreSQL's 8000-byte NOTIFY payload limit
+MAX_PAYLOAD_BYTES = 7900
+
+
+def _summaries(rows: Iterable[Tuple]) -> List[Dict]:
+    """Per-sensor time range, count and newest value of (sensor_id, ts, value, ...) rows"""
+    by_sensor: Dict[int, Dict] = {}
+    for row in rows:
+        sensor_id, ts, value = row[0], row[1], row[2]
+        when = datetime.fromisoformat(ts) if isinstance(ts, str) else ts
+        entry = by_sensor.get(sensor_id)
+        if entry is None:
+            by_sensor[sensor_id] = {
+                "sensor_id": sensor_id,
+                "from": when,
+                "to": when,
+                "count": 1,
+                "last_value": value,
+            }
+            continue
+        entry["count"] += 1
+        if when < entry["from"]:
+            entry["from"] = when
+        if when >= entry["to"]:
+            entry["to"] = when
+            entry["last_value"] = value
+    for entry in by_sensor.values():
+        entry["from"] = entry["from"].isoformat()
+        entry["to"] = entry["to"].isoformat()
+        entry["last_value"] = float(entry["last_value"])
+    return list(by_sensor.values())
+
+
+def notify_readings(cur, rows: Iterable[Tuple]):
+    """Queue the batch notification; PostgreSQL delivers it when the transaction commits"""
+    if not settings.LIVE_FEED:
+        return
+    chunk: List[Dict] = []
+    size = 0
+    for entry in _summaries(rows):
+        encoded = len(json.dumps(entry)) + 1
+        if chunk and size + encoded > MAX_PAYLOAD_BYTES:
+            cur.execute(
+                "SELECT pg_notify(%s, %s)",
+                (settings.LIVE_CHANNEL, json.dumps({"readings": chunk})),
+            )
+            chunk, size = [], 0
+        chunk.append(entry)
+        size += encoded
+    if chunk:
+        cur.execute(
+            "SELECT pg_notify(%s, %s)",
+            (settings.LIVE_CHANNEL, json.dumps({"readings": chunk})),
+        )
+
+
+class Subscription:
+    def __init__(self, sensor_ids: Optional[Set[int]], queue_size: int):
+        self.sensor_ids = sensor_ids  # None = all sensors
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, entries: List[Dict]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(entries)
+
+
+class ReadingsFeed:
+    def __init__(self, channel: Optional[str] = None):
+        self.channel = channel or settings.LIVE_CHANNEL
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._by_sensor: Dict[int, Set[Subscription]] = {}
+        self._all: Set[Subscription] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._thread = threading.Thread(
+            target=self._listen, name="live-feed", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def subscribe(self, sensor_ids: Optional[Set[int]] = None) -> Subscription:
+        """Register a subscriber; call from the event loop"""
+        subscription = Subscription(sensor_ids or None, settings.LIVE_QUEUE_SIZE)
+        if subscription.sensor_ids is None:
+            self._all.add(subscription)
+        else:
+            for sensor_id in subscription.sensor_ids:
+                self._by_sensor.setdefault(sensor_id, set()).add(subscription)
+        LIVE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription.sensor_ids is None:
+            self._all.discard(subscription)
+        else:
+            for sensor_id in subscription.sensor_ids:
+                subscribers = self._by_sensor.get(sensor_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_sensor[sensor_id]
+        LIVE_SUBSCRIBERS.dec()
+
+    def _dispatch(self, entries: List[Dict]):
+        """Fan one notification out to matching subscribers (runs on the event loop)"""
+        matched: Dict[Subscription, List[Dict]] = {}
+        for entry in entries:
+            for subscription in self._by_sensor.get(entry["sensor_id"], ()):
+                matched.setdefault(subscription, []).append(entry)
+        if self._all:
+            for subscription in self._all:
+                matched[subscription] = entries
+        for subscription, subset in matched.items():
+            subscription.offer(subset)
+
+    def _listen(self):
+        listen([self.channel], self._on_notify, self._stop)
+
+    def _on_notify(self, channel: str, payload: str):
+        try:
+            entries = json.loads(payload)["readings"]
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring malformed live notification: {e}")
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, entries)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(feed: ReadingsFeed, request, sensor_ids: Optional[Set[int]]):
+    """Server-Sent Events for one client until it disconnects"""
+    subscription = feed.subscribe(sensor_ids)
+    try:
+        yield sse_event(
+            "subscribed",
+            {"sensor_ids": sorted(sensor_ids) if sensor_ids else None},
+        )
+        reported_drops = 0
+        while True:
+            try:
+                entries = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.LIVE_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield f": keepalive {int(time.time())}\n\n"
+                continue
+            if subscription.dropped > reported_drops:
+                yield sse_event("lagged", {"dropped": subscription.dropped})
+                reported_drops = subscription.dropped
+            yield sse_event("readings", entries)
+    finally:
+        feed.unsubscribe(subscription)
@@ -1,12 +1,22 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from typing import List, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from .config import settings
-from .sync import EcosenseSync
+from .aquarius_async import AsyncAquariusClient
+from .auth import tokens
+from .ingest import IngestError, IngestResult, ingest_stream
+from .jobs import JobManager
+from .live import ReadingsFeed, sse_stream
+from .projections import refresh_tree_metrics
+from .scheduler import AdaptiveScheduler
+from .tiles import TileError, TileService, parse_request
 
 # Setup logging
 logging.basicConfig(
@@ -15,19 +25,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-sync_service = EcosenseSync()
+job_manager = JobManager()
+live_feed = ReadingsFeed()
+tile_service = TileService()
 
 
 def scheduled_sync():
     logger.info("Running scheduled sync...")
     try:
-        sync_service.sync_all(days_back=settings.DEFAULT_DAYS_BACK)
+        if settings.SYNC_ADAPTIVE:
+            # Readings are polled per sensor by the adaptive scheduler
+            job_manager.submit("metadata")
+        else:
+            job_manager.submit("all", days_back=settings.DEFAULT_DAYS_BACK)
     except Exception as e:
         logger.error(f"Scheduled sync failed: {e}")
 
 
+def _job_response(message: str, job, coalesced: bool) -> dict:
+    return {
+        "message": message,
+        "job_id": job.id,
+        "status": job.status,
+        "coalesced": coalesced,
+        **job.params,
+    }
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # One pooled HTTP/2 client shared by all readings jobs
+    aquarius = None
+    if settings.AQUARIUS_ASYNC:
+        aquarius = AsyncAquariusClient()
+        await aquarius.start()
+        job_manager.attach_async_client(aquarius, asyncio.get_running_loop())
+
+    if settings.LIVE_FEED:
+        live_feed.start(asyncio.get_running_loop())
+    tile_service.start()
+
     # Start scheduler
     scheduler = BackgroundScheduler()
     scheduler.add_job(
@@ -41,14 +78,36 @@ async def lifespan(app: FastAPI):
         f"Scheduler started with interval {settings.SYNC_INTERVAL_MINUTES} minutes"
     )
 
+    if settings.TREE_METRICS_REFRESH_SECONDS > 0:
+        scheduler.add_job(
+            refresh_tree_metrics,
+            "interval",
+            seconds=settings.TREE_METRICS_REFRESH_SECONDS,
+            id="tree_metrics_refresh",
+            max_instances=1,
+        )
+
     # Run initial sync on startup
     logger.info("Triggering initial sync on startup...")
     scheduler.add_job(scheduled_sync, "date")
 
+    adaptive_scheduler = None
+    if settings.SYNC_ADAPTIVE:
+        adaptive_scheduler = AdaptiveScheduler(slot=job_manager.slot)
+        adaptive_scheduler.start()
+
     yield
 
     # Shutdown
     scheduler.shutdown()
+    if adaptive_scheduler:
+        adaptive_scheduler.stop()
+    job_manager.shutdown()
+    live_feed.stop()
+    tile_service.stop()
+    if aquarius:
+        await aquarius.close()
+    tokens.logout()
 
 
 app = FastAPI(title="Ecosense Data Sync Service", lifespan=lifespan)
@@ -59,33 +118,137 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint for sync latency, throughput and queue metrics"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/sync/all")
-def trigger_sync_all(background_tasks: BackgroundTasks, days_back: int = 7):
+def trigger_sync_all(days_back: int = 7, profile: bool = False):
     """Trigger a full sync (metadata + readings)"""
-    background_tasks.add_task(sync_service.sync_all, days_back)
-    return {"message": "Full sync triggered in background", "days_back": days_back}
+    job, coalesced = job_manager.submit("all", profile=profile, days_back=days_back)
+    return _job_response("Full sync triggered in background", job, coalesced)
 
 
 @app.post("/sync/metadata")
-def trigger_sync_metadata(background_tasks: BackgroundTasks):
+def trigger_sync_metadata(profile: bool = False):
     """Trigger metadata sync only"""
-    background_tasks.add_task(sync_service.sync_metadata)
-    return {"message": "Metadata sync triggered in background"}
+    job, coalesced = job_manager.submit("metadata", profile=profile)
+    return _job_response("Metadata sync triggered in background", job, coalesced)
 
 
 @app.post("/sync/readings")
 def trigger_sync_readings(
-    background_tasks: BackgroundTasks,
     days_back: int = 7,
     sensor_ids: Optional[List[str]] = None,
+    profile: bool = False,
 ):
     """Trigger readings sync for specific sensors or all"""
-    background_tasks.add_task(sync_service.sync_readings, days_back, sensor_ids)
-    return {
-        "message": "Readings sync triggered in background",
-        "days_back": days_back,
-        "sensors": sensor_ids,
-    }
+    job, coalesced = job_manager.submit(
+        "readings", profile=profile, days_back=days_back, sensor_ids=sensor_ids
+    )
+    return _job_response("Readings sync triggered in background", job, coalesced)
+
+
+@app.post("/sensors/link-trees")
+def trigger_link_trees(location_id: Optional[int] = None, profile: bool = False):
+    """Rebuild KNN sensor-tree links for one location or all"""
+    job, coalesced = job_manager.submit("links", profile=profile, location_id=location_id)
+    return _job_response("Sensor-tree linking triggered in background", job, coalesced)
+
+
+@app.post("/ingest")
+async def ingest_readings(
+    request: Request,
+    content_type: str = Header("application/x-ndjson"),
+    authorization: Optional[str] = Header(None),
+):
+    """Push readings as NDJSON or CSV (Content-Type: text/csv), keyed by ExternalID"""
+    if settings.INGEST_TOKEN and authorization != f"Bearer {settings.INGEST_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid ingest token")
+    if "csv" not in content_type and "json" not in content_type:
+        raise HTTPException(
+            status_code=415, detail="Send application/x-ndjson or text/csv"
+        )
+
+    result = IngestResult()
+    try:
+        await ingest_stream(request.stream(), content_type, result)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ingestion failed: {e}")
+        # Earlier batches are committed; report them so the gateway can resume
+        raise HTTPException(
+            status_code=500,
+            detail={"error": str(e), **result.to_dict()},
+        )
+    return result.to_dict()
+
+
+@app.get("/live/readings")
+async def live_readings(request: Request, sensor_id: List[int] = Query(None)):
+    """Server-Sent Events for newly written readings, optionally for some sensors only"""
+    if not settings.LIVE_FEED:
+        raise HTTPException(status_code=404, detail="Live feed is disabled")
+    return StreamingResponse(
+        sse_stream(live_feed, request, set(sensor_id) if sensor_id else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/tiles/{z}/{x}/{y}.mvt")
+def get_tile(
+    z: int,
+    x: int,
+    y: int,
+    layers: List[str] = Query(None),
+    attributes: List[str] = Query(None),
+):
+    """Mapbox vector tile of trees and sensors; attributes as layer.column, e.g. trees.HealthScore"""
+    try:
+        spec = parse_request(z, x, y, layers, attributes)
+    except TileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tile, cached = tile_service.render(spec, z, x, y)
+    return Response(
+        tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={
+            "Cache-Control": f"public, max-age={settings.TILE_MAX_AGE_SECONDS}",
+            "X-Tile-Cache": "hit" if cached else "miss",
+        },
+    )
+
+
+@app.get("/sync/jobs")
+def list_sync_jobs():
+    """Recent sync jobs, newest first"""
+    return job_manager.recent()
+
+
+@app.get("/sync/jobs/{job_id}")
+def get_sync_job(job_id: str):
+    """Status, progress and timing of one sync job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Sync job {job_id} not found")
+    return job.to_dict()
+
+
+@app.get("/sync/jobs/{job_id}/profile")
+def get_sync_job_profile(job_id: str):
+    """Folded stacks of a profiled job, for flamegraph.pl, speedscope or inferno"""
+    job = job_manager.get(job_id)
+    if job is None or job.profile_folded is None:
+        raise HTTPException(
+            status_code=404, detail=f"No profile recorded for sync job {job_id}"
+        )
+    return FileResponse(
+        job.profile_folded, media_type="text/plain", filename=f"{job_id}.folded"
+    )
 
 
 if __name__ == "__main__":
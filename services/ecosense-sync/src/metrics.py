@@ -0,0 +1,95 @@
+"""Prometheus metrics for the sync hot path.
+
+All metrics live in the default registry and are served by GET /metrics.
+Label sets are kept small and fixed (no sensor IDs) so scraping stays cheap.
+"""
+
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from .profiling import stage as profile_stage
+
+AQUARIUS_REQUEST_SECONDS = Histogram(
+    "ecosense_aquarius_request_seconds",
+    "Latency of Aquarius Publish API requests",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+AQUARIUS_REQUESTS_TOTAL = Counter(
+    "ecosense_aquarius_requests_total",
+    "Aquarius Publish API requests by endpoint and HTTP status",
+    ["endpoint", "status"],
+)
+RATE_LIMIT_HITS_TOTAL = Counter(
+    "ecosense_rate_limit_hits_total",
+    "HTTP 429 responses received from a remote service",
+    ["client"],
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "ecosense_rate_limit_wait_seconds",
+    "Time a request waited for a token from its rate-limit bucket",
+    ["bucket"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POINTS_PARSED_TOTAL = Counter(
+    "ecosense_points_parsed_total",
+    "Numeric points parsed from Aquarius corrected data",
+)
+PARSE_SECONDS = Histogram(
+    "ecosense_parse_seconds",
+    "Time spent converting one Aquarius response into reading rows",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+DB_WRITE_SECONDS = Histogram(
+    "ecosense_db_write_seconds",
+    "Latency of one batched database write including commit",
+    ["table"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_ROWS_PER_BATCH = Histogram(
+    "ecosense_db_rows_per_batch",
+    "Rows sent to the database per batched write",
+    ["table"],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+SKIPPED_WINDOWS_TOTAL = Counter(
+    "ecosense_skipped_windows_total",
+    "Sensor-day windows skipped because their fingerprint was unchanged",
+)
+QUEUE_DEPTH = Gauge(
+    "ecosense_queue_depth",
+    "Work items waiting in an in-process queue",
+    ["queue"],
+)
+INGEST_ROWS_TOTAL = Counter(
+    "ecosense_ingest_rows_total",
+    "Rows pushed to POST /ingest by outcome",
+    ["result"],
+)
+LIVE_SUBSCRIBERS = Gauge(
+    "ecosense_live_subscribers",
+    "Clients connected to the live readings feed",
+)
+TILE_REQUESTS_TOTAL = Counter(
+    "ecosense_tile_requests_total",
+    "Vector tile requests by cache result",
+    ["result"],
+)
+TILE_CACHE_TILES = Gauge(
+    "ecosense_tile_cache_tiles",
+    "Vector tiles held in the in-memory cache",
+)
+STAGE_SECONDS = Histogram(
+    "ecosense_sync_stage_seconds",
+    "Wall time of one sync stage run",
+    ["stage"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Observe the wall time of a sync stage, including failed runs"""
+    with STAGE_SECONDS.labels(stage).time(), profile_stage(stage):
+        yield
@@ -0,0 +1,182 @@
+"""Sampling profiler and per-stage timings for single sync runs.
+
+A SyncProfile is attached to the job that requested it (SYNC_PROFILE or
+?profile=true). While it is active:
+
+- stage(name) blocks record wall and CPU time per stage: Aquarius requests,
+  JSON decoding, parsing, batched writes, commits and the top-level
+  time_stage runs. CPU time is that of the thread running the block, so for
+  async fetches it is the event loop's time across all in-flight requests.
+- A background thread samples, every SYNC_PROFILE_INTERVAL_MS, the stacks of
+  the job thread and of any thread currently inside a stage, and counts them
+  as folded stacks. Idle pool threads are left out.
+
+The profile is held in a context variable, so it follows the job into
+asyncio.to_thread workers and coroutines scheduled from the job thread.
+Outside a profiled run stage() costs one context variable lookup.
+
+stop() writes <job>.folded (input for flamegraph.pl, speedscope or inferno)
+and <job>.stages.json to SYNC_PROFILE_DIR.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_active: ContextVar[Optional["SyncProfile"]] = ContextVar("sync_profile", default=None)
+
+
+class StageStats:
+    __slots__ = ("calls", "wall_seconds", "cpu_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+        }
+
+
+class SyncProfile:
+    def __init__(self, name: str, interval_ms: Optional[float] = None):
+        self.name = name
+        self.interval = (interval_ms or settings.SYNC_PROFILE_INTERVAL_MS) / 1000
+        self.stages: Dict[str, StageStats] = {}
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.folded_path: Optional[str] = None
+        self.stages_path: Optional[str] = None
+        # Thread ident -> number of open stages; the starting thread is always sampled
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._wall_seconds = 0.0
+
+    def start(self):
+        """Activate the profile in the current context and start sampling"""
+        self._token = _active.set(self)
+        self._enter()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name=f"profiler-{self.name}", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> Dict:
+        """Stop sampling, write the profile files and return the summary"""
+        self._wall_seconds = time.perf_counter() - self._started
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self._exit()
+        _active.reset(self._token)
+        try:
+            self._write()
+        except OSError as e:
+            logger.error(f"Could not write profile {self.name}: {e}")
+        return self.to_dict()
+
+    def _enter(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def _exit(self, name: Optional[str] = None, wall: float = 0.0, cpu: float = 0.0):
+        with self._lock:
+            ident = threading.get_ident()
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+            if name is None:
+                return
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.calls += 1
+            stats.wall_seconds += wall
+            stats.cpu_seconds += cpu
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(
+                f"{stack} {count}\n" for stack, count in self.samples.most_common()
+            )
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            stages = {name: stats.to_dict() for name, stats in self.stages.items()}
+        return {
+            "wall_seconds": round(self._wall_seconds, 3),
+            "samples": self.sample_count,
+            "interval_ms": self.interval * 1000,
+            "stages": stages,
+            "folded_path": self.folded_path,
+        }
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in self._threads:
+                    if ident == own:
+                        continue
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self.samples[_fold(frame)] += 1
+                        self.sample_count += 1
+
+    def _write(self):
+        os.makedirs(settings.SYNC_PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.SYNC_PROFILE_DIR, self.name)
+        with open(f"{base}.folded", "w") as f:
+            f.write(self.folded())
+        self.folded_path = f"{base}.folded"
+        with open(f"{base}.stages.json", "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        self.stages_path = f"{base}.stages.json"
+        logger.info(f"Wrote sync profile to {self.folded_path}")
+
+
+def _fold(frame) -> str:
+    """Root-first 'module:function;...' stack, the format flamegraph tools read"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+@contextmanager
+def stage(name: str):
+    """Record wall and CPU time of the block in the active profile, if any"""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    profile._enter()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        profile._exit(name, time.perf_counter() - wall, time.thread_time() - cpu)
@@ -0,0 +1,47 @@
+"""Periodic refresh of database projections that are maintained incrementally.
+
+trees.trees_with_metrics is served from trees.TreeMetricsProjection. Triggers
+queue the tree variants that changed, and the view computes those live until
+they are refreshed. This job drains the queue in batches, so the live part
+stays small.
+"""
+
+import logging
+
+from .config import settings
+from .database import get_db_connection
+from .metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_tree_metrics() -> int:
+    """Refresh all queued tree variants, one committed batch at a time; returns trees refreshed"""
+    refreshed = 0
+    try:
+        conn = get_db_connection()
+    except Exception:
+        return 0
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT trees.refresh_tree_metrics(%s)",
+                    (settings.TREE_METRICS_REFRESH_BATCH,),
+                )
+                batch = cur.fetchone()[0]
+            conn.commit()
+            refreshed += batch
+            if batch < settings.TREE_METRICS_REFRESH_BATCH:
+                break
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM trees.TreeMetricsPending")
+            QUEUE_DEPTH.labels("tree_metrics").set(cur.fetchone()[0])
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Tree metrics refresh failed: {e}")
+    finally:
+        conn.close()
+    if refreshed:
+        logger.info(f"Refreshed metrics projection for {refreshed} tree variants")
+    return refreshed
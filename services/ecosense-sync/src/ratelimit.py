@@ -0,0 +1,102 @@
+"""Adaptive token-bucket rate limits for outgoing requests.
+
+Each endpoint budget is a TokenBucket with a refill rate in requests per
+second and a burst capacity. Requests take one token and only wait when the
+bucket is empty, so there is no idle time while the remote has capacity.
+A 429 halves the bucket's rate and pauses it for Retry-After. Successes then
+raise it additively back to the configured budget (AIMD).
+
+All clients in the process share the buckets in `limits`.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from .config import settings
+from .metrics import RATE_LIMIT_WAIT_SECONDS
+
+# Floor for the adapted rate, as a fraction of the configured budget
+MIN_RATE_FRACTION = 0.05
+# Successful requests needed to win back one tenth of the budget
+RECOVERY_STEPS = 20
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller has to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Tokens may go negative: later callers queue behind earlier reservations
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        wait = self._reserve()
+        RATE_LIMIT_WAIT_SECONDS.labels(self.name).observe(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        RATE_LIMIT_WAIT_SECONDS.labels(self.name).observe(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate / (10 * RECOVERY_STEPS)
+                )
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Back off after a 429: halve the rate and honour Retry-After"""
+        with self._lock:
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Parse a numeric Retry-After header (HTTP-date values are ignored)"""
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimits:
+    def __init__(self, budgets: Dict[str, float], default_rate: float):
+        self.budgets = budgets
+        self.default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, name: str) -> TokenBucket:
+        with self._lock:
+            if name not in self._buckets:
+                rate = self.budgets.get(name, self.default_rate)
+                self._buckets[name] = TokenBucket(name, rate)
+            return self._buckets[name]
+
+
+limits = RateLimits(settings.RATE_LIMIT_BUDGETS, settings.RATE_LIMIT_DEFAULT_PER_SECOND)
@@ -0,0 +1,273 @@
+"""Adaptive per-sensor sync scheduler.
+
+Instead of syncing every sensor on one global interval, each sensor gets its own
+next-due time in a priority queue. The poll interval starts at the sensor's
+SamplingInterval_seconds, backs off exponentially while Aquarius returns nothing
+new, and never drops below a multiple of the sensor's observed request latency.
+First polls are offset by a stable per-sensor fraction of the interval, so load
+is spread across the hour instead of arriving as one burst.
+
+Each poll holds a slot of the job manager (SYNC_MAX_CONCURRENT_JOBS), so polls
+and manual or interval sync jobs never exceed that many concurrent syncs.
+
+The schedule is persisted in sensor.SensorSyncState and reloaded on start.
+Run one adaptive scheduler per deployment; sharded workers use worker.py.
+"""
+
+import heapq
+import logging
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from .config import settings
+from .database import get_db_connection
+from .metrics import QUEUE_DEPTH
+from .sync import EcosenseSync
+
+logger = logging.getLogger(__name__)
+
+# Reload the sensor list this often to pick up metadata changes
+SENSOR_REFRESH_SECONDS = 600
+# Weight of the newest latency sample in the moving average
+LATENCY_ALPHA = 0.2
+# Cap on the backoff exponent (2**6 = 64x the base interval)
+MAX_BACKOFF_STEPS = 6
+
+
+class SensorSchedule:
+    def __init__(self, sensor: Dict):
+        self.sensor_id = sensor["sensorid"]
+        self.external_id = sensor["externalid"]
+        self.sampling_interval = sensor["samplinginterval_seconds"]
+        self.last_synced_at: Optional[datetime] = sensor.get("lastsyncedat")
+        self.newest_reading_at: Optional[datetime] = sensor.get("newestreadingat")
+        self.idle_runs: int = sensor.get("idleruns") or 0
+        self.avg_latency: float = (sensor.get("avglatencyms") or 0.0) / 1000
+        self.next_due: datetime = sensor.get("nextdueat") or self._first_due()
+        self.interval: int = sensor.get("pollintervalseconds") or self.base_interval
+
+    @property
+    def base_interval(self) -> int:
+        return max(self.sampling_interval, settings.SYNC_ADAPTIVE_MIN_INTERVAL_SECONDS)
+
+    def _first_due(self) -> datetime:
+        # Stable offset so restarts without persisted state keep the same spread
+        offset = random.Random(self.sensor_id).uniform(0, self.base_interval)
+        return datetime.now(timezone.utc) + timedelta(seconds=offset)
+
+    def record_poll(self, latency: float, newest: Optional[datetime]):
+        """Update the interval after a poll and schedule the next one"""
+        if self.avg_latency:
+            self.avg_latency += LATENCY_ALPHA * (latency - self.avg_latency)
+        else:
+            self.avg_latency = latency
+
+        if newest and (not self.newest_reading_at or newest > self.newest_reading_at):
+            self.idle_runs = 0
+        else:
+            self.idle_runs += 1
+        self.newest_reading_at = newest or self.newest_reading_at
+
+        interval = self.base_interval * 2 ** min(self.idle_runs, MAX_BACKOFF_STEPS)
+        interval = max(interval, self.avg_latency * settings.SYNC_ADAPTIVE_LATENCY_FACTOR)
+        self.interval = int(min(interval, settings.SYNC_ADAPTIVE_MAX_INTERVAL_SECONDS))
+
+        now = datetime.now(timezone.utc)
+        self.last_synced_at = now
+        # +-10% jitter keeps sensors with equal intervals from lining up again
+        self.next_due = now + timedelta(seconds=self.interval * random.uniform(0.9, 1.1))
+
+    def fetch_window(self, now: datetime) -> Tuple[datetime, datetime]:
+        if self.last_synced_at is None:
+            return now - timedelta(days=settings.DEFAULT_DAYS_BACK), now
+        # Overlap two samples to catch late-arriving and corrected points
+        overlap = timedelta(seconds=2 * self.sampling_interval)
+        return self.last_synced_at - overlap, now
+
+
+class AdaptiveScheduler:
+    def __init__(
+        self,
+        sync_service: Optional[EcosenseSync] = None,
+        slot: Optional[Callable[[], ContextManager]] = None,
+    ):
+        self.sync = sync_service or EcosenseSync()
+        # JobManager.slot, so polls count against the sync job limit
+        self.slot = slot or nullcontext
+        self._schedules: Dict[int, SensorSchedule] = {}
+        self._heap: List[Tuple[datetime, int]] = []
+        self._loaded_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="adaptive-scheduler", daemon=True
+        )
+        self._thread.start()
+        logger.info("Adaptive sync scheduler started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Adaptive scheduler tick failed: {e}")
+            self._stop.wait(self._seconds_until_next_due())
+
+    def _seconds_until_next_due(self) -> float:
+        tick = settings.SYNC_ADAPTIVE_TICK_SECONDS
+        if not self._heap:
+            return tick
+        wait = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+        return min(max(wait, 1.0), tick)
+
+    def _load_sensors(self, conn):
+        """Merge active sensors and their persisted schedule into the queue"""
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                """
+                SELECT s.SensorID, s.ExternalID, s.SamplingInterval_seconds,
+                       st.LastSyncedAt, st.NextDueAt, st.PollIntervalSeconds,
+                       st.IdleRuns, st.AvgLatencyMs, st.NewestReadingAt
+                FROM sensor.Sensors s
+                LEFT JOIN sensor.SensorSyncState st ON st.SensorID = s.SensorID
+                WHERE s.ExternalID IS NOT NULL AND s.IsActive = TRUE
+            """
+            )
+            sensors = cur.fetchall()
+
+        active = {}
+        for sensor in sensors:
+            schedule = self._schedules.get(sensor["sensorid"])
+            if schedule is None:
+                schedule = SensorSchedule(sensor)
+                heapq.heappush(self._heap, (schedule.next_due, schedule.sensor_id))
+            else:
+                schedule.sampling_interval = sensor["samplinginterval_seconds"]
+            active[schedule.sensor_id] = schedule
+
+        # Removed sensors are dropped lazily when their heap entry is popped
+        self._schedules = active
+        self._loaded_at = time.monotonic()
+        logger.info(f"Adaptive scheduler tracking {len(active)} sensors")
+
+    def _is_current(self, sensor_id: int, next_due: datetime) -> bool:
+        """Whether a heap entry is the live due time of a scheduled sensor"""
+        schedule = self._schedules.get(sensor_id)
+        return schedule is not None and schedule.next_due == next_due
+
+    def _pop_due(self) -> List[SensorSchedule]:
+        now = datetime.now(timezone.utc)
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            if len(due) >= settings.SYNC_ADAPTIVE_MAX_PER_TICK:
+                break
+            next_due, sensor_id = heapq.heappop(self._heap)
+            # Skip entries of removed sensors and superseded due times
+            if not self._is_current(sensor_id, next_due):
+                continue
+            due.append(self._schedules[sensor_id])
+        QUEUE_DEPTH.labels("due_sensors").set(
+            sum(
+                1
+                for next_due, sensor_id in self._heap
+                if next_due <= now and self._is_current(sensor_id, next_due)
+            )
+        )
+        return due
+
+    def tick(self):
+        """Poll every sensor that is due, then reschedule it"""
+        conn = get_db_connection()
+        try:
+            if (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > SENSOR_REFRESH_SECONDS
+            ):
+                self._load_sensors(conn)
+
+            due = self._pop_due()
+            if not due:
+                return
+            if not self.sync.client.connect():
+                # Retry on the next tick rather than losing the slot
+                for schedule in due:
+                    heapq.heappush(self._heap, (schedule.next_due, schedule.sensor_id))
+                return
+
+            try:
+                for schedule in due:
+                    with self.slot():
+                        self._poll(conn, schedule)
+            finally:
+                self.sync.client.disconnect()
+        finally:
+            conn.close()
+
+    def _poll(self, conn, schedule: SensorSchedule):
+        start_time, end_time = schedule.fetch_window(datetime.now(timezone.utc))
+        sensor = {"sensorid": schedule.sensor_id, "externalid": schedule.external_id}
+        try:
+            written, _ = self.sync.sync_sensor(conn, sensor, start_time, end_time)
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT MAX(Timestamp) FROM sensor.SensorReadings
+                    WHERE SensorID = %s AND ScenarioID IS NULL
+                """,
+                    (schedule.sensor_id,),
+                )
+                newest = cur.fetchone()[0]
+            schedule.record_poll(self.sync.client.last_request_seconds, newest)
+            self._save(conn, schedule)
+            logger.debug(
+                f"Polled {schedule.external_id}: wrote {written} rows, "
+                f"next in {schedule.interval}s"
+            )
+        except Exception as e:
+            conn.rollback()
+            schedule.next_due = datetime.now(timezone.utc) + timedelta(
+                seconds=schedule.base_interval
+            )
+            logger.error(f"Adaptive poll failed for sensor {schedule.external_id}: {e}")
+        heapq.heappush(self._heap, (schedule.next_due, schedule.sensor_id))
+
+    def _save(self, conn, schedule: SensorSchedule):
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO sensor.SensorSyncState (
+                    SensorID, LastSyncedAt, NextDueAt, PollIntervalSeconds,
+                    IdleRuns, AvgLatencyMs, NewestReadingAt
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (SensorID) DO UPDATE SET
+                    LastSyncedAt = EXCLUDED.LastSyncedAt,
+                    NextDueAt = EXCLUDED.NextDueAt,
+                    PollIntervalSeconds = EXCLUDED.PollIntervalSeconds,
+                    IdleRuns = EXCLUDED.IdleRuns,
+                    AvgLatencyMs = EXCLUDED.AvgLatencyMs,
+                    NewestReadingAt = EXCLUDED.NewestReadingAt
+            """,
+                (
+                    schedule.sensor_id,
+                    schedule.last_synced_at,
+                    schedule.next_due,
+                    schedule.interval,
+                    schedule.idle_runs,
+                    schedule.avg_latency * 1000,
+                    schedule.newest_reading_at,
+                ),
+            )
+        conn.commit()
@@ -1,58 +1,93 @@
+import asyncio
+import hashlib
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import os
+import socket
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import psycopg2
 import requests
 from psycopg2.extras import Json, RealDictCursor, execute_values
 
+from .auth import TOKEN_HEADER, aquarius_base_url, tokens
 from .config import settings
 from .database import get_db_connection
+from .live import notify_readings
+from .profiling import stage
+from .ratelimit import limits, retry_after_seconds
+from .metrics import (
+    AQUARIUS_REQUEST_SECONDS,
+    AQUARIUS_REQUESTS_TOTAL,
+    DB_ROWS_PER_BATCH,
+    DB_WRITE_SECONDS,
+    PARSE_SECONDS,
+    POINTS_PARSED_TOTAL,
+    QUEUE_DEPTH,
+    RATE_LIMIT_HITS_TOTAL,
+    SKIPPED_WINDOWS_TOTAL,
+    time_stage,
+)
 
 logger = logging.getLogger(__name__)
 
+# Advisory lock key held by the one worker that runs the metadata sync
+METADATA_LOCK_KEY = 0x45434F01
+# Retries of a request answered with 429 before giving up
+MAX_THROTTLED_RETRIES = 3
+
 
 class AquariusClient:
     def __init__(self):
-        self.hostname = settings.AQUARIUS_HOSTNAME.rstrip("/")
-        self.username = settings.AQUARIUS_USERNAME
-        self.password = settings.AQUARIUS_PASSWORD
+        self.base_url = aquarius_base_url()
         self.session = requests.Session()
-        self.token = None
-
-        if "/AQUARIUS" in self.hostname:
-            self.base_url = f"{self.hostname}/Publish/v2"
-        else:
-            self.base_url = f"{self.hostname}/AQUARIUS/Publish/v2"
+        self.last_request_seconds = 0.0
+
+    def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send an authenticated, rate-limited request.
+
+        Re-authenticates once on 401; a 429 slows the endpoint's bucket and retries.
+        """
+        bucket = limits.bucket(f"aquarius:{endpoint}")
+        reauthenticated = False
+        for _ in range(MAX_THROTTLED_RETRIES + 1):
+            bucket.acquire()
+            token = tokens.token()
+            started = time.perf_counter()
+            with stage(f"aquarius:{endpoint}"):
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}/{endpoint}",
+                    headers={TOKEN_HEADER: token},
+                    **kwargs,
+                )
+            self.last_request_seconds = time.perf_counter() - started
+            AQUARIUS_REQUEST_SECONDS.labels(endpoint).observe(self.last_request_seconds)
+            AQUARIUS_REQUESTS_TOTAL.labels(endpoint, str(response.status_code)).inc()
+            if response.status_code == 429:
+                RATE_LIMIT_HITS_TOTAL.labels("aquarius").inc()
+                bucket.on_throttled(retry_after_seconds(response.headers))
+            elif response.status_code == 401 and not reauthenticated:
+                tokens.invalidate(token)
+                reauthenticated = True
+            else:
+                bucket.on_success()
+                return response
+        return response
 
     def connect(self) -> bool:
-        try:
-            auth_url = f"{self.base_url}/session"
-            response = self.session.post(
-                auth_url,
-                json={"Username": self.username, "EncryptedPassword": self.password},
-                timeout=30,
-            )
-            if response.status_code == 200:
-                self.token = response.text.strip('\\"')
-                self.session.headers.update({"X-Authentication-Token": self.token})
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Aquarius connection error: {e}")
-            return False
+        """Make sure the process-wide session is authenticated"""
+        return tokens.try_token() is not None
 
     def disconnect(self):
-        if self.token:
-            try:
-                self.session.delete(f"{self.base_url}/session")
-            except Exception:
-                pass
+        # The session token is shared per process and outlives single sync runs
+        pass
 
     def get_time_series_descriptions(self) -> List[Dict]:
         try:
-            response = self.session.get(
-                f"{self.base_url}/GetTimeSeriesDescriptionList", timeout=60
+            response = self._request(
+                "GET", "GetTimeSeriesDescriptionList", timeout=60
             )
             if response.status_code == 200:
                 return response.json().get("TimeSeriesDescriptions", [])
@@ -74,21 +109,42 @@ class AquariusClient:
                 "QueryTo": end_str,
             }
 
-            response = self.session.get(
-                f"{self.base_url}/GetTimeSeriesCorrectedData", params=params, timeout=60
+            response = self._request(
+                "GET", "GetTimeSeriesCorrectedData", params=params, timeout=60
             )
 
             if response.status_code == 200:
-                return response.json().get("Points", [])
+                with stage("json_decode"):
+                    return response.json().get("Points", [])
             return []
         except Exception as e:
             logger.error(f"Error fetching data for {unique_id}: {e}")
             return []
 
 
+def _window_hash(rows: List[Tuple]) -> str:
+    """SHA-256 over the sorted (timestamp, value) pairs of a window"""
+    digest = hashlib.sha256()
+    for ts, val in sorted((row[1], row[2]) for row in rows):
+        digest.update(f"{ts}={val!r};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _group_by_day(values: List[Tuple]) -> Dict[date, List[Tuple]]:
+    """Group (sensor_id, timestamp, value, quality) rows by UTC day"""
+    windows: Dict[date, List[Tuple]] = {}
+    for row in values:
+        day = datetime.fromisoformat(row[1]).astimezone(timezone.utc).date()
+        windows.setdefault(day, []).append(row)
+    return windows
+
+
 class EcosenseSync:
     def __init__(self):
         self.client = AquariusClient()
+        self.worker_id = (
+            settings.SYNC_WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+        )
 
         # Parameter to SensorType mapping
         self.param_mapping = {
@@ -139,14 +195,26 @@ class EcosenseSync:
                 return result[0]
             raise Exception("Failed to create location")
 
-    def sync_metadata(self):
+    @time_stage("metadata")
+    def sync_metadata(self) -> bool:
+        """Upsert Ecosense sensors from Aquarius descriptions; returns False on failure"""
         logger.info("Starting metadata sync...")
         if not self.client.connect():
             logger.error("Could not connect to Aquarius")
-            return
+            return False
 
         try:
             conn = get_db_connection()
+
+            # Only one worker refreshes metadata; the session lock is released on close
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (METADATA_LOCK_KEY,))
+                row = cur.fetchone()
+            if not row or not row[0]:
+                logger.info("Metadata sync already running in another worker, skipping")
+                conn.close()
+                return True
+
             sensor_types = self._get_sensor_types(conn)
 
             descriptions = self.client.get_time_series_descriptions()
@@ -176,6 +244,26 @@ class EcosenseSync:
 
                 location_id = self._get_or_create_location(conn, location_name)
 
+                # Sensors from CSV imports (tools/import_aquarius.py, migration 20)
+                # carry only the series Identifier; adopt them instead of adding a
+                # second sensor for the same series
+                identifier = ts.get("Identifier")
+                if identifier and unique_id:
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            """
+                            UPDATE sensor.Sensors SET ExternalID = %s, UpdatedAt = NOW()
+                            WHERE ExternalID IS NULL
+                              AND ExternalMetadata->>'Identifier' = %s
+                              AND NOT EXISTS (
+                                  SELECT 1 FROM sensor.Sensors WHERE ExternalID = %s
+                              )
+                        """,
+                            (unique_id, identifier, unique_id),
+                        )
+                        if cur.rowcount:
+                            logger.info(f"Adopted imported sensor for {identifier}")
+
                 # Upsert Sensor
                 # We use ExternalID to identify unique sensors
                 # Position defaults to (0,0) if not known
@@ -213,88 +301,423 @@ class EcosenseSync:
             conn.commit()
             conn.close()
             logger.info("Metadata sync completed")
+            return True
 
         except Exception as e:
             logger.error(f"Metadata sync failed: {e}")
+            return False
         finally:
             self.client.disconnect()
 
-    def sync_readings(
-        self, days_back: int = 7, sensor_external_ids: Optional[List[str]] = None
-    ):
-        logger.info(f"Starting readings sync (days_back={days_back})...")
-        if not self.client.connect():
-            return
-
+    @time_stage("links")
+    def link_sensors_to_trees(self, location_id: Optional[int] = None) -> bool:
+        """Rebuild KNN sensor-tree links for one plot or all plots; returns False on failure"""
         try:
             conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT sensor.build_sensor_tree_links(%s)", (location_id,)
+                    )
+                    linked = cur.fetchone()[0]
+                conn.commit()
+            finally:
+                conn.close()
+            logger.info(
+                f"Linked {linked} sensor-tree pairs for "
+                f"{'location ' + str(location_id) if location_id else 'all locations'}"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Sensor-tree linking failed: {e}")
+            return False
 
-            # Get sensors to sync
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                query = "SELECT SensorID, ExternalID, SensorTypeID FROM sensor.Sensors WHERE ExternalID IS NOT NULL AND IsActive = TRUE"
-                if sensor_external_ids:
-                    query += " AND ExternalID = ANY(%s)"
-                    cur.execute(query, (sensor_external_ids,))
-                else:
-                    cur.execute(query)
-                sensors = cur.fetchall()
+    def _write_changed_windows(
+        self, conn, sensor_id: int, values: List[Tuple], start_time: datetime
+    ) -> Tuple[int, int]:
+        """Write only the (sensor, day) windows whose content hash changed.
 
-            logger.info(f"Syncing readings for {len(sensors)} sensors")
+        Returns (rows written, windows skipped). The first day is only partly covered
+        by the query window, so it is written but never fingerprinted.
+        """
+        windows = _group_by_day(values)
+        hashes = {day: _window_hash(rows) for day, rows in windows.items()}
 
-            end_time = datetime.now()
-            start_time = end_time - timedelta(days=days_back)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT WindowDate, ContentHash FROM sensor.SyncWindowFingerprints
+                WHERE SensorID = %s AND WindowDate = ANY(%s)
+            """,
+                (sensor_id, list(hashes)),
+            )
+            stored = {row[0]: row[1] for row in cur.fetchall()}
+
+        changed = [day for day, digest in hashes.items() if stored.get(day) != digest]
+        SKIPPED_WINDOWS_TOTAL.inc(len(windows) - len(changed))
+        if not changed:
+            return 0, len(windows)
+
+        first_complete_day = start_time.astimezone(timezone.utc).date() + timedelta(
+            days=1
+        )
+        rows = [row for day in changed for row in windows[day]]
+        DB_ROWS_PER_BATCH.labels("SensorReadings").observe(len(rows))
+        write_started = time.perf_counter()
+
+        with conn.cursor() as cur, stage("db_write"):
+            # Only inserted or changed rows come back; they alone go to the live feed
+            written = execute_values(
+                cur,
+                """
+                INSERT INTO sensor.SensorReadings (SensorID, Timestamp, Value, Quality)
+                VALUES %s
+                ON CONFLICT (SensorID, Timestamp) WHERE ScenarioID IS NULL
+                DO UPDATE SET Value = EXCLUDED.Value, Quality = EXCLUDED.Quality
+                WHERE sensor.SensorReadings.Value IS DISTINCT FROM EXCLUDED.Value
+                   OR sensor.SensorReadings.Quality IS DISTINCT FROM EXCLUDED.Quality
+                RETURNING SensorID, Timestamp, Value
+            """,
+                rows,
+                fetch=True,
+            )
+            fingerprints = [
+                (sensor_id, day, hashes[day], len(windows[day]))
+                for day in changed
+                if day >= first_complete_day
+            ]
+            if fingerprints:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO sensor.SyncWindowFingerprints
+                        (SensorID, WindowDate, ContentHash, PointCount)
+                    VALUES %s
+                    ON CONFLICT (SensorID, WindowDate) DO UPDATE SET
+                        ContentHash = EXCLUDED.ContentHash,
+                        PointCount = EXCLUDED.PointCount,
+                        UpdatedAt = NOW()
+                """,
+                    fingerprints,
+                )
+            if written:
+                notify_readings(cur, written)
+        with stage("commit"):
+            conn.commit()
+        DB_WRITE_SECONDS.labels("SensorReadings").observe(
+            time.perf_counter() - write_started
+        )
 
-            total_points = 0
+        return len(rows), len(windows) - len(changed)
 
-            for i, sensor in enumerate(sensors):
-                unique_id = sensor["externalid"]
-                sensor_id = sensor["sensorid"]
+    def _get_active_sensors(
+        self, conn, sensor_external_ids: Optional[List[str]] = None
+    ) -> List[Dict]:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            query = "SELECT SensorID, ExternalID, SensorTypeID FROM sensor.Sensors WHERE ExternalID IS NOT NULL AND IsActive = TRUE"
+            if sensor_external_ids:
+                query += " AND ExternalID = ANY(%s)"
+                cur.execute(query, (sensor_external_ids,))
+            else:
+                cur.execute(query)
+            return cur.fetchall()
+
+    def _claim_sensors(
+        self,
+        conn,
+        cutoff: Optional[datetime],
+        sensor_external_ids: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """Lease the next batch of sensors for this worker.
+
+        Rows locked by another worker's claim transaction are skipped, and a lease that
+        was never released (crashed worker) expires after SYNC_SHARD_LEASE_SECONDS.
+        """
+        filters = ""
+        params: Dict = {
+            "worker": self.worker_id,
+            "lease": settings.SYNC_SHARD_LEASE_SECONDS,
+            "limit": settings.SYNC_SHARD_CLAIM_SIZE,
+            "cutoff": cutoff,
+        }
+        if sensor_external_ids:
+            filters = "AND s.ExternalID = ANY(%(ids)s)"
+            params["ids"] = sensor_external_ids
 
-                points = self.client.get_data(unique_id, start_time, end_time)
-                if not points:
-                    continue
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"""
+                WITH candidates AS (
+                    SELECT st.SensorID
+                    FROM sensor.SensorSyncState st
+                    JOIN sensor.Sensors s ON s.SensorID = st.SensorID
+                    WHERE s.ExternalID IS NOT NULL AND s.IsActive = TRUE
+                      AND (st.ClaimedUntil IS NULL OR st.ClaimedUntil < NOW())
+                      AND (%(cutoff)s::timestamptz IS NULL
+                           OR st.LastSyncedAt IS NULL
+                           OR st.LastSyncedAt < %(cutoff)s::timestamptz)
+                      {filters}
+                    ORDER BY st.LastSyncedAt NULLS FIRST, st.SensorID
+                    LIMIT %(limit)s
+                    FOR UPDATE OF st SKIP LOCKED
+                )
+                UPDATE sensor.SensorSyncState st
+                SET ClaimedBy = %(worker)s,
+                    ClaimedUntil = NOW() + make_interval(secs => %(lease)s)
+                FROM candidates c
+                JOIN sensor.Sensors s ON s.SensorID = c.SensorID
+                WHERE st.SensorID = c.SensorID
+                RETURNING st.SensorID, s.ExternalID, s.SensorTypeID
+            """,
+                params,
+            )
+            claimed = cur.fetchall()
+        conn.commit()
+        return claimed
+
+    def _claimed_batches(
+        self,
+        conn,
+        run_started: datetime,
+        sensor_external_ids: Optional[List[str]] = None,
+    ) -> Iterator[List[Dict]]:
+        """Yield leased batches until no unclaimed, stale sensor is left"""
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO sensor.SensorSyncState (SensorID)
+                SELECT SensorID FROM sensor.Sensors
+                WHERE ExternalID IS NOT NULL AND IsActive = TRUE
+                ON CONFLICT (SensorID) DO NOTHING
+            """
+            )
+        conn.commit()
+
+        # An explicit sensor list is always synced; otherwise skip sensors another
+        # worker refreshed recently so replicas don't repeat each other's work
+        cutoff = None
+        if not sensor_external_ids:
+            cutoff = run_started - timedelta(
+                minutes=settings.SYNC_SHARD_FRESHNESS_MINUTES
+            )
 
-                # Prepare data for bulk insert
-                values = []
-                for p in points:
-                    if (
-                        "Value" in p
-                        and "Numeric" in p["Value"]
-                        and p["Value"]["Numeric"] is not None
-                    ):
-                        ts = p["Timestamp"].replace(
-                            "Z", "+00:00"
-                        )  # Simple fix, ideally use dateutil
-                        val = float(p["Value"]["Numeric"])
-                        # Quality mapping could be added here
-                        quality = "good"
-                        values.append((sensor_id, ts, val, quality))
-
-                if values:
-                    with conn.cursor() as cur:
-                        execute_values(
-                            cur,
-                            """
-                            INSERT INTO sensor.SensorReadings (SensorID, Timestamp, Value, Quality)
-                            VALUES %s
-                            ON CONFLICT DO NOTHING
-                        """,
-                            values,
+        while True:
+            batch = self._claim_sensors(conn, cutoff, sensor_external_ids)
+            if not batch:
+                return
+            yield batch
+            if sensor_external_ids:
+                # Explicit sensors are claimed once per run
+                cutoff = run_started
+
+    def _mark_synced(self, conn, sensor_id: int):
+        """Record a successful sync and release this worker's lease"""
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO sensor.SensorSyncState (SensorID, LastSyncedAt)
+                VALUES (%s, NOW())
+                ON CONFLICT (SensorID) DO UPDATE SET
+                    LastSyncedAt = NOW(),
+                    ClaimedBy = NULL,
+                    ClaimedUntil = NULL
+            """,
+                (sensor_id,),
+            )
+        conn.commit()
+
+    def sync_sensor(
+        self, conn, sensor: Dict, start_time: datetime, end_time: datetime
+    ) -> Tuple[int, int]:
+        """Fetch and store one sensor's readings; returns (rows written, windows skipped)"""
+        points = self.client.get_data(sensor["externalid"], start_time, end_time)
+        return self.store_points(conn, sensor["sensorid"], points, start_time)
+
+    def store_points(
+        self, conn, sensor_id: int, points: List[Dict], start_time: datetime
+    ) -> Tuple[int, int]:
+        """Parse Aquarius points and write the changed windows"""
+        if not points:
+            return 0, 0
+
+        # Prepare data for bulk insert
+        values = []
+        with PARSE_SECONDS.time(), stage("parse"):
+            for p in points:
+                if "Value" in p and "Numeric" in p["Value"] and p["Value"]["Numeric"] is not None:
+                    ts = p["Timestamp"].replace("Z", "+00:00")  # Simple fix, ideally use dateutil
+                    val = float(p["Value"]["Numeric"])
+                    # Quality mapping could be added here
+                    quality = "good"
+                    values.append((sensor_id, ts, val, quality))
+        POINTS_PARSED_TOTAL.inc(len(values))
+
+        if not values:
+            return 0, 0
+        return self._write_changed_windows(conn, sensor_id, values, start_time)
+
+    @time_stage("readings")
+    def sync_readings(
+        self,
+        days_back: int = 7,
+        sensor_external_ids: Optional[List[str]] = None,
+        sharded: Optional[bool] = None,
+        on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> bool:
+        """Sync readings for all active sensors (or the given ExternalIDs).
+
+        In sharded mode (SYNC_SHARDED, or sharded=True) sensors are leased in batches
+        from sensor.SensorSyncState, so any number of workers can run side by side
+        without fetching the same series twice.
+
+        on_progress(processed, total) is called after each sensor; total is None in
+        sharded mode. Returns False if the run could not complete.
+        """
+        if sharded is None:
+            sharded = settings.SYNC_SHARDED
+        logger.info(
+            f"Starting readings sync (days_back={days_back}, "
+            f"sharded={sharded}, worker={self.worker_id})..."
+        )
+        if not self.client.connect():
+            return False
+
+        try:
+            conn = get_db_connection()
+
+            end_time = datetime.now(timezone.utc)
+            start_time = end_time - timedelta(days=days_back)
+
+            total_sensors = None
+            if sharded:
+                batches = self._claimed_batches(conn, end_time, sensor_external_ids)
+            else:
+                sensors = self._get_active_sensors(conn, sensor_external_ids)
+                logger.info(f"Syncing readings for {len(sensors)} sensors")
+                total_sensors = len(sensors)
+                batches = iter([sensors])
+
+            total_points = 0
+            skipped_windows = 0
+            processed = 0
+
+            for batch in batches:
+                for pending, sensor in enumerate(batch):
+                    QUEUE_DEPTH.labels("sensors").set(len(batch) - pending)
+                    try:
+                        written, skipped = self.sync_sensor(
+                            conn, sensor, start_time, end_time
+                        )
+                        total_points += written
+                        skipped_windows += skipped
+                        self._mark_synced(conn, sensor["sensorid"])
+                    except Exception as e:
+                        # Keep the lease so the sensor is retried once it expires
+                        # rather than being reclaimed straight away in this run
+                        logger.error(
+                            f"Readings sync failed for sensor {sensor['externalid']}: {e}"
                         )
-                    conn.commit()
-                    total_points += len(values)
+                        conn.rollback()
+
+                    processed += 1
+                    if on_progress:
+                        on_progress(processed, total_sensors)
+                    if processed % 10 == 0:
+                        logger.info(f"Processed {processed} sensors")
 
-                if i % 10 == 0:
-                    logger.info(f"Processed {i}/{len(sensors)} sensors")
+            QUEUE_DEPTH.labels("sensors").set(0)
 
-            logger.info(f"Readings sync completed. Inserted {total_points} points.")
+            logger.info(
+                f"Readings sync completed. {processed} sensors, wrote {total_points} points, "
+                f"skipped {skipped_windows} unchanged sensor-day windows."
+            )
             conn.close()
+            return True
 
         except Exception as e:
             logger.error(f"Readings sync failed: {e}")
+            return False
         finally:
             self.client.disconnect()
 
-    def sync_all(self, days_back: int = 7):
-        self.sync_metadata()
-        self.sync_readings(days_back=days_back)
+    async def sync_readings_async(
+        self,
+        client,
+        days_back: int = 7,
+        sensor_external_ids: Optional[List[str]] = None,
+        on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> bool:
+        """Readings sync that fetches series concurrently on an AsyncAquariusClient.
+
+        Fetches run on the event loop, bounded by the client's worker queues; each result
+        is written on a worker thread as soon as it arrives, one write at a time.
+        """
+        with time_stage("readings"):
+            logger.info(f"Starting async readings sync (days_back={days_back})...")
+            if not await client.connect():
+                return False
+
+            conn = None
+            try:
+                conn = await asyncio.to_thread(get_db_connection)
+                sensors = await asyncio.to_thread(
+                    self._get_active_sensors, conn, sensor_external_ids
+                )
+                by_external_id = {sensor["externalid"]: sensor for sensor in sensors}
+                logger.info(f"Syncing readings for {len(sensors)} sensors")
+
+                end_time = datetime.now(timezone.utc)
+                start_time = end_time - timedelta(days=days_back)
+
+                total_points = 0
+                skipped_windows = 0
+                processed = 0
+                async for unique_id, points in client.iter_data(
+                    by_external_id, start_time, end_time
+                ):
+                    sensor = by_external_id[unique_id]
+                    QUEUE_DEPTH.labels("sensors").set(len(sensors) - processed)
+                    try:
+                        written, skipped = await asyncio.to_thread(
+                            self.store_points,
+                            conn,
+                            sensor["sensorid"],
+                            points,
+                            start_time,
+                        )
+                        total_points += written
+                        skipped_windows += skipped
+                    except Exception as e:
+                        logger.error(
+                            f"Readings sync failed for sensor {unique_id}: {e}"
+                        )
+                        await asyncio.to_thread(conn.rollback)
+
+                    processed += 1
+                    if on_progress:
+                        on_progress(processed, len(sensors))
+                QUEUE_DEPTH.labels("sensors").set(0)
+
+                logger.info(
+                    f"Async readings sync completed. {processed} sensors, wrote "
+                    f"{total_points} points, skipped {skipped_windows} unchanged "
+                    f"sensor-day windows."
+                )
+                return True
+
+            except Exception as e:
+                logger.error(f"Async readings sync failed: {e}")
+                return False
+            finally:
+                if conn is not None:
+                    conn.close()
+                await client.disconnect()
+
+    def sync_all(
+        self,
+        days_back: int = 7,
+        on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    ) -> bool:
+        metadata_ok = self.sync_metadata()
+        readings_ok = self.sync_readings(days_back=days_back, on_progress=on_progress)
+        return metadata_ok and readings_ok
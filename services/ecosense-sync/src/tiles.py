@@ -0,0 +1,312 @@
+"""Mapbox vector tiles of trees and sensors with an in-memory LRU cache.
+
+GET /tiles/{z}/{x}/{y}.mvt renders the requested layers with ST_AsMVT and
+ST_AsMVTGeom. Features are selected by intersecting the tile envelope (in
+WGS84) with the GiST-indexed Position columns. Each layer carries its ID plus
+a default attribute set. Clients can ask for other whitelisted columns as
+"layer.column", e.g. attributes=trees.HealthScore.
+
+Rendered tiles are kept in a bounded LRU cache (TILE_CACHE_MAX_TILES tiles,
+TILE_CACHE_MAX_BYTES bytes). Triggers on trees.Trees and sensor.Sensors send
+the bounding box of every write on the tile_invalidation channel. Cached tiles
+of that layer that overlap the box are dropped, at every zoom level. The cache
+is cleared whenever the LISTEN connection is (re)established, since
+notifications sent while it was down are lost, and tiles older than
+TILE_CACHE_TTL_SECONDS are re-rendered regardless.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+
+from .config import settings
+from .database import listen
+from .metrics import TILE_CACHE_TILES, TILE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "tile_invalidation"
+EXTENT = 4096
+BUFFER = 64
+
+
+class Layer:
+    def __init__(
+        self,
+        table: str,
+        id_column: str,
+        attributes: Sequence[str],
+        default: Sequence[str],
+        where: str,
+    ):
+        self.table = table
+        self.id_column = id_column
+        self.attributes = set(attributes)
+        self.default = list(default)
+        self.where = where
+
+
+LAYERS: Dict[str, Layer] = {
+    "trees": Layer(
+        "trees.Trees",
+        "VariantID",
+        attributes=[
+            "LocationID", "SpeciesID", "TreeStatusID", "VariantTypeID",
+            "ParentVariantID", "Height_m", "CrownWidth_m", "HealthScore", "Age_years",
+        ],
+        default=["LocationID", "SpeciesID", "Height_m"],
+        where="ScenarioID IS NULL",
+    ),
+    "sensors": Layer(
+        "sensor.Sensors",
+        "SensorID",
+        attributes=[
+            "LocationID", "SensorTypeID", "SensorModel", "ExternalID", "IsActive", "Unit",
+        ],
+        default=["LocationID", "SensorTypeID", "IsActive"],
+        where="IsActive = TRUE",
+    ),
+}
+
+
+class TileError(ValueError):
+    """The tile request names an unknown layer or attribute, or an invalid tile"""
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """WGS84 (west, south, east, north) of a web mercator tile"""
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def parse_request(
+    z: int, x: int, y: int, layers: Optional[List[str]], attributes: Optional[List[str]]
+) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """Validate a tile request; returns ((layer, columns), ...) in a stable order"""
+    if z < 0 or z > 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise TileError(f"Invalid tile {z}/{x}/{y}")
+    names = sorted(set(layers or LAYERS))
+    unknown = [name for name in names if name not in LAYERS]
+    if unknown:
+        raise TileError(f"Unknown layers: {', '.join(unknown)}")
+
+    requested: Dict[str, List[str]] = {}
+    for item in attributes or []:
+        layer, _, column = item.partition(".")
+        if layer not in names or column not in LAYERS[layer].attributes:
+            raise TileError(f"Unknown attribute {item!r}")
+        requested.setdefault(layer, []).append(column)
+    return tuple(
+        (name, tuple(sorted(set(requested.get(name) or LAYERS[name].default))))
+        for name in names
+    )
+
+
+def _layer_query(name: str, columns: Sequence[str]) -> sql.Composed:
+    layer = LAYERS[name]
+    return sql.SQL(
+        """
+        SELECT COALESCE(ST_AsMVT(features.*, {name}, {extent}, 'geom', {id}), ''::bytea)
+        FROM (
+            SELECT ST_AsMVTGeom(ST_Transform(Position, 3857), bounds.mercator, {extent}, {buffer}, true) AS geom,
+                   {id_column}, {columns}
+            FROM {table}, bounds
+            WHERE Position && bounds.wgs84 AND {where}
+        ) features
+        """
+    ).format(
+        name=sql.Literal(name),
+        extent=sql.Literal(EXTENT),
+        buffer=sql.Literal(BUFFER),
+        id=sql.Literal(layer.id_column.lower()),
+        id_column=sql.Identifier(layer.id_column.lower()),
+        columns=sql.SQL(", ").join(sql.Identifier(c.lower()) for c in columns),
+        table=sql.SQL(layer.table),
+        where=sql.SQL(layer.where),
+    )
+
+
+def tile_query(spec: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> sql.Composed:
+    """One statement concatenating the MVT layers of a tile"""
+    # The envelope is widened by the tile buffer so features just outside still clip correctly
+    return sql.SQL(
+        """
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => {margin}) AS mercator,
+                   ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => {margin}), 4326) AS wgs84
+        )
+        SELECT {layers}
+        """
+    ).format(
+        margin=sql.Literal(BUFFER / EXTENT),
+        layers=sql.SQL(" || ").join(
+            sql.SQL("({})").format(_layer_query(name, columns)) for name, columns in spec
+        ),
+    )
+
+
+class TileCache:
+    """Thread-safe LRU of rendered tiles, bounded by count, bytes and age"""
+
+    def __init__(
+        self,
+        max_tiles: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.max_tiles = max_tiles or settings.TILE_CACHE_MAX_TILES
+        self.max_bytes = max_bytes or settings.TILE_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds or settings.TILE_CACHE_TTL_SECONDS
+        # key -> (tile, monotonic time it was stored)
+        self._tiles: "OrderedDict[Tuple, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; tiles rendered across one are not stored
+        self.generation = 0
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is None:
+                return None
+            tile, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._tiles[key]
+                self._bytes -= len(tile)
+                TILE_CACHE_TILES.set(len(self._tiles))
+                return None
+            self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key: Tuple, tile: bytes, generation: int):
+        with self._lock:
+            if generation != self.generation or len(tile) > self.max_bytes:
+                return
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._tiles[key] = (tile, time.monotonic())
+            self._bytes += len(tile)
+            while len(self._tiles) > self.max_tiles or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._tiles.popitem(last=False)
+                self._bytes -= len(evicted)
+            TILE_CACHE_TILES.set(len(self._tiles))
+
+    def invalidate(self, layer: str, bbox: Sequence[float]) -> int:
+        """Drop cached tiles containing the layer whose bounds overlap bbox (WGS84)"""
+        west, south, east, north = bbox
+        with self._lock:
+            self.generation += 1
+            stale = []
+            for key in self._tiles:
+                spec, z, x, y = key
+                if not any(name == layer for name, _ in spec):
+                    continue
+                tile_west, tile_south, tile_east, tile_north = tile_bounds(z, x, y)
+                if tile_west <= east and tile_east >= west and tile_south <= north and tile_north >= south:
+                    stale.append(key)
+            for key in stale:
+                self._bytes -= len(self._tiles.pop(key)[0])
+            TILE_CACHE_TILES.set(len(self._tiles))
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._tiles.clear()
+            self._bytes = 0
+            TILE_CACHE_TILES.set(0)
+
+
+class TileService:
+    def __init__(self):
+        self.cache = TileCache()
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=listen,
+            args=([INVALIDATION_CHANNEL], self._on_notify, self._stop, self._on_connect),
+            name="tile-invalidation",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if self._pool is not None:
+            self._pool.closeall()
+
+    def _on_connect(self):
+        # Invalidations sent while the LISTEN connection was down are lost
+        self.cache.clear()
+        logger.info("Tile cache cleared after (re)connecting to the invalidation channel")
+
+    def _on_notify(self, channel: str, payload: str):
+        try:
+            message = json.loads(payload)
+            dropped = self.cache.invalidate(message["layer"], message["bbox"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed tile invalidation, clearing cache: {e}")
+            self.cache.clear()
+            return
+        if dropped:
+            logger.debug(f"Dropped {dropped} cached tiles after {message['layer']} changes")
+
+    def _connections(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    1,
+                    settings.TILE_DB_POOL_SIZE,
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    database=settings.DB_NAME,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASSWORD,
+                )
+            return self._pool
+
+    def render(self, spec, z: int, x: int, y: int) -> Tuple[bytes, bool]:
+        """Tile bytes and whether they came from the cache"""
+        key = (spec, z, x, y)
+        tile = self.cache.get(key)
+        if tile is not None:
+            TILE_REQUESTS_TOTAL.labels("hit").inc()
+            return tile, True
+
+        TILE_REQUESTS_TOTAL.labels("miss").inc()
+        generation = self.cache.generation
+        if z < settings.TILE_MIN_ZOOM:
+            tile = b""
+        else:
+            pool = self._connections()
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(tile_query(spec), {"z": z, "x": x, "y": y})
+                    tile = bytes(cur.fetchone()[0] or b"")
+                conn.rollback()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn)
+        self.cache.put(key, tile, generation)
+        return tile, False
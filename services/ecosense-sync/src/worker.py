@@ -0,0 +1,76 @@
+"""Headless sharded sync runner.
+
+Starts N worker processes that share the sensor list through sensor.SensorSyncState.
+The same command can run in several containers against the same database.
+
+Usage:
+  python -m src.worker --processes 4              # One sharded pass, then exit
+  python -m src.worker --processes 4 --loop       # Repeat every SYNC_INTERVAL_MINUTES
+"""
+
+import argparse
+import logging
+import multiprocessing
+import time
+
+from .config import settings
+from .sync import EcosenseSync
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(processName)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+
+def run_worker(index: int, days_back: int, loop: bool):
+    sync = EcosenseSync()
+    if settings.SYNC_WORKER_ID:
+        # A fixed worker ID is shared by every process in this container
+        sync.worker_id = f"{settings.SYNC_WORKER_ID}-{index}"
+
+    while True:
+        started = time.monotonic()
+        # Only the worker holding the advisory lock actually refreshes metadata
+        sync.sync_metadata()
+        sync.sync_readings(days_back=days_back, sharded=True)
+        logger.info(
+            f"Worker {sync.worker_id} finished pass in {time.monotonic() - started:.1f}s"
+        )
+        if not loop:
+            return
+        time.sleep(settings.SYNC_INTERVAL_MINUTES * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded Ecosense sync worker")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Worker processes to start"
+    )
+    parser.add_argument(
+        "--days-back",
+        type=int,
+        default=settings.DEFAULT_DAYS_BACK,
+        help="Days of readings to sync per sensor",
+    )
+    parser.add_argument(
+        "--loop", action="store_true", help="Keep running on SYNC_INTERVAL_MINUTES"
+    )
+    args = parser.parse_args()
+
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(i, args.days_back, args.loop),
+            name=f"sync-worker-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""Shared test setup: import the service as the `src` package without a .env"""
+
+import os
+import sys
+from pathlib import Path
+
+# Settings() requires these; tests never reach Aquarius or the database
+for name in (
+    "AQUARIUS_HOSTNAME",
+    "AQUARIUS_USERNAME",
+    "AQUARIUS_PASSWORD",
+    "DB_HOST",
+    "DB_NAME",
+    "DB_USER",
+    "DB_PASSWORD",
+):
+    os.environ.setdefault(name, "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,279 @@
+import asyncio
+import io
+import math
+import time
+
+import pytest
+
+from src import ingest
+from src.ingest import (
+    IngestError,
+    IngestResult,
+    _Columns,
+    _lines,
+    _parse_quality,
+    _parse_timestamp,
+    _parse_value,
+    _record_from_ndjson,
+    ingest_stream,
+)
+
+
+async def chunked(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Batches ingest_stream hands to _copy_batch, with two known sensors"""
+    batches = []
+
+    def copy_batch(conn, batch):
+        batches.append(batch)
+        return len(batch)
+
+    monkeypatch.setattr(ingest, "get_db_connection", FakeConnection)
+    monkeypatch.setattr(ingest, "_copy_batch", copy_batch)
+    monkeypatch.setattr(ingest.sensor_ids, "_ids", {"dendro-1": 1, "sapflow-2": 2})
+    monkeypatch.setattr(ingest.sensor_ids, "_loaded_at", time.monotonic())
+    return batches
+
+
+def ingest_body(*chunks: bytes, content_type: str) -> IngestResult:
+    return asyncio.run(ingest_stream(chunked(*chunks), content_type, IngestResult()))
+
+
+# --- Field parsing ---------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-05-01T12:00:00Z", "2024-05-01T12:00:00+00:00"),
+        ("2024-05-01T14:00:00+02:00", "2024-05-01T14:00:00+02:00"),
+        (" 2024-05-01T12:00:00 ", "2024-05-01T12:00:00+00:00"),
+        ("2024-05-01", "2024-05-01T00:00:00+00:00"),
+    ],
+)
+def test_parse_timestamp(value, expected):
+    assert _parse_timestamp(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", 1714564800, "yesterday"])
+def test_parse_timestamp_rejects(value):
+    with pytest.raises(ValueError):
+        _parse_timestamp(value)
+
+
+@pytest.mark.parametrize("value, expected", [("12.3", 12.3), (-5, -5.0), ("99999999.9999", 99999999.9999)])
+def test_parse_value(value, expected):
+    assert _parse_value(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "abc", "nan", "inf", "-Infinity", math.inf, 1e8, "-1e9"])
+def test_parse_value_rejects_missing_non_finite_and_out_of_range(value):
+    with pytest.raises(ValueError):
+        _parse_value(value)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(None, "good"), ("", "good"), ("Suspect", "suspect"), (" BAD ", "bad")],
+)
+def test_parse_quality(value, expected):
+    assert _parse_quality(value) == expected
+
+
+def test_parse_quality_rejects_unknown():
+    with pytest.raises(ValueError, match="unknown quality"):
+        _parse_quality("excellent")
+
+
+# --- Records ---------------------------------------------------------------
+
+
+def test_csv_columns_accept_aliases_in_any_order():
+    columns = _Columns(["Value", " ExternalID ", "extra", "TIMESTAMP"])
+    assert columns.record(["1.5", "dendro-1", "x", "2024-05-01T12:00:00Z"]) == {
+        "value": "1.5",
+        "external_id": "dendro-1",
+        "timestamp": "2024-05-01T12:00:00Z",
+    }
+
+
+def test_csv_columns_short_row_gives_none():
+    columns = _Columns(["external_id", "timestamp", "value", "quality"])
+    assert columns.record(["dendro-1", "2024-05-01T12:00:00Z"])["value"] is None
+
+
+def test_csv_columns_require_id_timestamp_and_value():
+    with pytest.raises(IngestError, match="timestamp, value"):
+        _Columns(["external_id", "quality"])
+
+
+def test_ndjson_record_accepts_column_names():
+    record = _record_from_ndjson('{"ExternalID": "dendro-1", "Timestamp": "t", "Value": 1}')
+    assert record == {"external_id": "dendro-1", "timestamp": "t", "value": 1, "quality": None}
+
+
+@pytest.mark.parametrize("line", ["[1, 2]", "not json"])
+def test_ndjson_record_rejects_non_objects(line):
+    with pytest.raises(ValueError):
+        _record_from_ndjson(line)
+
+
+# --- Line splitting --------------------------------------------------------
+
+
+def test_lines_strip_crlf_and_keep_unterminated_last_line():
+    lines = asyncio.run(collect(_lines(chunked(b"a,b\r\nc,", b"d\r\n\r\ne"))))
+    assert lines == ["a,b", "c,d", "", "e"]
+
+
+def test_lines_join_utf8_character_split_across_chunks():
+    body = "Mühle,1\n".encode("utf-8")
+    split = body.index("ü".encode("utf-8")) + 1
+    lines = asyncio.run(collect(_lines(chunked(body[:split], body[split:]))))
+    assert lines == ["Mühle,1"]
+
+
+# --- Streams ---------------------------------------------------------------
+
+
+def test_ingest_ndjson(written):
+    result = ingest_body(
+        b'{"external_id": "dendro-1", "timestamp": "2024-05-01T12:00:00Z", "value": 1.5}\n'
+        b'{"external_id": "sapflow-2", "timestamp": "2024-05-01T12:00:00Z", "value": 2, "quality": "suspect"}\n'
+        b'{"external_id": "unknown", "timestamp": "2024-05-01T12:00:00Z", "value": 3}\n'
+        b'{"external_id": "dendro-1", "timestamp": "2024-05-01T12:00:00Z", "value": "nan"}\n',
+        content_type="application/x-ndjson",
+    )
+    assert written == [[
+        (1, "2024-05-01T12:00:00+00:00", 1.5, "good"),
+        (2, "2024-05-01T12:00:00+00:00", 2.0, "suspect"),
+    ]]
+    assert (result.received, result.written, result.rejected) == (4, 2, 1)
+    assert result.unknown_external_ids == {"unknown": 1}
+    assert result.errors[0].startswith("line 4:")
+
+
+def test_ingest_csv_with_aliases_crlf_and_split_row(written):
+    body = (
+        "ExternalID,Timestamp,Value,Quality\r\n"
+        "dendro-1,2024-05-01T12:00:00Z,1.5,Good\r\n"
+        "sapflow-2,2024-05-01T12:00:00Z,2,excellent\r\n"
+        "dendro-1,2024-05-01T12:10:00Z,1.6,\r\n"
+    ).encode("utf-8")
+    result = ingest_body(body[:50], body[50:], content_type="text/csv")
+    assert written == [[
+        (1, "2024-05-01T12:00:00+00:00", 1.5, "good"),
+        (1, "2024-05-01T12:10:00+00:00", 1.6, "good"),
+    ]]
+    assert result.rejected == 1
+    assert "unknown quality" in result.errors[0]
+
+
+def test_ingest_csv_without_known_header_fails(written):
+    with pytest.raises(IngestError):
+        ingest_body(b"a,b,c\n1,2,3\n", content_type="text/csv")
+
+
+def test_ingest_batches(written, monkeypatch):
+    monkeypatch.setattr(ingest.settings, "INGEST_BATCH_ROWS", 2)
+    lines = b"".join(
+        b'{"external_id": "dendro-1", "timestamp": "2024-05-01T12:0%d:00Z", "value": 1}\n' % i
+        for i in range(5)
+    )
+    result = ingest_body(lines, content_type="application/x-ndjson")
+    assert [len(batch) for batch in written] == [2, 2, 1]
+    assert (result.batches, result.written) == (3, 5)
+
+
+def test_ingest_keeps_duplicates_in_order_for_last_row_wins(written):
+    result = ingest_body(
+        b'{"external_id": "dendro-1", "timestamp": "2024-05-01T12:00:00Z", "value": 1}\n'
+        b'{"external_id": "dendro-1", "timestamp": "2024-05-01T12:00:00Z", "value": 2}\n',
+        content_type="application/x-ndjson",
+    )
+    # Both rows reach staging in arrival order; the upsert keeps the later one
+    assert [row[2] for row in written[0]] == [1.0, 2.0]
+    assert "ORDER BY SensorID, Timestamp, ctid DESC" in ingest.UPSERT_SQL
+    assert result.received == 2
+
+
+# --- Batch writes ----------------------------------------------------------
+
+
+class RecordingCursor:
+    def __init__(self, returned):
+        self.returned = returned
+        self.statements = []
+        self.copied = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def copy_expert(self, sql, buffer: io.StringIO):
+        self.copied = buffer.read()
+
+    def fetchall(self):
+        return self.returned
+
+
+class RecordingConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+
+def test_copy_batch_stages_rows_and_notifies_only_written(monkeypatch):
+    notified = []
+    monkeypatch.setattr(ingest, "notify_readings", lambda cur, rows: notified.append(rows))
+    changed = [(1, "2024-05-01T12:00:00+00:00", 2.0)]
+    cur = RecordingCursor(changed)
+    conn = RecordingConnection(cur)
+    batch = [
+        (1, "2024-05-01T12:00:00+00:00", 1.0, "good"),
+        (1, "2024-05-01T12:00:00+00:00", 2.0, "good"),
+    ]
+    assert ingest._copy_batch(conn, batch) == 1
+    assert cur.copied.splitlines() == [
+        "1\t2024-05-01T12:00:00+00:00\t1.0\tgood",
+        "1\t2024-05-01T12:00:00+00:00\t2.0\tgood",
+    ]
+    assert cur.statements[-1] == ingest.UPSERT_SQL
+    assert notified == [changed]
+    assert conn.committed
+
+
+def test_copy_batch_skips_notify_when_nothing_changed(monkeypatch):
+    notified = []
+    monkeypatch.setattr(ingest, "notify_readings", lambda cur, rows: notified.append(rows))
+    conn = RecordingConnection(RecordingCursor([]))
+    assert ingest._copy_batch(conn, [(1, "2024-05-01T12:00:00+00:00", 1.0, "good")]) == 0
+    assert notified == []
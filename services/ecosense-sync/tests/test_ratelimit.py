@@ -0,0 +1,76 @@
+import pytest
+
+from src import ratelimit
+from src.ratelimit import MIN_RATE_FRACTION, RECOVERY_STEPS, TokenBucket, retry_after_seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic for the rate limiter; advance with clock.now += seconds"""
+
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+def test_burst_is_free_then_reservations_queue(clock):
+    bucket = TokenBucket("test", rate=2.0, burst=2)
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == 0
+    # Tokens go negative, so each caller waits behind the ones before it
+    assert bucket._reserve() == pytest.approx(0.5)
+    assert bucket._reserve() == pytest.approx(1.0)
+    assert bucket._tokens == pytest.approx(-2)
+
+
+def test_refill_pays_back_negative_tokens(clock):
+    bucket = TokenBucket("test", rate=2.0, burst=1)
+    bucket._reserve()
+    bucket._reserve()
+    clock.now += 1.0
+    # One second refills two tokens: the debt of one, plus one to spend now
+    assert bucket._reserve() == 0
+    clock.now += 100
+    bucket._reserve()
+    assert bucket._tokens == pytest.approx(bucket.capacity - 1)
+
+
+def test_throttle_halves_rate_down_to_floor(clock):
+    bucket = TokenBucket("test", rate=10.0)
+    bucket.on_throttled()
+    assert bucket.rate == pytest.approx(5.0)
+    for _ in range(20):
+        bucket.on_throttled()
+    assert bucket.rate == pytest.approx(10.0 * MIN_RATE_FRACTION)
+
+
+def test_throttle_pauses_for_retry_after(clock):
+    bucket = TokenBucket("test", rate=10.0)
+    bucket.on_throttled(retry_after=30)
+    assert bucket._reserve() == pytest.approx(30)
+    clock.now += 30
+    assert bucket._reserve() == 0
+
+
+def test_successes_recover_rate_additively(clock):
+    bucket = TokenBucket("test", rate=10.0)
+    bucket.on_throttled()
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(5.0 + 10.0 / (10 * RECOVERY_STEPS))
+    for _ in range(10 * RECOVERY_STEPS):
+        bucket.on_success()
+    assert bucket.rate == 10.0
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"Retry-After": "2.5"}, 2.5),
+        ({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+        ({}, None),
+    ],
+)
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(headers) == expected
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.config import settings
+from src.scheduler import MAX_BACKOFF_STEPS, AdaptiveScheduler, SensorSchedule
+
+
+def make_schedule(**row) -> SensorSchedule:
+    sensor = {"sensorid": 1, "externalid": "abc", "samplinginterval_seconds": 600}
+    sensor.update(row)
+    return SensorSchedule(sensor)
+
+
+def test_base_interval_has_floor():
+    schedule = make_schedule(samplinginterval_seconds=10)
+    assert schedule.base_interval == settings.SYNC_ADAPTIVE_MIN_INTERVAL_SECONDS
+
+
+def test_idle_polls_back_off_exponentially_up_to_cap(monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_ADAPTIVE_MAX_INTERVAL_SECONDS", 10**9)
+    schedule = make_schedule()
+    intervals = []
+    for _ in range(MAX_BACKOFF_STEPS + 2):
+        schedule.record_poll(0.0, None)
+        intervals.append(schedule.interval)
+    assert intervals[:3] == [1200, 2400, 4800]
+    assert intervals[-1] == intervals[-2] == 600 * 2**MAX_BACKOFF_STEPS
+
+
+def test_new_readings_reset_backoff():
+    schedule = make_schedule()
+    now = datetime.now(timezone.utc)
+    schedule.record_poll(0.0, now)
+    schedule.record_poll(0.0, now)
+    assert schedule.idle_runs == 1
+    schedule.record_poll(0.0, now + timedelta(minutes=10))
+    assert schedule.idle_runs == 0
+    assert schedule.interval == 600
+    assert schedule.newest_reading_at == now + timedelta(minutes=10)
+
+
+def test_interval_never_drops_below_latency_floor():
+    schedule = make_schedule()
+    schedule.record_poll(30.0, datetime.now(timezone.utc))
+    assert schedule.interval == int(30.0 * settings.SYNC_ADAPTIVE_LATENCY_FACTOR)
+
+
+def test_interval_capped_at_maximum():
+    schedule = make_schedule(samplinginterval_seconds=3600)
+    for _ in range(MAX_BACKOFF_STEPS):
+        schedule.record_poll(0.0, None)
+    assert schedule.interval == settings.SYNC_ADAPTIVE_MAX_INTERVAL_SECONDS
+
+
+def test_next_due_is_jittered_interval():
+    schedule = make_schedule()
+    before = datetime.now(timezone.utc)
+    schedule.record_poll(0.0, before)
+    assert schedule.last_synced_at >= before
+    delay = (schedule.next_due - schedule.last_synced_at).total_seconds()
+    assert 0.9 * schedule.interval <= delay <= 1.1 * schedule.interval
+
+
+def test_latency_is_moving_average():
+    schedule = make_schedule(avglatencyms=1000)
+    schedule.record_poll(2.0, None)
+    assert schedule.avg_latency == pytest.approx(1.2)
+
+
+def test_pop_due_skips_stale_entries():
+    scheduler = AdaptiveScheduler(sync_service=object())
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    current = make_schedule(sensorid=1, nextdueat=past)
+    moved = make_schedule(sensorid=2, nextdueat=past)
+    scheduler._schedules = {1: current, 2: moved}
+    scheduler._heap = [(past, 1), (past, 2), (past, 3)]
+    moved.next_due = past + timedelta(days=1)
+    assert scheduler._pop_due() == [current]
+    assert scheduler._heap == []
@@ -11,16 +11,28 @@ Usage:
   python ecosense_sync.py --days 30         # Sync last 30 days
   python ecosense_sync.py --dry-run         # Show what would be synced
   python ecosense_sync.py --use-inventory   # Enable smart filtering via local DB
+  python ecosense_sync.py --production-only --all-data  # Resumable full push
+  python ecosense_sync.py --local-only --cache --days 90  # Backfill through the response cache
+  python ecosense_sync.py --local-only --offline          # Replay stage 1 from the cache
+  python ecosense_sync.py --local-only --profile          # Stage timings + flamegraph stacks
 """
 
 import argparse
+import gzip
+import hashlib
+import json
 import logging
 import os
+import sqlite3
 import sys
+import threading
 import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import psycopg2
 import psycopg2.extras
@@ -42,6 +54,361 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    """Adaptive token bucket for one endpoint budget (requests per second)
+
+    Callers only wait when the bucket is empty. A 429 halves the rate and pauses for
+    Retry-After; each success wins back a little of the configured budget.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.total_wait = 0.0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self.paused_until - now)
+            self.total_wait += wait
+            self.requests += 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 200)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        with self.lock:
+            self.rate = max(self.max_rate * 0.05, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + retry_after
+                )
+        logger.warning(
+            f"⚠️  {self.name} rate limited, slowing to {self.rate:.2f} req/s"
+        )
+
+
+class RateLimits:
+    """Per-endpoint token buckets shared by every client in the process
+
+    Budgets come from RATE_LIMIT_<NAME> environment variables (requests per second).
+    """
+
+    DEFAULT_BUDGETS = {
+        "aquarius_data": 10.0,
+        "aquarius_metadata": 1.0,
+        "production_bulk_insert": 1.0,  # the proxy allows about 60 requests/minute
+        "production": 1.0,
+    }
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, name: str) -> TokenBucket:
+        with self.lock:
+            if name not in self.buckets:
+                rate = float(
+                    os.getenv(
+                        f"RATE_LIMIT_{name.upper()}",
+                        self.DEFAULT_BUDGETS.get(name, 1.0),
+                    )
+                )
+                self.buckets[name] = TokenBucket(name, rate)
+            return self.buckets[name]
+
+    def log_summary(self):
+        """Log time spent waiting on each bucket"""
+        for name, bucket in sorted(self.buckets.items()):
+            logger.info(
+                f"   ⏳ {name}: {bucket.requests} requests, waited {bucket.total_wait:.1f}s "
+                f"(now {bucket.rate:.2f} req/s)"
+            )
+
+
+RATE_LIMITS = RateLimits()
+
+
+class Profiler:
+    """Sampling profiler with per-stage wall and CPU time for one sync run
+
+    A daemon thread samples the main thread's stack every `interval` seconds and
+    counts folded stacks (module:function;... count), the input format of
+    flamegraph.pl, speedscope and inferno. profile_stage() blocks add wall and
+    CPU time per stage (Aquarius requests, JSON decoding, parsing, execute_values,
+    commits, production posts).
+    """
+
+    def __init__(self, directory: str, interval: float = 0.005):
+        self.directory = directory
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.thread_id = threading.get_ident()
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self.started = time.perf_counter()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def record(self, name: str, wall: float, cpu: float):
+        stats = self.stages.setdefault(
+            name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0}
+        )
+        stats["calls"] += 1
+        stats["wall_seconds"] += wall
+        stats["cpu_seconds"] += cpu
+
+    def _sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+                names.append(f"{module}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.samples[";".join(reversed(names))] += 1
+
+    def stop(self):
+        """Stop sampling, write <run>.folded and <run>.stages.json and log the stages"""
+        wall = time.perf_counter() - self.started
+        self.stop_event.set()
+        self.sampler.join()
+
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(
+            self.directory, f"ecosense_sync-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        )
+        with open(f"{base}.folded", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(f"{base}.stages.json", "w") as f:
+            json.dump(
+                {
+                    "wall_seconds": wall,
+                    "samples": sum(self.samples.values()),
+                    "interval_ms": self.interval * 1000,
+                    "stages": self.stages,
+                },
+                f,
+                indent=2,
+            )
+
+        logger.info(f"🔬 Profile ({wall:.1f}s wall, {sum(self.samples.values())} samples):")
+        for name, stats in sorted(
+            self.stages.items(), key=lambda item: -item[1]["wall_seconds"]
+        ):
+            logger.info(
+                f"   🔬 {name}: {stats['calls']} calls, wall {stats['wall_seconds']:.2f}s, "
+                f"cpu {stats['cpu_seconds']:.2f}s"
+            )
+        logger.info(f"   🔥 Flamegraph stacks: {base}.folded")
+
+
+PROFILER: Optional[Profiler] = None
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Add the block's wall and CPU time to the active profiler, if --profile is set"""
+    if PROFILER is None:
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        PROFILER.record(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def limited_request(
+    bucket_name: str, session: Any, method: str, url: str, **kwargs
+) -> requests.Response:
+    """Send a request through a rate-limit bucket, retrying 429s up to 3 times"""
+    bucket = RATE_LIMITS.bucket(bucket_name)
+    for _ in range(4):
+        bucket.acquire()
+        with profile_stage(f"http:{bucket_name}"):
+            response = session.request(method, url, **kwargs)
+        if response.status_code != 429:
+            bucket.on_success()
+            return response
+        bucket.on_throttled(_retry_after(response))
+    return response
+
+
+# ResponseCache meta entry holding the query window of the last caching run
+LAST_WINDOW_KEY = "last_window"
+
+
+class ResponseCache:
+    """Content-addressed, gzip-compressed cache of Aquarius responses on local disk
+
+    Request keys map to the SHA-256 of the response body; identical bodies are stored once
+    under objects/. An SQLite index tracks last use, and least recently used entries are
+    evicted once the stored bytes exceed max_bytes. Small run metadata (the query window
+    of the last caching run, for offline replay) is kept in the same index.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """
+        )
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS objects (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            )
+        """
+        )
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """
+        )
+        self.db.commit()
+
+    def get_meta(self, name: str) -> Optional[Any]:
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, name: str, value: Any):
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            (name, json.dumps(value)),
+        )
+        self.db.commit()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT digest FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row:
+            try:
+                with gzip.open(self._path(row[0]), "rb") as f:
+                    payload = json.loads(f.read())
+                self.db.execute(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                self.db.commit()
+                self.hits += 1
+                return payload
+            except (OSError, ValueError):
+                # Object removed or corrupted on disk; treat as a miss
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.db.commit()
+        self.misses += 1
+        return None
+
+    def put(self, key: str, body: bytes):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+            self.db.execute(
+                "INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)",
+                (digest, os.path.getsize(path)),
+            )
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries (key, digest, last_used) VALUES (?, ?, ?)",
+            (key, digest, time.time()),
+        )
+        self.db.commit()
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the stored objects fit max_bytes
+
+        An object's bytes are freed once its last entry goes, so the entries to drop are
+        picked in memory from reference counts; the deletes and the orphan scan then run
+        once.
+        """
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        sizes = dict(self.db.execute("SELECT digest, size FROM objects"))
+        refs = dict(self.db.execute("SELECT digest, COUNT(*) FROM entries GROUP BY digest"))
+        evicted = []
+        for key, digest in self.db.execute(
+            "SELECT key, digest FROM entries ORDER BY last_used"
+        ).fetchall():
+            evicted.append((key,))
+            refs[digest] -= 1
+            if refs[digest] == 0:
+                total -= sizes.get(digest, 0)
+                if total <= self.max_bytes:
+                    break
+        self.db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        orphans = self.db.execute(
+            """
+            SELECT o.digest FROM objects o
+            WHERE NOT EXISTS (SELECT 1 FROM entries e WHERE e.digest = o.digest)
+        """
+        ).fetchall()
+        self.db.executemany("DELETE FROM objects WHERE digest = ?", orphans)
+        self.db.commit()
+        for (digest,) in orphans:
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+
 @dataclass
 class EcosenseSensor:
     """Represents a sensor needed by the Shiny app"""
@@ -52,17 +419,28 @@ class EcosenseSensor:
     parameter_unit: str
     timeseries_identifier: str  # parameter.label@location_identifier
     unique_id: str
+    corrected_version: str = ""  # LastModified of the time series description
 
 
 class AquariusClient:
     """Official Aquarius API client for sensor discovery and data retrieval"""
 
-    def __init__(self, hostname: str, username: str, password: str):
+    def __init__(
+        self,
+        hostname: str,
+        username: str,
+        password: str,
+        cache: Optional[ResponseCache] = None,
+        offline: bool = False,
+    ):
         self.hostname = hostname.rstrip("/")
         self.username = username
         self.password = password
         self.session = requests.Session()
         self.token = None
+        self.cache = cache
+        self.offline = offline  # serve from the cache only, never contact Aquarius
+        self.offline_misses = 0
 
         # Handle hostname that may or may not include /AQUARIUS
         if "/AQUARIUS" in self.hostname:
@@ -72,6 +450,9 @@ class AquariusClient:
 
     def connect(self) -> bool:
         """Connect to Aquarius API"""
+        if self.offline:
+            logger.info("📼 Offline replay: serving Aquarius responses from the cache")
+            return True
         try:
             auth_url = f"{self.base_url}/session"
             logger.info(f"Connecting to Aquarius at: {auth_url}")
@@ -103,12 +484,48 @@ class AquariusClient:
     def disconnect(self):
         """Disconnect from Aquarius"""
         try:
-            if self.token:
+            if self.token and not self.offline:
                 self.session.delete(f"{self.base_url}/session")
                 logger.info("Disconnected from Aquarius")
         except Exception as e:
             logger.warning(f"Disconnect warning: {e}")
 
+    def _cached_get(
+        self, bucket_name: str, endpoint: str, cache_key: Optional[str], **kwargs
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """GET a Publish endpoint through the response cache; returns (status, json)"""
+        if self.cache and cache_key:
+            payload = self.cache.get(cache_key)
+            if payload is not None:
+                return 200, payload
+        if self.offline:
+            return 404, None
+
+        response = limited_request(
+            bucket_name, self.session, "GET", f"{self.base_url}/{endpoint}", **kwargs
+        )
+        if response.status_code != 200:
+            return response.status_code, None
+        if self.cache and cache_key:
+            self.cache.put(cache_key, response.content)
+        with profile_stage("json_decode"):
+            return 200, response.json()
+
+    def _get_descriptions(self) -> Tuple[int, List[Dict[str, Any]]]:
+        # Descriptions are always refreshed online; the cached copy is for offline replay
+        status, payload = self._cached_get(
+            "aquarius_metadata",
+            "GetTimeSeriesDescriptionList",
+            ResponseCache.key("GetTimeSeriesDescriptionList") if self.offline else None,
+            timeout=30,
+        )
+        if status == 200 and self.cache and not self.offline:
+            self.cache.put(
+                ResponseCache.key("GetTimeSeriesDescriptionList"),
+                json.dumps(payload).encode("utf-8"),
+            )
+        return status, (payload or {}).get("TimeSeriesDescriptions", [])
+
     def get_ecosense_sensors(
         self, use_inventory_filtering: bool = False
     ) -> List[EcosenseSensor]:
@@ -163,17 +580,14 @@ class AquariusClient:
 
                     # Get all time series descriptions ONCE (instead of per sensor)
                     logger.info("📥 Fetching Aquarius time series descriptions...")
-                    response = self.session.get(
-                        f"{self.base_url}/GetTimeSeriesDescriptionList", timeout=30
-                    )
+                    status, all_ts = self._get_descriptions()
 
-                    if response.status_code != 200:
+                    if status != 200:
                         logger.error(
-                            f"Failed to get time series descriptions: {response.status_code}"
+                            f"Failed to get time series descriptions: {status}"
                         )
                         return []
 
-                    all_ts = response.json().get("TimeSeriesDescriptions", [])
                     logger.info(
                         f"📊 Retrieved {len(all_ts)} time series descriptions from Aquarius"
                     )
@@ -193,6 +607,7 @@ class AquariusClient:
 
                         # Find unique ID from the already-fetched time series list
                         unique_id = None
+                        corrected_version = ""
                         for ts in all_ts:
                             if (
                                 ts.get("Parameter") == param
@@ -200,6 +615,7 @@ class AquariusClient:
                                 and ts.get("LocationIdentifier") == location
                             ):
                                 unique_id = ts.get("UniqueId")
+                                corrected_version = ts.get("LastModified", "")
                                 break
 
                         if unique_id:
@@ -210,6 +626,7 @@ class AquariusClient:
                                 parameter_unit=unit,
                                 timeseries_identifier=ts_identifier,
                                 unique_id=unique_id,
+                                corrected_version=corrected_version,
                             )
                             sensors.append(sensor)
                         else:
@@ -247,16 +664,11 @@ class AquariusClient:
 
         # Get all time series descriptions
         try:
-            response = self.session.get(
-                f"{self.base_url}/GetTimeSeriesDescriptionList", timeout=30
-            )
-            if response.status_code != 200:
-                logger.error(
-                    f"Failed to get time series descriptions: {response.status_code}"
-                )
+            status, all_series = self._get_descriptions()
+            if status != 200:
+                logger.error(f"Failed to get time series descriptions: {status}")
                 return []
 
-            all_series = response.json().get("TimeSeriesDescriptions", [])
             ecosense_series = [
                 ts
                 for ts in all_series
@@ -292,6 +704,7 @@ class AquariusClient:
                     parameter_unit=unit,
                     timeseries_identifier=ts_identifier,
                     unique_id=unique_id,
+                    corrected_version=ts.get("LastModified", ""),
                 )
                 sensors.append(sensor)
 
@@ -325,43 +738,61 @@ class AquariusClient:
                 "QueryTo": end_str,
             }
 
-            response = self.session.get(
-                f"{self.base_url}/GetTimeSeriesCorrectedData", params=params, timeout=60
+            cache_key = ResponseCache.key(
+                "GetTimeSeriesCorrectedData",
+                sensor.unique_id,
+                start_str,
+                end_str,
+                sensor.corrected_version,
+            )
+            status, ts_data = self._cached_get(
+                "aquarius_data",
+                "GetTimeSeriesCorrectedData",
+                cache_key,
+                params=params,
+                timeout=60,
             )
 
-            if response.status_code != 200:
-                logger.warning(
-                    f"⚠️  Failed to get data for {sensor.timeseries_identifier}: {response.status_code}"
-                )
+            if status != 200:
+                if self.offline:
+                    self.offline_misses += 1
+                    logger.error(
+                        f"❌ Offline replay: no cached data for {sensor.timeseries_identifier} "
+                        f"({start_str} to {end_str})"
+                    )
+                else:
+                    logger.warning(
+                        f"⚠️  Failed to get data for {sensor.timeseries_identifier}: {status}"
+                    )
                 return []
 
-            ts_data = response.json()
             points = ts_data.get("Points", [])
 
             # Convert to standard format
             data_points = []
-            for point in points:
-                if (
-                    "Value" in point
-                    and "Numeric" in point["Value"]
-                    and point["Value"]["Numeric"] is not None
-                ):
-
-                    timestamp = datetime.fromisoformat(
-                        point["Timestamp"].replace("Z", "+00:00")
-                    )
-                    value = float(point["Value"]["Numeric"])
+            with profile_stage("parse"):
+                for point in points:
+                    if (
+                        "Value" in point
+                        and "Numeric" in point["Value"]
+                        and point["Value"]["Numeric"] is not None
+                    ):
 
-                    data_points.append(
-                        {
-                            "timeseries_id": sensor.timeseries_identifier,
-                            "timestamp": timestamp.isoformat(),
-                            "value": value,
-                            "parameter": sensor.parameter,
-                            "sensor_label": sensor.label,
-                            "location_identifier": sensor.location_identifier,
-                        }
-                    )
+                        timestamp = datetime.fromisoformat(
+                            point["Timestamp"].replace("Z", "+00:00")
+                        )
+                        value = float(point["Value"]["Numeric"])
+
+                        data_points.append(
+                            {
+                                "timeseries_id": sensor.timeseries_identifier,
+                                "timestamp": timestamp.isoformat(),
+                                "value": value,
+                                "parameter": sensor.parameter,
+                                "sensor_label": sensor.label,
+                                "location_identifier": sensor.location_identifier,
+                            }
+                        )
 
             return data_points
 
@@ -381,6 +812,7 @@ class LocalDatabaseSync:
         self.database = os.getenv("LOCAL_DB_NAME", "sensors")
         self.user = os.getenv("LOCAL_DB_USER", "postgres")
         self.password = os.getenv("LOCAL_DB_PASSWORD", "postgres")
+        self._fingerprint_table_ready = False
 
         logger.info(
             f"🗄️  Local database sync initialized: {self.host}:{self.port}/{self.database}"
@@ -407,8 +839,60 @@ class LocalDatabaseSync:
             logger.error(f"❌ Local database connection failed: {e}")
             return False
 
-    def bulk_insert_local(self, data_points: List[Dict[str, Any]]) -> bool:
-        """Insert data points into local database with high performance"""
+    def _ensure_fingerprint_table(self, cursor):
+        """Create the per-window fingerprint table on first use"""
+        if self._fingerprint_table_ready:
+            return
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ecosense.timeseries_window_fingerprints (
+                timeseries_id TEXT NOT NULL,
+                window_date DATE NOT NULL,
+                content_hash TEXT NOT NULL,
+                point_count INTEGER NOT NULL,
+                updated_at TIMESTAMPTZ DEFAULT NOW(),
+                PRIMARY KEY (timeseries_id, window_date)
+            )
+        """
+        )
+        self._fingerprint_table_ready = True
+
+    @staticmethod
+    def _group_by_window(
+        data_points: List[Dict[str, Any]],
+    ) -> Dict[Tuple[str, Any], List[Dict[str, Any]]]:
+        """Group points into (timeseries_id, UTC day) windows"""
+        windows: Dict[Tuple[str, Any], List[Dict[str, Any]]] = {}
+        for point in data_points:
+            day = (
+                datetime.fromisoformat(point["timestamp"])
+                .astimezone(timezone.utc)
+                .date()
+            )
+            windows.setdefault((point["timeseries_id"], day), []).append(point)
+        return windows
+
+    @staticmethod
+    def _window_hash(points: List[Dict[str, Any]]) -> str:
+        """Content hash of a window, independent of point order"""
+        digest = hashlib.sha256()
+        for timestamp, value in sorted((p["timestamp"], p["value"]) for p in points):
+            digest.update(f"{timestamp}={value!r};".encode("utf-8"))
+        return digest.hexdigest()
+
+    def bulk_insert_local(
+        self,
+        data_points: List[Dict[str, Any]],
+        complete_from: Optional[datetime] = None,
+    ) -> bool:
+        """Insert data points into local database with high performance
+
+        Points are grouped into (timeseries, day) windows and each window's content hash is
+        compared with the one stored by the previous run; unchanged windows are skipped
+        entirely. Rows in changed windows are only updated when their value differs.
+        Windows that start before complete_from are only partly covered by the query, so
+        they are written but never fingerprinted.
+        """
         if not data_points:
             return True
 
@@ -416,6 +900,41 @@ class LocalDatabaseSync:
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
+            self._ensure_fingerprint_table(cursor)
+
+            windows = self._group_by_window(data_points)
+            hashes = {key: self._window_hash(points) for key, points in windows.items()}
+
+            cursor.execute(
+                """
+                SELECT timeseries_id, window_date, content_hash
+                FROM ecosense.timeseries_window_fingerprints
+                WHERE (timeseries_id, window_date) IN (
+                    SELECT * FROM unnest(%s::text[], %s::date[])
+                )
+            """,
+                ([key[0] for key in hashes], [key[1] for key in hashes]),
+            )
+            stored = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+            complete_day = (
+                complete_from.astimezone(timezone.utc).date() if complete_from else None
+            )
+            changed = [key for key, digest in hashes.items() if stored.get(key) != digest]
+            fingerprints = [
+                (key[0], key[1], hashes[key], len(windows[key]))
+                for key in changed
+                if complete_day is None or key[1] > complete_day
+            ]
+
+            if not changed:
+                conn.commit()
+                cursor.close()
+                conn.close()
+                logger.info(
+                    f"⏭️  Local DB: all {len(windows)} windows unchanged, nothing written"
+                )
+                return True
 
             # Prepare data for bulk insertion
             data_tuples = [
@@ -427,10 +946,12 @@ class LocalDatabaseSync:
                     point["sensor_label"],
                     point["location_identifier"],
                 )
-                for point in data_points
+                for key in changed
+                for point in windows[key]
             ]
 
-            # Use execute_values for high performance bulk insert
+            # Use execute_values for high performance bulk insert; unchanged rows are left
+            # alone so re-fetched data does not produce dead tuples
             insert_query = """
                 INSERT INTO ecosense.timeseries_data 
                 (timeseries_id, timestamp, value, parameter, sensor_label, location_identifier)
@@ -439,17 +960,38 @@ class LocalDatabaseSync:
                 DO UPDATE SET 
                     value = EXCLUDED.value,
                     updated_at = NOW()
+                WHERE ecosense.timeseries_data.value IS DISTINCT FROM EXCLUDED.value
             """
 
-            psycopg2.extras.execute_values(
-                cursor, insert_query, data_tuples, page_size=5000
-            )
+            with profile_stage("execute_values"):
+                psycopg2.extras.execute_values(
+                    cursor, insert_query, data_tuples, page_size=5000
+                )
 
-            conn.commit()
+                if fingerprints:
+                    psycopg2.extras.execute_values(
+                        cursor,
+                        """
+                        INSERT INTO ecosense.timeseries_window_fingerprints
+                        (timeseries_id, window_date, content_hash, point_count)
+                        VALUES %s
+                        ON CONFLICT (timeseries_id, window_date) DO UPDATE SET
+                            content_hash = EXCLUDED.content_hash,
+                            point_count = EXCLUDED.point_count,
+                            updated_at = NOW()
+                    """,
+                        fingerprints,
+                    )
+
+            with profile_stage("commit"):
+                conn.commit()
             cursor.close()
             conn.close()
 
-            logger.info(f"✅ Local DB: {len(data_points)} points inserted/updated")
+            logger.info(
+                f"✅ Local DB: {len(data_tuples)} points in {len(changed)} changed windows "
+                f"written ({len(windows) - len(changed)} windows unchanged)"
+            )
             return True
 
         except Exception as e:
@@ -511,7 +1053,8 @@ class LocalDatabaseSync:
                     (effective_batch_size,),
                 )
 
-            rows = cursor.fetchall()
+            with profile_stage("db_read"):
+                rows = cursor.fetchall()
             cursor.close()
             conn.close()
 
@@ -589,19 +1132,20 @@ class ProductionClient:
         if not self.api_token:
             raise ValueError("PG_PROXY_TOKEN environment variable is required")
 
-        self.base_url = f"https://{self.remote_host}/api/db"
+        # REMOTE_DB_URL points the client at another proxy, e.g. the local benchmark fake
+        self.base_url = os.getenv("REMOTE_DB_URL") or f"https://{self.remote_host}/api/db"
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json",
         }
 
-        # Adaptive rate limiting parameters - optimized for large syncs
+        # Request pacing is handled by the shared "production_bulk_insert" bucket;
+        # the client only adapts the batch size and backs off on errors
+        self.bulk_bucket = RATE_LIMITS.bucket("production_bulk_insert")
         self.base_batch_size = 1000  # Increased from 500
         self.current_batch_size = self.base_batch_size
-        self.base_delay = 0.6  # Reduced from 1.0 seconds (just under 60/min limit)
-        self.current_delay = self.base_delay
+        self.error_delay = 1.0
         self.max_retries = 5
-        self.backoff_multiplier = 2.0
         self.success_count = 0
         self.failure_count = 0
 
@@ -610,8 +1154,13 @@ class ProductionClient:
     def test_connection(self) -> bool:
         """Test connection to production server"""
         try:
-            response = requests.get(
-                f"{self.base_url}/health", headers=self.headers, timeout=30
+            response = limited_request(
+                "production",
+                requests,
+                "GET",
+                f"{self.base_url}/health",
+                headers=self.headers,
+                timeout=30,
             )
             if response.status_code == 200:
                 logger.info("✅ Production server connection successful")
@@ -628,8 +1177,13 @@ class ProductionClient:
     def get_stats(self) -> Dict[str, Any]:
         """Get production database statistics"""
         try:
-            response = requests.get(
-                f"{self.base_url}/timeseries/stats", headers=self.headers, timeout=30
+            response = limited_request(
+                "production",
+                requests,
+                "GET",
+                f"{self.base_url}/timeseries/stats",
+                headers=self.headers,
+                timeout=30,
             )
             if response.status_code == 200:
                 return response.json()
@@ -638,15 +1192,14 @@ class ProductionClient:
             logger.error(f"Error getting production stats: {e}")
             return {}
 
-    def _adaptive_delay(self, success: bool, was_rate_limited: bool = False):
-        """Adjust delay and batch size based on success/failure patterns"""
+    def _adapt_batch_size(self, success: bool, was_rate_limited: bool = False):
+        """Adjust batch size based on success/failure patterns"""
         if success and not was_rate_limited:
             self.success_count += 1
             self.failure_count = 0
 
-            # Gradually reduce delay and increase batch size on success
+            # Gradually increase batch size on success
             if self.success_count >= 3:
-                self.current_delay = max(0.5, self.current_delay * 0.9)
                 self.current_batch_size = min(
                     5000, int(self.current_batch_size * 1.1)
                 )  # Increased max to 5000
@@ -656,30 +1209,32 @@ class ProductionClient:
             self.failure_count += 1
             self.success_count = 0
 
-            # Aggressive backoff on rate limiting
-            self.current_delay = min(60.0, self.current_delay * self.backoff_multiplier)
+            # Smaller batches while the proxy is throttling
             self.current_batch_size = max(
                 200, int(self.current_batch_size * 0.5)
             )  # Increased min to 200
 
             logger.warning(
-                f"⚠️  Rate limited! Adjusting: delay={self.current_delay:.1f}s, batch_size={self.current_batch_size}"
+                f"⚠️  Rate limited! Adjusting: batch_size={self.current_batch_size}"
             )
         else:
             self.failure_count += 1
             self.success_count = 0
 
-            # Moderate backoff on other errors
-            self.current_delay = min(30.0, self.current_delay * 1.5)
-
-        logger.debug(
-            f"Adaptive settings: delay={self.current_delay:.1f}s, batch_size={self.current_batch_size}"
-        )
+        logger.debug(f"Adaptive settings: batch_size={self.current_batch_size}")
 
     def bulk_insert(
-        self, data_points: List[Dict[str, Any]], batch_size: Optional[int] = None
+        self,
+        data_points: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        batch_id_fn: Optional[Callable[[List[Dict[str, Any]]], str]] = None,
+        on_batch_acked: Optional[Callable[[List[Dict[str, Any]], str], None]] = None,
     ) -> bool:
-        """Send data points to production server with adaptive rate limiting and exponential backoff"""
+        """Send data points to production server with adaptive rate limiting and exponential backoff
+
+        If batch_id_fn is given, each batch is sent with an Idempotency-Key header so the
+        proxy can drop replays, and on_batch_acked is called once the batch is acknowledged.
+        """
         if not data_points:
             return True
 
@@ -694,17 +1249,23 @@ class ProductionClient:
             for i in range(0, total_points, effective_batch_size):
                 batch = data_points[i : i + effective_batch_size]
                 batch_success = False
+                batch_id = batch_id_fn(batch) if batch_id_fn else None
+                headers = dict(self.headers)
+                if batch_id:
+                    headers["Idempotency-Key"] = batch_id
 
                 # Retry logic for each batch
                 for attempt in range(self.max_retries):
                     try:
                         payload = {"data_points": batch}
-                        response = requests.post(
-                            f"{self.base_url}/timeseries/bulk-insert",
-                            headers=self.headers,
-                            json=payload,
-                            timeout=120,
-                        )
+                        self.bulk_bucket.acquire()
+                        with profile_stage("http:production_bulk_insert"):
+                            response = requests.post(
+                                f"{self.base_url}/timeseries/bulk-insert",
+                                headers=headers,
+                                json=payload,
+                                timeout=120,
+                            )
 
                         if response.status_code == 200:
                             result = response.json()
@@ -714,32 +1275,30 @@ class ProductionClient:
                                 f"   📤 Batch {i//effective_batch_size + 1}: {batch_sent} points sent (attempt {attempt + 1})"
                             )
 
-                            # Adaptive delay adjustment
-                            self._adaptive_delay(success=True, was_rate_limited=False)
+                            self.bulk_bucket.on_success()
+                            self._adapt_batch_size(success=True)
                             batch_success = True
+                            if on_batch_acked:
+                                on_batch_acked(batch, batch_id)
                             break
 
                         elif response.status_code == 429:
-                            # Rate limit exceeded - exponential backoff
-                            retry_delay = self.current_delay * (
-                                self.backoff_multiplier**attempt
-                            )
+                            # The shared bucket slows down and waits out Retry-After
                             logger.warning(
-                                f"❌ Rate limit exceeded! Waiting {retry_delay:.1f}s before retry {attempt + 1}/{self.max_retries}"
+                                f"❌ Rate limit exceeded! Retry {attempt + 1}/{self.max_retries}"
                             )
-
-                            self._adaptive_delay(success=False, was_rate_limited=True)
-                            time.sleep(retry_delay)
+                            self.bulk_bucket.on_throttled(_retry_after(response))
+                            self._adapt_batch_size(success=False, was_rate_limited=True)
                             continue
 
                         else:
                             logger.error(
                                 f"❌ Batch failed: {response.status_code} - {response.text[:200]}"
                             )
-                            self._adaptive_delay(success=False, was_rate_limited=False)
+                            self._adapt_batch_size(success=False)
 
                             if attempt < self.max_retries - 1:
-                                time.sleep(self.current_delay * (1.5**attempt))
+                                time.sleep(self.error_delay * (1.5**attempt))
                                 continue
                             else:
                                 return False
@@ -747,7 +1306,7 @@ class ProductionClient:
                     except requests.exceptions.Timeout:
                         logger.warning(f"⏰ Request timeout on attempt {attempt + 1}")
                         if attempt < self.max_retries - 1:
-                            time.sleep(self.current_delay * (1.5**attempt))
+                            time.sleep(self.error_delay * (1.5**attempt))
                             continue
                         else:
                             logger.error("❌ Max timeout retries exceeded")
@@ -758,7 +1317,7 @@ class ProductionClient:
                             f"❌ Unexpected error on attempt {attempt + 1}: {e}"
                         )
                         if attempt < self.max_retries - 1:
-                            time.sleep(self.current_delay)
+                            time.sleep(self.error_delay)
                             continue
                         else:
                             return False
@@ -769,10 +1328,6 @@ class ProductionClient:
                     )
                     return False
 
-                # Adaptive delay between successful batches
-                if i + effective_batch_size < total_points:
-                    time.sleep(self.current_delay)
-
             logger.info(f"✅ Successfully sent {total_sent} data points to production")
             return True
 
@@ -781,17 +1336,72 @@ class ProductionClient:
             return False
 
 
+class CheckpointStore:
+    """Durable JSON checkpoints so long production pushes can resume after a restart"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Could not read checkpoint file {self.path}: {e}")
+            return {}
+
+    def _write_all(self, checkpoints: Dict[str, Any]):
+        # Write to a temp file and rename so a crash never leaves a torn checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoints, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self, job_name: str) -> Optional[Dict[str, Any]]:
+        """Return the saved state for a job, or None if there is none"""
+        return self._read_all().get(job_name)
+
+    def save(self, job_name: str, state: Dict[str, Any]):
+        """Persist the state for a job"""
+        checkpoints = self._read_all()
+        checkpoints[job_name] = {**state, "updated_at": datetime.now().isoformat()}
+        self._write_all(checkpoints)
+
+    def clear(self, job_name: str):
+        """Remove the saved state for a job"""
+        checkpoints = self._read_all()
+        if checkpoints.pop(job_name, None) is not None:
+            self._write_all(checkpoints)
+
+
 class EcosenseSync:
     """Main sync orchestrator with two-stage architecture"""
 
-    def __init__(self):
+    ALL_DATA_JOB = "production_all_data"
+
+    def __init__(self, use_cache: bool = False, offline: bool = False):
+        cache = None
+        if use_cache or offline:
+            cache = ResponseCache(
+                os.getenv("AQUARIUS_CACHE_DIR", ".aquarius_cache"),
+                int(os.getenv("AQUARIUS_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+            )
         self.aquarius = AquariusClient(
             hostname=os.getenv("AQUARIUS_HOSTNAME", ""),
             username=os.getenv("AQUARIUS_USERNAME", ""),
             password=os.getenv("AQUARIUS_PASSWORD", ""),
+            cache=cache,
+            offline=offline,
         )
         self.local_db = LocalDatabaseSync()
         self.production = ProductionClient()
+        self.checkpoints = CheckpointStore(
+            os.getenv("SYNC_CHECKPOINT_FILE", "ecosense_sync_checkpoint.json")
+        )
 
     def test_connections(self) -> bool:
         """Test all required connections"""
@@ -817,6 +1427,7 @@ class EcosenseSync:
 
         return all_good
 
+    @profile_stage("stage1")
     def sync_aquarius_to_local(
         self,
         days_back: int = 7,
@@ -867,6 +1478,25 @@ class EcosenseSync:
 
             # Calculate time window
             end_time = datetime.now()
+            if self.aquarius.offline:
+                # Replay the window of the last caching run; any other window misses
+                window = self.aquarius.cache.get_meta(LAST_WINDOW_KEY)
+                if not window:
+                    logger.error("❌ Offline replay: the cache holds no caching run to replay")
+                    return False
+                end_time = datetime.fromisoformat(window["end"])
+                if window["days_back"] != days_back:
+                    logger.info(
+                        f"📼 Replaying the cached {window['days_back']}-day window "
+                        f"instead of {days_back} days"
+                    )
+                days_back = window["days_back"]
+            elif self.aquarius.cache:
+                # Whole hours give re-runs the same QueryFrom/QueryTo, so they hit the cache
+                end_time = end_time.replace(minute=0, second=0, microsecond=0)
+                self.aquarius.cache.set_meta(
+                    LAST_WINDOW_KEY, {"end": end_time.isoformat(), "days_back": days_back}
+                )
             start_sync_time = end_time - timedelta(days=days_back)
 
             logger.info(f"📅 Syncing data from {start_sync_time} to {end_time}")
@@ -894,18 +1524,17 @@ class EcosenseSync:
                         continue
 
                     # Send to local database (much faster, no rate limits)
-                    if self.local_db.bulk_insert_local(data_points):
+                    if self.local_db.bulk_insert_local(
+                        data_points, complete_from=start_sync_time
+                    ):
                         success_count += 1
                         total_points += len(data_points)
-                        logger.info(f"   ✅ {len(data_points)} points stored locally")
+                        logger.info(f"   ✅ {len(data_points)} points checked locally")
                     else:
                         logger.warning(
                             f"   ❌ Failed to store {len(data_points)} points locally"
                         )
 
-                    # Small delay to be nice to Aquarius
-                    time.sleep(0.5)
-
                 except Exception as e:
                     logger.error(f"   ❌ Error syncing sensor: {e}")
 
@@ -916,17 +1545,30 @@ class EcosenseSync:
             logger.info(f"✅ Successful sensors: {success_count}/{len(sensors)}")
             logger.info(f"📊 Total data points: {total_points:,}")
             logger.info(f"⏱️  Duration: {duration}")
+            if self.aquarius.cache:
+                logger.info(
+                    f"📼 Response cache: {self.aquarius.cache.hits} hits, "
+                    f"{self.aquarius.cache.misses} misses"
+                )
+            if self.aquarius.offline_misses:
+                logger.error(
+                    f"❌ Offline replay incomplete: {self.aquarius.offline_misses} sensors "
+                    "were not in the cache"
+                )
+                return False
 
             return success_count > 0
 
         finally:
             self.aquarius.disconnect()
 
+    @profile_stage("stage2")
     def sync_local_to_production(
         self,
         batch_size: int = 1000,
         dry_run: bool = False,
         days_back: Optional[int] = None,
+        reset_checkpoint: bool = False,
     ) -> bool:
         """Stage 2: Sync data from local database to production with pagination for large datasets"""
 
@@ -946,7 +1588,9 @@ class EcosenseSync:
 
             if days_back is None:
                 # For ALL data mode, implement pagination to handle large datasets
-                return self._sync_all_data_paginated(batch_size, dry_run)
+                return self._sync_all_data_paginated(
+                    batch_size, dry_run, reset_checkpoint=reset_checkpoint
+                )
             else:
                 # For recent data, use the original approach
                 data_points = self.local_db.get_unsent_data(
@@ -985,15 +1629,60 @@ class EcosenseSync:
             logger.error(f"❌ Error in stage 2 sync: {e}")
             return False
 
-    def _sync_all_data_paginated(self, batch_size: int, dry_run: bool) -> bool:
-        """Handle syncing ALL historical data using pagination to prevent memory issues"""
+    @staticmethod
+    def _batch_id(job_id: str, batch: List[Dict[str, Any]]) -> str:
+        """Deterministic idempotency key for a batch: job plus its key range and size"""
+        first, last = batch[0], batch[-1]
+        raw = (
+            f"{job_id}|{first['timeseries_id']}|{first['timestamp']}|"
+            f"{last['timeseries_id']}|{last['timestamp']}|{len(batch)}"
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _sync_all_data_paginated(
+        self, batch_size: int, dry_run: bool, reset_checkpoint: bool = False
+    ) -> bool:
+        """Handle syncing ALL historical data using keyset pagination with durable checkpoints
+
+        Rows are walked in (timeseries_id, timestamp) order, which matches the table's unique
+        key. After every acknowledged batch the last sent key is checkpointed, so a restart
+        resumes right after it instead of starting again at the beginning.
+        """
         start_time = datetime.now()
         total_synced = 0
         page_size = 25000  # Process 25k records at a time
-        offset = 0
         page_num = 1
 
-        logger.info(f"📄 Using pagination: {page_size:,} records per page")
+        if reset_checkpoint:
+            self.checkpoints.clear(self.ALL_DATA_JOB)
+
+        state = None if dry_run else self.checkpoints.load(self.ALL_DATA_JOB)
+        if state:
+            logger.info(
+                f"♻️  Resuming job {state['job_id']} after key "
+                f"{state['last_key']} ({state['points_sent']:,} points already sent)"
+            )
+        else:
+            state = {
+                "job_id": uuid.uuid4().hex,
+                "started_at": start_time.isoformat(),
+                "last_key": None,
+                "last_batch_id": None,
+                "batches_acked": 0,
+                "points_sent": 0,
+            }
+
+        job_id = state["job_id"]
+
+        def on_batch_acked(batch: List[Dict[str, Any]], batch_id: str):
+            last = batch[-1]
+            state["last_key"] = [last["timeseries_id"], last["timestamp"]]
+            state["last_batch_id"] = batch_id
+            state["batches_acked"] += 1
+            state["points_sent"] += len(batch)
+            self.checkpoints.save(self.ALL_DATA_JOB, state)
+
+        logger.info(f"📄 Using keyset pagination: {page_size:,} records per page")
 
         try:
             while True:
@@ -1001,11 +1690,20 @@ class EcosenseSync:
                 conn = self.local_db.get_connection()
                 cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-                # Get count on first iteration
-                if offset == 0:
-                    cursor.execute(
-                        "SELECT COUNT(*) as total FROM ecosense.timeseries_data"
-                    )
+                # Get count on first iteration (only what is left after a resume)
+                if page_num == 1:
+                    if state["last_key"]:
+                        cursor.execute(
+                            """
+                            SELECT COUNT(*) as total FROM ecosense.timeseries_data
+                            WHERE (timeseries_id, timestamp) > (%s, %s::timestamptz)
+                        """,
+                            tuple(state["last_key"]),
+                        )
+                    else:
+                        cursor.execute(
+                            "SELECT COUNT(*) as total FROM ecosense.timeseries_data"
+                        )
                     count_result = cursor.fetchone()
                     total_count = count_result["total"] if count_result else 0
                     logger.info(f"📊 Total records to sync: {total_count:,}")
@@ -1018,16 +1716,28 @@ class EcosenseSync:
                         )
                         return True
 
-                # Get the current page
-                cursor.execute(
-                    """
-                    SELECT timeseries_id, timestamp, value, parameter, sensor_label, location_identifier
-                    FROM ecosense.timeseries_data
-                    ORDER BY timestamp DESC
-                    LIMIT %s OFFSET %s
-                """,
-                    (page_size, offset),
-                )
+                # Get the current page, starting right after the last acknowledged key
+                if state["last_key"]:
+                    cursor.execute(
+                        """
+                        SELECT timeseries_id, timestamp, value, parameter, sensor_label, location_identifier
+                        FROM ecosense.timeseries_data
+                        WHERE (timeseries_id, timestamp) > (%s, %s::timestamptz)
+                        ORDER BY timeseries_id, timestamp
+                        LIMIT %s
+                    """,
+                        (*state["last_key"], page_size),
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        SELECT timeseries_id, timestamp, value, parameter, sensor_label, location_identifier
+                        FROM ecosense.timeseries_data
+                        ORDER BY timeseries_id, timestamp
+                        LIMIT %s
+                    """,
+                        (page_size,),
+                    )
 
                 rows = cursor.fetchall()
                 cursor.close()
@@ -1038,7 +1748,7 @@ class EcosenseSync:
                     break
 
                 logger.info(
-                    f"📄 Page {page_num}: Processing {len(rows):,} records (offset {offset:,})"
+                    f"📄 Page {page_num}: Processing {len(rows):,} records (after key {state['last_key']})"
                 )
 
                 # Convert to the expected format
@@ -1055,28 +1765,36 @@ class EcosenseSync:
                         }
                     )
 
-                # Send this page to production
-                if self.production.bulk_insert(data_points, batch_size=batch_size):
+                # Send this page to production; progress is checkpointed per batch
+                if self.production.bulk_insert(
+                    data_points,
+                    batch_size=batch_size,
+                    batch_id_fn=lambda batch: self._batch_id(job_id, batch),
+                    on_batch_acked=on_batch_acked,
+                ):
                     total_synced += len(data_points)
                     logger.info(
                         f"   ✅ Page {page_num} sent successfully. Total synced: {total_synced:,}"
                     )
                 else:
-                    logger.error(f"   ❌ Failed to send page {page_num}")
+                    logger.error(
+                        f"   ❌ Failed to send page {page_num}. "
+                        f"Progress is checkpointed; re-run to resume after key {state['last_key']}"
+                    )
                     return False
 
-                # Prepare for next page
-                offset += page_size
                 page_num += 1
 
-                # Small delay between pages to be respectful
-                time.sleep(1)
+            self.checkpoints.clear(self.ALL_DATA_JOB)
 
             # Final summary
             duration = datetime.now() - start_time
             logger.info("")
             logger.info("🎉 STAGE 2 COMPLETED!")
             logger.info(f"✅ Successfully sent {total_synced:,} points to production")
+            logger.info(
+                f"📦 Job {job_id}: {state['points_sent']:,} points in {state['batches_acked']} batches overall"
+            )
             logger.info(
                 f"📄 Processed {page_num - 1} pages of {page_size:,} records each"
             )
@@ -1130,6 +1848,7 @@ Examples:
   # Stage-specific operations
   python ecosense_sync.py --local-only        # Stage 1: Aquarius → Local DB only
   python ecosense_sync.py --production-only   # Stage 2: Local DB → Production only
+  python ecosense_sync.py --production-only --all-data  # Full push, resumes from checkpoint
   
   # Testing and configuration
   python ecosense_sync.py --test              # Test all connections
@@ -1140,6 +1859,7 @@ Examples:
   # Advanced options
   python ecosense_sync.py --batch-size 250    # Smaller batches for rate limiting
   python ecosense_sync.py --sensors sensor1 sensor2  # Specific sensors only
+  python ecosense_sync.py --local-only --profile profiles/  # Profile stage 1
         """,
     )
 
@@ -1186,11 +1906,39 @@ Examples:
         action="store_true",
         help="Sync ALL historical data (for --production-only mode)",
     )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache Aquarius responses on disk (AQUARIUS_CACHE_DIR) and reuse them",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Replay Aquarius responses from the cache without contacting Aquarius",
+    )
+    parser.add_argument(
+        "--reset-checkpoint",
+        action="store_true",
+        help="Discard the saved --all-data checkpoint and start from the beginning",
+    )
+
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profiles",
+        metavar="DIR",
+        help="Profile the run: per-stage wall/CPU time and flamegraph stacks "
+        "written to DIR (default: profiles)",
+    )
 
     args = parser.parse_args()
 
     # Validate required environment variables
-    required_vars = ["AQUARIUS_HOSTNAME", "AQUARIUS_USERNAME", "AQUARIUS_PASSWORD"]
+    required_vars = []
+    if not args.offline:
+        required_vars.extend(
+            ["AQUARIUS_HOSTNAME", "AQUARIUS_USERNAME", "AQUARIUS_PASSWORD"]
+        )
 
     # Production variables only needed for production sync
     if not args.local_only and not args.stats:
@@ -1206,7 +1954,7 @@ Examples:
         sys.exit(1)
 
     # Create sync instance
-    sync = EcosenseSync()
+    sync = EcosenseSync(use_cache=args.cache, offline=args.offline)
 
     # Handle test mode
     if args.test:
@@ -1254,6 +2002,11 @@ Examples:
 
         sys.exit(0)
 
+    global PROFILER
+    if args.profile:
+        PROFILER = Profiler(args.profile)
+        PROFILER.start()
+
     # Handle different sync modes
     success = False
 
@@ -1272,7 +2025,10 @@ Examples:
             None if args.all_data else 7
         )  # Default to recent data unless --all-data specified
         success = sync.sync_local_to_production(
-            batch_size=args.batch_size, dry_run=args.dry_run, days_back=days_back
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            days_back=days_back,
+            reset_checkpoint=args.reset_checkpoint,
         )
 
     else:
@@ -1284,6 +2040,11 @@ Examples:
             specific_sensors=args.sensors,
         )
 
+    logger.info("⏳ Rate limit waits:")
+    RATE_LIMITS.log_summary()
+    if PROFILER:
+        PROFILER.stop()
+
     sys.exit(0 if success else 1)
 
 
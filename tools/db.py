@@ -0,0 +1,115 @@
+"""
+Shared database helpers for the command-line tools
+
+Connections use the same DB_* variables as the ecosense-sync service, so the tools
+work against the docker compose database without extra configuration.
+"""
+
+import io
+import os
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Sequence
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def connect(dsn: Optional[str] = None):
+    """Open a connection from DATABASE_URL-style dsn or the DB_* environment variables"""
+    if dsn:
+        return psycopg2.connect(dsn)
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        database=os.getenv("DB_NAME", "postgres"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres"),
+    )
+
+
+def copy_value(value) -> str:
+    """Format one value for COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    if any(c in text for c in "\\\t\n\r"):
+        text = (
+            text.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return text
+
+
+def copy_line(values: Sequence) -> str:
+    return "\t".join(copy_value(v) for v in values) + "\n"
+
+
+class LineStream(io.RawIOBase):
+    """File-like view over an iterator of COPY text lines, read lazily by copy_expert
+
+    Lines are encoded in groups of LINES_PER_CHUNK and appended to one bytearray
+    that is read from an offset and compacted once half of it has been consumed,
+    so streaming stays linear in the bytes copied.
+    """
+
+    LINES_PER_CHUNK = 4096
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines: Iterator[str] = iter(lines)
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while len(self._buffer) - self._offset < len(target):
+            chunk = "".join(islice(self._lines, self.LINES_PER_CHUNK))
+            if not chunk:
+                break
+            self._buffer += chunk.encode("utf-8")
+        size = min(len(target), len(self._buffer) - self._offset)
+        with memoryview(self._buffer) as view:
+            target[:size] = view[self._offset: self._offset + size]
+        self._offset += size
+        if self._offset * 2 >= len(self._buffer):
+            del self._buffer[: self._offset]
+            self._offset = 0
+        return size
+
+
+def copy_lines(cur, table: str, columns: Sequence[str], lines: Iterable[str]):
+    """Stream pre-formatted COPY text lines into table(columns)"""
+    stream = io.BufferedReader(LineStream(lines), buffer_size=1 << 20)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)",
+        stream,
+        size=1 << 20,
+    )
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+    """Stream row tuples into table(columns) with COPY"""
+    copy_lines(cur, table, columns, (copy_line(row) for row in rows))
+
+
+def reserve_ids(cur, table: str, column: str, count: int) -> int:
+    """Reserve a contiguous block of serial IDs; returns the first one
+
+    Takes a lock that blocks concurrent inserts into the table until the caller
+    commits, so the block cannot interleave with IDs handed out elsewhere.
+    """
+    cur.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+    sequence = cur.fetchone()[0]
+    cur.execute("SELECT nextval(%s)", (sequence,))
+    first = cur.fetchone()[0]
+    if count > 1:
+        cur.execute("SELECT setval(%s, %s)", (sequence, first + count - 1))
+    return first
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Stem detection and DBH estimation from tiled point clouds
+
+Works on the LAZ tiles of a point cloud variant (see tile_pointclouds.py) and
+writes the detected stems as new trees.Trees / trees.Stems variants:
+
+  1. Ground: lowest point per 1 m cell, per tile in parallel, merged globally
+  2. Breast-height band: points between 1.2 and 1.4 m above ground, per tile
+  3. Stems: band points are binned on a 10 cm grid and connected cells form
+     one candidate stem (labelled with vectorized label propagation)
+  4. DBH: a circle is fitted to every candidate (algebraic least squares fit,
+     re-fitted twice without outliers). All candidates of a batch are fitted at
+     once with NumPy, and batches run in a process pool
+  5. Candidates with a plausible diameter, a small fit error and enough of the
+     circumference covered by points are kept
+
+Stems within --match-distance of a measured tree become a new variant of that
+tree (ParentVariantID, species copied; several stems make a multi-stem tree).
+The others become new trees. Every tree gets VariantTypeID 'processed',
+PointCloudVariantID, the ProcessID of LiDAR_DBH_Extraction, and links to the
+parameters of the run in shared.ProcessParameters_Trees. Running the extraction
+again for the same cloud replaces the trees it created before.
+
+Usage:
+  python tools/extract_stems.py 12
+  python tools/extract_stems.py 12 --workers 16 --match-distance 1.0
+  python tools/extract_stems.py 12 --dry-run
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from db import connect, copy_rows, reserve_ids
+from scan_pointclouds import LocalStore, scan
+from storage import DEFAULT_ENDPOINT, s3_client, split_uri
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+PROCESS_NAME = "LiDAR_DBH_Extraction"
+PROCESS_VERSION = "1.0.0"
+CREATED_BY = "extract_stems"
+DEFAULT_SRID = 32632
+
+GROUND_CELL_M = 1.0
+CLUSTER_CELL_M = 0.1
+# Angular sectors used to measure how much of a stem's circumference was scanned
+SECTORS = 36
+FIT_ITERATIONS = 3
+
+
+class Parameters(NamedTuple):
+    breast_height_m: float
+    band_width_m: float
+    min_points: int
+    min_dbh_cm: float
+    max_dbh_cm: float
+    max_rmse_ratio: float
+    min_coverage_deg: float
+
+
+class Stems(NamedTuple):
+    x: np.ndarray
+    y: np.ndarray
+    dbh_cm: np.ndarray
+    rmse_cm: np.ndarray
+    coverage_deg: np.ndarray
+    points: np.ndarray
+
+
+# --- Grid helpers ----------------------------------------------------------
+
+
+def cell_keys(x: np.ndarray, y: np.ndarray, size: float) -> np.ndarray:
+    """One int64 per grid cell; the offset keeps negative coordinates apart"""
+    ix = np.floor(x / size).astype(np.int64) + (1 << 31)
+    iy = np.floor(y / size).astype(np.int64) + (1 << 31)
+    return ix << 32 | iy
+
+
+def read_xyz(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    import laspy
+
+    las = laspy.read(path)
+    return np.asarray(las.x), np.asarray(las.y), np.asarray(las.z)
+
+
+# --- Pool workers ----------------------------------------------------------
+
+# Set in every worker by init_worker, so the ground grid is sent once per process
+_ground_keys: Optional[np.ndarray] = None
+_ground_z: Optional[np.ndarray] = None
+_params: Optional[Parameters] = None
+
+
+def init_worker(ground_keys: np.ndarray, ground_z: np.ndarray, params: Parameters):
+    global _ground_keys, _ground_z, _params
+    _ground_keys, _ground_z, _params = ground_keys, ground_z, params
+
+
+def tile_ground(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Lowest elevation per ground cell of one tile"""
+    x, y, z = read_xyz(path)
+    if len(x) == 0:
+        return np.empty(0, np.int64), np.empty(0)
+    keys = cell_keys(x, y, GROUND_CELL_M)
+    order = np.argsort(keys, kind="stable")
+    keys, z = keys[order], z[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.minimum.reduceat(z, starts)
+
+
+def tile_band(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """x, y of the points of one tile inside the breast-height band"""
+    x, y, z = read_xyz(path)
+    keys = cell_keys(x, y, GROUND_CELL_M)
+    index = np.clip(np.searchsorted(_ground_keys, keys), 0, len(_ground_keys) - 1)
+    height = z - np.where(_ground_keys[index] == keys, _ground_z[index], np.inf)
+    half = _params.band_width_m / 2
+    keep = np.abs(height - _params.breast_height_m) <= half
+    return x[keep], y[keep]
+
+
+def fit_circles(batch: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Stems:
+    """Fit one circle per cluster; clusters are numbered 0..k-1 within the batch
+
+    Kasa fit: minimising sum((u^2 + v^2 + a*u + b*v + c)^2) is linear in a, b
+    and c, so the normal equations of all clusters are accumulated with
+    bincount and solved together. Coordinates are centred per cluster first.
+    """
+    x, y, cluster = batch
+    k = int(cluster.max()) + 1
+    n = np.bincount(cluster, minlength=k).astype(float)
+    mean_x = np.bincount(cluster, x, k) / n
+    mean_y = np.bincount(cluster, y, k) / n
+    u, v = x - mean_x[cluster], y - mean_y[cluster]
+    w = np.ones_like(u)
+
+    for _ in range(FIT_ITERATIONS):
+        def s(values):
+            return np.bincount(cluster, values * w, k)
+
+        zz = u * u + v * v
+        m = np.empty((k, 3, 3))
+        m[:, 0, 0], m[:, 0, 1], m[:, 0, 2] = s(u * u), s(u * v), s(u)
+        m[:, 1, 1], m[:, 1, 2], m[:, 2, 2] = s(v * v), s(v), s(np.ones_like(u))
+        m[:, 1, 0], m[:, 2, 0], m[:, 2, 1] = m[:, 0, 1], m[:, 0, 2], m[:, 1, 2]
+        rhs = -np.stack([s(zz * u), s(zz * v), s(zz)], axis=1)
+        # pinv tolerates degenerate clusters (all points on a line); they fail the checks below
+        a, b, c = (np.linalg.pinv(m) @ rhs[:, :, None])[:, :, 0].T
+        cx, cy = -a / 2, -b / 2
+        radius = np.sqrt(np.maximum(cx * cx + cy * cy - c, 0))
+
+        residual = np.hypot(u - cx[cluster], v - cy[cluster]) - radius[cluster]
+        used = np.maximum(s(np.ones_like(u)), 1)
+        rmse = np.sqrt(s(residual * residual) / used)
+        # Branches, leaves and neighbouring stems fall well off the circle
+        w = (np.abs(residual) <= np.maximum(2.5 * rmse[cluster], 0.01)).astype(float)
+
+    angle = np.arctan2(v - cy[cluster], u - cx[cluster])
+    sector = np.minimum(((angle + np.pi) / (2 * np.pi) * SECTORS).astype(np.int64), SECTORS - 1)
+    occupied = np.unique((cluster * SECTORS + sector)[w > 0])
+    coverage = np.bincount(occupied // SECTORS, minlength=k) * (360.0 / SECTORS)
+
+    return Stems(
+        mean_x + cx, mean_y + cy, radius * 200, rmse * 100, coverage, np.bincount(cluster, w, k)
+    )
+
+
+# --- Clustering ------------------------------------------------------------
+
+
+def label_clusters(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Connected component of every point on an 8-connected CLUSTER_CELL_M grid"""
+    keys = cell_keys(x, y, CLUSTER_CELL_M)
+    cells, point_cell = np.unique(keys, return_inverse=True)
+
+    src, dst = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx == dy == 0:
+                continue
+            neighbour = cells + (dx << 32) + dy
+            index = np.clip(np.searchsorted(cells, neighbour), 0, len(cells) - 1)
+            found = cells[index] == neighbour
+            src.append(np.flatnonzero(found))
+            dst.append(index[found])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+
+    # Every cell takes the smallest label among its neighbours; pointer jumping speeds it up
+    labels = np.arange(len(cells))
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, src, labels[dst])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels[point_cell]
+
+
+def candidate_batches(
+    x: np.ndarray, y: np.ndarray, labels: np.ndarray, params: Parameters, batches: int
+) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Group band points by candidate stem and split them into batches of whole clusters"""
+    if len(x) == 0:
+        return []
+    _, cluster, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    # Too few points or wider than the largest stem: understory, branches, noise
+    max_extent = params.max_dbh_cm / 100 * 1.5
+    order = np.argsort(cluster, kind="stable")
+    x, y, cluster = x[order], y[order], cluster[order]
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    extent = np.maximum(
+        np.maximum.reduceat(x, starts) - np.minimum.reduceat(x, starts),
+        np.maximum.reduceat(y, starts) - np.minimum.reduceat(y, starts),
+    )
+    keep = (counts >= params.min_points) & (extent <= max_extent)
+    mask = keep[cluster]
+    x, y, cluster = x[mask], y[mask], np.cumsum(keep)[cluster[mask]] - 1
+    total = int(keep.sum())
+    if total == 0:
+        return []
+
+    bounds = np.linspace(0, total, min(batches, total) + 1).astype(np.int64)
+    starts = np.searchsorted(cluster, bounds)
+    return [
+        (x[a:b], y[a:b], cluster[a:b] - lo)
+        for lo, a, b in zip(bounds[:-1], starts[:-1], starts[1:])
+        if b > a
+    ]
+
+
+def accept(stems: Stems, params: Parameters) -> Stems:
+    dbh = stems.dbh_cm
+    keep = (
+        (dbh >= params.min_dbh_cm)
+        & (dbh <= params.max_dbh_cm)
+        & (stems.rmse_cm <= params.max_rmse_ratio * dbh / 2)
+        & (stems.coverage_deg >= params.min_coverage_deg)
+        & (stems.points >= params.min_points)
+    )
+    return Stems(*(field[keep] for field in stems))
+
+
+# --- Database --------------------------------------------------------------
+
+
+def process_id(cur) -> int:
+    cur.execute(
+        """
+        INSERT INTO shared.Processes (ProcessName, AlgorithmName, Version, Description, Category)
+        VALUES (%s, 'BreastHeightCircleFit', %s,
+                'Stem detection and DBH from a 1.3 m point cloud slice with trimmed least-squares circle fits',
+                'detection')
+        ON CONFLICT (ProcessName, Version) DO UPDATE SET ProcessName = EXCLUDED.ProcessName
+        RETURNING ProcessID
+    """,
+        (PROCESS_NAME, PROCESS_VERSION),
+    )
+    return cur.fetchone()[0]
+
+
+def parameter_ids(cur, params: Parameters) -> List[int]:
+    """Parameter rows for this run, reusing the rows of earlier runs with the same values"""
+    ids = []
+    description = f"{PROCESS_NAME} {PROCESS_VERSION}"
+    for name, value in params._asdict().items():
+        cur.execute(
+            """
+            SELECT ParameterID FROM shared.ProcessParameters
+            WHERE ParameterName = %s AND ParameterValue = %s AND Description = %s
+            ORDER BY ParameterID
+            LIMIT 1
+        """,
+            (name, str(value), description),
+        )
+        row = cur.fetchone()
+        if row is None:
+            cur.execute(
+                """
+                INSERT INTO shared.ProcessParameters (ParameterName, ParameterValue, DataType, Description)
+                VALUES (%s, %s, %s, %s)
+                RETURNING ParameterID
+            """,
+                (name, str(value), "int" if isinstance(value, int) else "float", description),
+            )
+            row = cur.fetchone()
+        ids.append(row[0])
+    return ids
+
+
+def write_stems(
+    cur, variant_id: int, location_id: int, srid: int, stems: Stems, params: Parameters, match_m: float
+) -> Tuple[int, int]:
+    """Replace this process's trees for the cloud with the detected stems; returns (trees, stems)"""
+    pid = process_id(cur)
+    cur.execute(
+        "DELETE FROM trees.Trees WHERE PointCloudVariantID = %s AND ProcessID = %s",
+        (variant_id, pid),
+    )
+
+    cur.execute(
+        """
+        CREATE TEMP TABLE found_stems (
+            StemIndex INTEGER PRIMARY KEY, X DOUBLE PRECISION, Y DOUBLE PRECISION
+        ) ON COMMIT DROP
+    """
+    )
+    copy_rows(cur, "found_stems", ["StemIndex", "X", "Y"], zip(range(len(stems.x)), stems.x, stems.y))
+    # Nearest measured tree of the plot within match_m, found with the same KNN pattern as sensor linking
+    cur.execute(
+        """
+        WITH found AS (
+            SELECT StemIndex, ST_Transform(ST_SetSRID(ST_MakePoint(X, Y), %(srid)s), 4326) AS Position
+            FROM found_stems
+        )
+        SELECT f.StemIndex, ST_X(f.Position), ST_Y(f.Position), parent.VariantID, parent.SpeciesID
+        FROM found f
+        LEFT JOIN LATERAL (
+            SELECT t.VariantID, t.SpeciesID
+            FROM trees.Trees t
+            WHERE t.Position && shared.metre_bbox(f.Position, %(match)s)
+              AND ST_DWithin(t.Position::geography, f.Position::geography, %(match)s)
+              AND t.LocationID = %(location)s
+              AND t.ParentVariantID IS NULL
+              AND t.ScenarioID IS NULL
+            ORDER BY t.Position <-> f.Position
+            LIMIT 1
+        ) parent ON TRUE
+        ORDER BY f.StemIndex
+    """,
+        {"srid": srid, "match": match_m, "location": location_id},
+    )
+    matches = cur.fetchall()
+
+    # One tree per matched parent (its stems ordered by DBH), one per unmatched stem
+    groups: Dict[object, List[int]] = {}
+    for index, _, _, parent, _ in matches:
+        groups.setdefault(parent if parent is not None else ("new", index), []).append(index)
+    for members in groups.values():
+        members.sort(key=lambda i: -stems.dbh_cm[i])
+
+    cur.execute("SELECT VariantTypeID FROM shared.VariantTypes WHERE VariantTypeName = 'processed'")
+    variant_type_id = cur.fetchone()[0]
+    first_id = reserve_ids(cur, "trees.Trees", "VariantID", len(groups))
+    by_index = {row[0]: row for row in matches}
+    trees, stem_rows = [], []
+    for offset, (key, members) in enumerate(groups.items()):
+        tree_id = first_id + offset
+        _, lon, lat, parent, species = by_index[members[0]]
+        trees.append((
+            tree_id, parent, variant_id, location_id, variant_type_id, pid, species,
+            f"SRID=4326;POINT({lon} {lat})", CREATED_BY,
+        ))
+        for number, i in enumerate(members, start=1):
+            stem_rows.append((tree_id, number, f"{stems.dbh_cm[i]:.2f}"))
+
+    copy_rows(
+        cur,
+        "trees.Trees",
+        ["VariantID", "ParentVariantID", "PointCloudVariantID", "LocationID", "VariantTypeID",
+         "ProcessID", "SpeciesID", "Position", "CreatedBy"],
+        trees,
+    )
+    copy_rows(cur, "trees.Stems", ["TreeVariantID", "StemNumber", "DBH_cm"], stem_rows)
+    parameters = parameter_ids(cur, params)
+    copy_rows(
+        cur,
+        "shared.ProcessParameters_Trees",
+        ["ParameterID", "VariantID"],
+        ((p, tree[0]) for tree in trees for p in parameters),
+    )
+    return len(trees), len(stem_rows)
+
+
+# --- Driver ----------------------------------------------------------------
+
+
+def extract(conn, client, variant_id: int, params: Parameters, args) -> Tuple[int, int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT LocationID FROM pointclouds.PointClouds WHERE VariantID = %s", (variant_id,)
+        )
+        row = cur.fetchone()
+        cur.execute(
+            "SELECT FilePath, MinZ FROM pointclouds.PointCloudTiles WHERE VariantID = %s ORDER BY TileID",
+            (variant_id,),
+        )
+        tiles = cur.fetchall()
+    conn.rollback()
+    if row is None:
+        raise ValueError(f"Point cloud variant {variant_id} does not exist")
+    if not tiles:
+        raise ValueError(f"Point cloud variant {variant_id} has no tiles; run tile_pointclouds.py first")
+    location_id = row[0]
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        def download(item: Tuple[int, str]) -> str:
+            path = os.path.join(work_dir, f"{item[0]}.laz")
+            client.download_file(*split_uri(item[1]), path)
+            return path
+
+        with ThreadPoolExecutor(max_workers=args.workers * 2) as threads:
+            paths = list(threads.map(download, enumerate(uri for uri, _ in tiles)))
+        header = scan(LocalStore(paths[0], ""), tiles[0][0], os.path.getsize(paths[0]))
+        srid = header.srid or args.srid
+
+        with Pool(args.workers) as pool:
+            parts = pool.map(tile_ground, paths)
+        keys = np.concatenate([k for k, _ in parts])
+        z = np.concatenate([v for _, v in parts])
+        order = np.argsort(keys, kind="stable")
+        keys, z = keys[order], z[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ground_keys, ground_z = keys[starts], np.minimum.reduceat(z, starts)
+        logger.info(f"⛰️  Ground from {len(paths):,} tiles: {len(ground_keys):,} cells")
+
+        # Octree tiles entirely above the band cannot contribute
+        band_top = float(ground_z.max()) + params.breast_height_m + params.band_width_m
+        band_paths = [p for p, (_, min_z) in zip(paths, tiles) if min_z is None or min_z <= band_top]
+
+        with Pool(args.workers, initializer=init_worker, initargs=(ground_keys, ground_z, params)) as pool:
+            parts = pool.map(tile_band, band_paths)
+            x = np.concatenate([px for px, _ in parts])
+            y = np.concatenate([py for _, py in parts])
+            labels = label_clusters(x, y) if len(x) else np.empty(0, np.int64)
+            batches = candidate_batches(x, y, labels, params, args.workers * 4)
+            logger.info(
+                f"🌳 {len(x):,} band points, {sum(int(b[2].max()) + 1 for b in batches):,} stem candidates"
+            )
+            results = pool.map(fit_circles, batches)
+
+    if not results:
+        logger.info(f"🔎 Variant {variant_id}: no stems found")
+        return 0, 0
+    stems = accept(Stems(*(np.concatenate(f) for f in zip(*results))), params)
+    logger.info(
+        f"📏 Variant {variant_id}: {len(stems.x):,} stems, median DBH "
+        f"{np.median(stems.dbh_cm) if len(stems.x) else 0:.1f} cm after {time.perf_counter() - started:.1f}s"
+    )
+    if args.dry_run or len(stems.x) == 0:
+        return 0, len(stems.x)
+
+    with conn, conn.cursor() as cur:
+        written = write_stems(cur, variant_id, location_id, srid, stems, params, args.match_distance)
+    logger.info(f"✅ Variant {variant_id}: {written[0]:,} trees, {written[1]:,} stems written")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect stems and DBH in tiled point clouds")
+    parser.add_argument("variant_ids", type=int, nargs="+", help="pointclouds.PointClouds VariantIDs")
+    parser.add_argument("--breast-height", type=float, default=1.3, help="Band centre above ground (m)")
+    parser.add_argument("--band-width", type=float, default=0.2, help="Band thickness (m)")
+    parser.add_argument("--min-points", type=int, default=20, help="Fewest band points per stem")
+    parser.add_argument("--min-dbh", type=float, default=5.0, help="Smallest accepted DBH (cm)")
+    parser.add_argument("--max-dbh", type=float, default=200.0, help="Largest accepted DBH (cm)")
+    parser.add_argument("--max-rmse", type=float, default=0.15, help="Largest fit RMSE as a fraction of the radius")
+    parser.add_argument("--min-coverage", type=float, default=90.0, help="Least scanned arc of the stem (degrees)")
+    parser.add_argument("--match-distance", type=float, default=0.75, help="Metres to a measured tree to count as its variant")
+    parser.add_argument("--srid", type=int, default=DEFAULT_SRID, help="EPSG code for tiles without CRS records")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument("--work-dir", help="Scratch directory for the tiles (default: system temp)")
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT, help="S3 endpoint")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    parser.add_argument("--dry-run", action="store_true", help="Detect and report, without writing")
+    args = parser.parse_args()
+
+    params = Parameters(
+        args.breast_height, args.band_width, args.min_points, args.min_dbh,
+        args.max_dbh, args.max_rmse, args.min_coverage,
+    )
+    client = s3_client(args.endpoint, args.workers * 2)
+    conn = connect(args.dsn)
+    failed = 0
+    try:
+        for variant_id in args.variant_ids:
+            try:
+                extract(conn, client, variant_id, params, args)
+            except Exception as e:
+                failed += 1
+                logger.error(f"❌ Variant {variant_id}: {e}")
+    finally:
+        conn.close()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
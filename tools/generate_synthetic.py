@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Synthetic forest-scale data generator for load testing
+
+Builds plots, trees, stems, sensors and sensor readings directly in the shared,
+trees and sensor schemas. Volumes are a multiple of today's data set:
+
+  scale 1     4 plots     2,000 trees       20 sensors    ~3.9k readings per day
+  scale 10    40 plots    20,000 trees      200 sensors   ~39k readings per day
+  scale 100   400 plots   200,000 trees     2,000 sensors ~390k readings per day
+  scale 1000  4,000 plots 2,000,000 trees   20,000 sensors ~3.9M readings per day
+
+so `--scale 1000 --days 365` produces about 1.4 billion readings.
+
+Everything is streamed with COPY. Serial IDs are reserved up front so trees, stems
+and sensors can be written without RETURNING round trips. Readings are generated
+per sensor with numpy (diurnal and seasonal cycles, noise, slow drift, outages and
+occasional suspect values) and written by parallel worker processes.
+
+All generated plots are named Synthetic_<run>_<n>; --cleanup deletes them, which
+cascades to their trees, stems, sensors and readings.
+
+Usage:
+  python tools/generate_synthetic.py --scale 10
+  python tools/generate_synthetic.py --scale 100 --days 90 --workers 8
+  python tools/generate_synthetic.py --scale 1000 --days 365 --skip-triggers
+  python tools/generate_synthetic.py --cleanup
+"""
+
+import argparse
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from db import connect, copy_lines, copy_rows, reserve_ids
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Per unit of scale
+TREES_PER_SCALE = 2000
+SENSORS_PER_SCALE = 20
+TREES_PER_PLOT = 500
+
+# Plots are laid out on a grid near the Ecosense sites
+ORIGIN_LON, ORIGIN_LAT = 7.85, 47.99
+PLOT_SIZE_M = 100.0
+METERS_PER_DEG_LAT = 111_320.0
+METERS_PER_DEG_LON = METERS_PER_DEG_LAT * math.cos(math.radians(ORIGIN_LAT))
+
+SAMPLING_INTERVALS = [300, 600, 900]
+SUSPECT_FRACTION = 0.005
+DROP_FRACTION = 0.01
+# Readings generated per sensor before they are handed to COPY
+DAYS_PER_CHUNK = 30
+CREATED_BY = "synthetic"
+
+
+class Profile(NamedTuple):
+    """Signal model for one sensor type"""
+
+    base: float
+    diurnal: float  # amplitude, peaking mid-afternoon
+    seasonal: float  # amplitude, peaking late July
+    noise: float
+    drift: float = 0.0  # random-walk step per sample
+    daylight_only: bool = False  # zero at night (sap flow, radiation)
+
+
+PROFILES: Dict[str, Profile] = {
+    "Temperature": Profile(9.0, 5.0, 9.0, 0.3),
+    "Humidity": Profile(75.0, -15.0, -6.0, 2.0),
+    "Soil_Moisture": Profile(30.0, 0.3, -6.0, 0.2, drift=0.05),
+    "Soil_Temperature": Profile(10.0, 1.0, 7.0, 0.1),
+    "Barometric_Pressure": Profile(1013.0, 0.8, 0.0, 0.2, drift=0.1),
+    "Sap_Flow": Profile(0.0, 1800.0, 600.0, 40.0, daylight_only=True),
+    "Solar_Radiation": Profile(0.0, 600.0, 250.0, 30.0, daylight_only=True),
+    "Light": Profile(0.0, 40000.0, 15000.0, 2000.0, daylight_only=True),
+    "CO2": Profile(420.0, -25.0, -10.0, 5.0),
+    "Wind_Speed": Profile(2.5, 1.0, 0.5, 0.8),
+}
+
+
+class SensorSpec(NamedTuple):
+    sensor_id: int
+    type_name: str
+    interval: int
+    range_min: Optional[float]
+    range_max: Optional[float]
+    seed: int
+
+
+class Lookups(NamedTuple):
+    species_ids: List[int]
+    status_ids: Dict[str, int]
+    variant_type_id: int
+    sensor_types: Dict[str, Tuple[int, Optional[float], Optional[float], Optional[str]]]
+
+
+def load_lookups(cur) -> Lookups:
+    cur.execute("SELECT SpeciesID FROM shared.Species ORDER BY SpeciesID")
+    species_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT TreeStatusName, TreeStatusID FROM trees.TreeStatus")
+    status_ids = dict(cur.fetchall())
+    cur.execute(
+        "SELECT VariantTypeID FROM shared.VariantTypes WHERE VariantTypeName = 'original'"
+    )
+    variant_type_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        SELECT SensorTypeName, SensorTypeID, TypicalRangeMin, TypicalRangeMax, TypicalUnit
+        FROM sensor.SensorTypes
+    """
+    )
+    sensor_types = {
+        name: (
+            type_id,
+            float(lo) if lo is not None else None,
+            float(hi) if hi is not None else None,
+            unit,
+        )
+        for name, type_id, lo, hi, unit in cur.fetchall()
+    }
+    return Lookups(species_ids, status_ids, variant_type_id, sensor_types)
+
+
+def plot_origin(index: int, columns: int) -> Tuple[float, float]:
+    """South-west corner of plot `index`, plots spaced one plot width apart"""
+    row, col = divmod(index, columns)
+    return (
+        ORIGIN_LON + col * 2 * PLOT_SIZE_M / METERS_PER_DEG_LON,
+        ORIGIN_LAT + row * 2 * PLOT_SIZE_M / METERS_PER_DEG_LAT,
+    )
+
+
+def point_ewkt(lon: float, lat: float) -> str:
+    return f"SRID=4326;POINT({lon:.8f} {lat:.8f})"
+
+
+def random_positions(
+    rng: np.random.Generator, origins: np.ndarray, plot_index: np.ndarray
+) -> np.ndarray:
+    offsets = rng.uniform(0, PLOT_SIZE_M, size=(len(plot_index), 2))
+    return origins[plot_index] + offsets / [METERS_PER_DEG_LON, METERS_PER_DEG_LAT]
+
+
+def generate_plots(cur, run: str, count: int) -> Tuple[List[int], np.ndarray]:
+    columns = math.ceil(math.sqrt(count))
+    first_id = reserve_ids(cur, "shared.Locations", "LocationID", count)
+    origins = np.array([plot_origin(i, columns) for i in range(count)])
+    dlon = PLOT_SIZE_M / METERS_PER_DEG_LON
+    dlat = PLOT_SIZE_M / METERS_PER_DEG_LAT
+
+    def rows():
+        for i, (lon, lat) in enumerate(origins):
+            ring = [(lon, lat), (lon + dlon, lat), (lon + dlon, lat + dlat), (lon, lat + dlat), (lon, lat)]
+            yield (
+                first_id + i,
+                f"Synthetic_{run}_{i:05d}",
+                "SRID=4326;POLYGON((" + ", ".join(f"{x:.8f} {y:.8f}" for x, y in ring) + "))",
+                point_ewkt(lon + dlon / 2, lat + dlat / 2),
+                f"Synthetic load-test plot ({run})",
+            )
+
+    copy_rows(
+        cur,
+        "shared.Locations",
+        ["LocationID", "LocationName", "Boundary", "CenterPoint", "Description"],
+        rows(),
+    )
+    return [first_id + i for i in range(count)], origins
+
+
+def generate_trees(
+    cur, rng: np.random.Generator, lookups: Lookups, location_ids: List[int], origins: np.ndarray, count: int
+) -> int:
+    """COPY trees and their stems; returns the number of stems written"""
+    first_id = reserve_ids(cur, "trees.Trees", "VariantID", count)
+    plot_index = np.minimum(np.arange(count) // TREES_PER_PLOT, len(location_ids) - 1)
+    positions = random_positions(rng, origins, plot_index)
+
+    height = np.clip(rng.gamma(6.0, 4.0, count), 2.0, 55.0)
+    crown_width = np.clip(height * rng.uniform(0.15, 0.35, count), 0.5, 30.0)
+    crown_base = height * rng.uniform(0.25, 0.6, count)
+    age = np.clip((height * rng.uniform(2.5, 5.0, count)).astype(int), 3, 400)
+    health = np.clip(rng.beta(8, 2, count), 0, 1)
+    species = rng.choice(lookups.species_ids, count) if lookups.species_ids else [None] * count
+    status_names = np.where(
+        health > 0.6, "healthy", np.where(health > 0.35, "stressed", "declining")
+    )
+
+    columns = [
+        "VariantID", "LocationID", "VariantTypeID", "SpeciesID", "TreeStatusID",
+        "Height_m", "CrownWidth_m", "CrownBaseHeight_m", "Position",
+        "Age_years", "HealthScore", "CreatedBy",
+    ]
+
+    def tree_rows():
+        for i in range(count):
+            yield (
+                first_id + i,
+                location_ids[plot_index[i]],
+                lookups.variant_type_id,
+                species[i],
+                lookups.status_ids.get(status_names[i]),
+                f"{height[i]:.2f}",
+                f"{crown_width[i]:.2f}",
+                f"{crown_base[i]:.2f}",
+                point_ewkt(*positions[i]),
+                int(age[i]),
+                f"{health[i]:.2f}",
+                CREATED_BY,
+            )
+
+    copy_rows(cur, "trees.Trees", columns, tree_rows())
+
+    # 90% single-stem trees, the rest with two or three stems
+    stem_counts = np.where(rng.random(count) < 0.9, 1, rng.integers(2, 4, count))
+    dbh = np.clip(height * rng.uniform(0.9, 1.6, count), 3.0, 250.0)
+    density = rng.uniform(380, 720, count)
+
+    def stem_rows():
+        for i in range(count):
+            for stem in range(1, stem_counts[i] + 1):
+                # Secondary stems are thinner and shorter
+                factor = 1.0 if stem == 1 else rng.uniform(0.4, 0.8)
+                yield (
+                    first_id + i,
+                    stem,
+                    f"{dbh[i] * factor:.2f}",
+                    f"{max(height[i] * factor, 1.0):.2f}",
+                    f"{density[i]:.2f}",
+                )
+
+    copy_rows(
+        cur,
+        "trees.Stems",
+        ["TreeVariantID", "StemNumber", "DBH_cm", "StemHeight_m", "WoodDensity_kg_m3"],
+        stem_rows(),
+    )
+    return int(stem_counts.sum())
+
+
+def generate_sensors(
+    cur, rng: np.random.Generator, lookups: Lookups, location_ids: List[int], origins: np.ndarray, count: int
+) -> List[SensorSpec]:
+    first_id = reserve_ids(cur, "sensor.Sensors", "SensorID", count)
+    type_names = [name for name in PROFILES if name in lookups.sensor_types]
+    plot_index = rng.integers(0, len(location_ids), count)
+    positions = random_positions(rng, origins, plot_index)
+    chosen_types = rng.choice(type_names, count)
+    intervals = rng.choice(SAMPLING_INTERVALS, count)
+    seeds = rng.integers(0, 2**31, count)
+
+    specs = []
+    rows = []
+    for i in range(count):
+        type_id, lo, hi, unit = lookups.sensor_types[chosen_types[i]]
+        sensor_id = first_id + i
+        specs.append(
+            SensorSpec(sensor_id, str(chosen_types[i]), int(intervals[i]), lo, hi, int(seeds[i]))
+        )
+        # ExternalID stays NULL so the Aquarius sync never touches synthetic sensors
+        rows.append(
+            (
+                sensor_id,
+                location_ids[plot_index[i]],
+                type_id,
+                "Synthetic",
+                f"SYN-{sensor_id:08d}",
+                point_ewkt(*positions[i]),
+                int(intervals[i]),
+                unit,
+                True,
+                CREATED_BY,
+            )
+        )
+
+    copy_rows(
+        cur,
+        "sensor.Sensors",
+        [
+            "SensorID", "LocationID", "SensorTypeID", "SensorModel", "SerialNumber",
+            "Position", "SamplingInterval_seconds", "Unit", "IsActive", "CreatedBy",
+        ],
+        rows,
+    )
+    return specs
+
+
+def sensor_values(
+    spec: SensorSpec, timestamps: np.ndarray, rng: np.random.Generator, walk_start: float
+) -> Tuple[np.ndarray, float]:
+    """Signal for one sensor at the given epoch seconds, and where its drift ended"""
+    profile = PROFILES[spec.type_name]
+    hour = (timestamps % 86400) / 3600.0
+    day_of_year = (timestamps / 86400.0) % 365.25
+    diurnal = np.sin((hour - 9.0) / 24.0 * 2 * np.pi)  # peaks around 15:00 UTC
+    seasonal = np.sin((day_of_year - 111.0) / 365.25 * 2 * np.pi)  # peaks around late July
+
+    if profile.daylight_only:
+        values = np.maximum(diurnal, 0) * (profile.diurnal + profile.seasonal * seasonal)
+    else:
+        values = profile.base + profile.diurnal * diurnal + profile.seasonal * seasonal
+    values = values + rng.normal(0.0, profile.noise, len(timestamps))
+    walk_end = walk_start
+    if profile.drift:
+        walk = walk_start + np.cumsum(rng.normal(0.0, profile.drift, len(timestamps)))
+        values = values + walk
+        walk_end = float(walk[-1])
+    if spec.range_min is not None or spec.range_max is not None:
+        values = np.clip(values, spec.range_min, spec.range_max)
+    return values, walk_end
+
+
+def outage_mask(rng: np.random.Generator, timestamps: np.ndarray) -> np.ndarray:
+    """True for samples that were actually recorded
+
+    About one outage per 20 days of 1 to 72 hours, plus single dropped samples.
+    """
+    keep = rng.random(len(timestamps)) >= DROP_FRACTION
+    span_days = (timestamps[-1] - timestamps[0]) / 86400.0 if len(timestamps) else 0
+    for _ in range(rng.poisson(span_days / 20.0)):
+        start = rng.uniform(timestamps[0], timestamps[-1])
+        keep &= ~((timestamps >= start) & (timestamps < start + rng.uniform(1, 72) * 3600))
+    return keep
+
+
+def reading_lines(spec: SensorSpec, start: int, end: int) -> Iterator[str]:
+    """COPY lines for one sensor between two epoch seconds, generated in chunks"""
+    rng = np.random.default_rng(spec.seed)
+    first = math.ceil(start / spec.interval) * spec.interval
+    chunk_seconds = DAYS_PER_CHUNK * 86400
+    walk = 0.0
+    for chunk_start in range(first, end, chunk_seconds):
+        timestamps = np.arange(chunk_start, min(chunk_start + chunk_seconds, end), spec.interval)
+        if not len(timestamps):
+            continue
+        values, walk = sensor_values(spec, timestamps, rng, walk)
+        keep = outage_mask(rng, timestamps)
+        suspect = rng.random(len(timestamps)) < SUSPECT_FRACTION
+        stamps = np.datetime_as_string(timestamps.astype("datetime64[s]"), unit="s")
+        prefix = f"{spec.sensor_id}\t"
+        yield "".join(
+            f"{prefix}{stamp}+00\t{value:.4f}\t{'suspect' if bad else 'good'}\n"
+            for stamp, value, bad, ok in zip(stamps, values, suspect, keep)
+            if ok
+        )
+
+
+def write_readings(task: Tuple[List[SensorSpec], int, int, Optional[str]]) -> int:
+    """Worker: COPY readings for a slice of sensors, committing per sensor"""
+    specs, start, end, dsn = task
+    conn = connect(dsn)
+    written = 0
+    try:
+        with conn.cursor() as cur:
+            for spec in specs:
+                copy_lines(
+                    cur,
+                    "sensor.SensorReadings",
+                    ["SensorID", "Timestamp", "Value", "Quality"],
+                    reading_lines(spec, start, end),
+                )
+                written += cur.rowcount
+                conn.commit()
+    finally:
+        conn.close()
+    return written
+
+
+def generate_readings(
+    specs: List[SensorSpec], days: int, workers: int, dsn: Optional[str]
+) -> int:
+    end = int(datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0).timestamp())
+    start = end - days * 86400
+    # Small slices keep all workers busy until the end
+    slice_size = max(1, min(50, len(specs) // (workers * 4) or 1))
+    tasks = [
+        (specs[i : i + slice_size], start, end, dsn) for i in range(0, len(specs), slice_size)
+    ]
+    total = 0
+    started = time.perf_counter()
+    with Pool(workers) as pool:
+        for done, written in enumerate(pool.imap_unordered(write_readings, tasks), 1):
+            total += written
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"📊 Readings: {total:,} rows ({done}/{len(tasks)} slices, "
+                f"{total / elapsed:,.0f} rows/s)"
+            )
+    return total
+
+
+def cleanup(dsn: Optional[str]):
+    conn = connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM shared.Locations WHERE LocationName LIKE 'Synthetic\\_%'")
+        logger.info(f"🧹 Removed {cur.rowcount} synthetic plots and everything attached to them")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic forest data for load testing")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiple of today's data volume")
+    parser.add_argument("--days", type=int, default=30, help="Days of readings per sensor")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel reading writers")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    parser.add_argument("--skip-readings", action="store_true", help="Only generate plots, trees and sensors")
+    parser.add_argument(
+        "--skip-triggers",
+        action="store_true",
+        help="Disable triggers (audit, updated_at) and FK checks while loading; needs superuser",
+    )
+    parser.add_argument("--cleanup", action="store_true", help="Delete all synthetic data and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup(args.dsn)
+        return
+
+    rng = np.random.default_rng(args.seed)
+    run = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    trees = max(1, int(TREES_PER_SCALE * args.scale))
+    sensors = max(1, int(SENSORS_PER_SCALE * args.scale))
+    plots = max(1, math.ceil(trees / TREES_PER_PLOT))
+    logger.info(
+        f"🌲 Run {run}: {plots:,} plots, {trees:,} trees, {sensors:,} sensors, {args.days} days"
+    )
+
+    started = time.perf_counter()
+    conn = connect(args.dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            if args.skip_triggers:
+                cur.execute("SET LOCAL session_replication_role = replica")
+            lookups = load_lookups(cur)
+            location_ids, origins = generate_plots(cur, run, plots)
+            stems = generate_trees(cur, rng, lookups, location_ids, origins, trees)
+            specs = generate_sensors(cur, rng, lookups, location_ids, origins, sensors)
+            if args.skip_triggers:
+                # The lineage and metrics triggers did not run either
+                cur.execute("SELECT shared.rebuild_variant_lineage('trees')")
+                cur.execute(
+                    """
+                    INSERT INTO trees.TreeMetricsPending (VariantID)
+                    SELECT VariantID FROM trees.Trees WHERE LocationID = ANY(%s)
+                    ON CONFLICT (VariantID) DO NOTHING
+                """,
+                    (location_ids,),
+                )
+                cur.execute("SELECT trees.refresh_tree_metrics()")
+        logger.info(
+            f"✅ Metadata: {plots:,} plots, {trees:,} trees, {stems:,} stems, "
+            f"{sensors:,} sensors in {time.perf_counter() - started:.1f}s"
+        )
+    finally:
+        conn.close()
+
+    if args.skip_readings:
+        return
+
+    readings = generate_readings(specs, args.days, args.workers, args.dsn)
+    conn = connect(args.dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("ANALYZE sensor.SensorReadings")
+    conn.close()
+    logger.info(
+        f"✅ Done: {readings:,} readings, total {timedelta(seconds=int(time.perf_counter() - started))}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Bulk importer for Aquarius time series CSV exports
+
+Loads files in the export format read by docker/volumes/db/init/20-load-sensor-data.sql,
+against a running database and for any number of files:
+
+  ---,TimeStamp,Value,Parameter,TimeseriesID
+  0,"2024-08-04 08:00:00","12.30684703","Sapflow","Sapflow.DouglasFir_Mixed_5_Total_SapFlow@Ecosense_MixedPlot"
+
+Every TimeseriesID is resolved to the sensor whose ExternalMetadata Identifier
+(set by the sync and by migration 33) equals it. Series without a sensor get a
+new one at the location centre, with the type from the Parameter column and the
+TimeseriesID only as Identifier: ExternalID holds the Aquarius UniqueId, which
+the export does not contain, so it stays NULL until the sync's metadata run
+adopts the sensor. Files are
+loaded by a pool of worker processes, each with its own connection: COPY into a
+temporary staging table, then one upsert into sensor.SensorReadings. Rows that
+are already stored with the same value are not rewritten, and files whose
+content hash is in sensor.AquariusImports are skipped, so whole archives can be
+re-run after adding new exports.
+
+Usage:
+  python tools/import_aquarius.py data/ecosense/*.csv
+  python tools/import_aquarius.py /archive/aquarius --workers 16
+  python tools/import_aquarius.py exports/ --location "EcoSense Forest Area" --timezone Europe/Berlin --force
+"""
+
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from db import connect
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+HEADER = ["---", "TimeStamp", "Value", "Parameter", "TimeseriesID"]
+CREATED_BY = "aquarius_csv_import"
+
+# Aquarius Parameter -> sensor.SensorTypes name (as in the ecosense-sync service)
+PARAMETER_TYPES = {
+    "Sapflow": "Sap_Flow",
+    "StemRadialVar": "Stem_Radial_Variation",
+    "StemRadialVar_Volt": "Stem_Radial_Variation",
+    "BarPressure": "Barometric_Pressure",
+    "SoilMoisture": "Soil_Moisture",
+    "SoilTemp": "Soil_Temperature",
+}
+
+STAGING_DDL = """
+CREATE TEMP TABLE aquarius_staging (
+    RowNum BIGINT,
+    Timestamp TIMESTAMPTZ,
+    Value NUMERIC,
+    Parameter TEXT,
+    TimeseriesID TEXT
+)
+"""
+
+RESOLVE_SQL = """
+SELECT s.ExternalMetadata->>'Identifier', s.SensorID
+FROM sensor.Sensors s
+WHERE s.ExternalMetadata->>'Identifier' = ANY(%s)
+"""
+
+CREATE_SENSOR_SQL = """
+INSERT INTO sensor.Sensors (
+    LocationID, SensorTypeID, SensorModel, SerialNumber, Position,
+    SamplingInterval_seconds, Unit, ExternalMetadata, IsActive, CreatedBy
+)
+SELECT l.LocationID, st.SensorTypeID, 'Aquarius Time Series', %(label)s, l.CenterPoint,
+       900, st.TypicalUnit,
+       jsonb_build_object('Identifier', %(id)s::text, 'Parameter', %(parameter)s::text, 'Label', %(label)s::text),
+       TRUE, %(created_by)s
+FROM shared.Locations l, sensor.SensorTypes st
+WHERE l.LocationID = %(location_id)s AND st.SensorTypeName = %(type_name)s
+ON CONFLICT ((ExternalMetadata->>'Identifier')) WHERE ExternalMetadata->>'Identifier' IS NOT NULL
+DO NOTHING
+RETURNING SensorID
+"""
+
+# The staging table can hold one timestamp twice; the last row wins. Rows are
+# written in (SensorID, Timestamp) order, so workers loading overlapping exports
+# lock the same rows in the same order instead of deadlocking.
+UPSERT_SQL = """
+INSERT INTO sensor.SensorReadings (SensorID, Timestamp, Value, Quality)
+SELECT DISTINCT ON (m.SensorID, a.Timestamp) m.SensorID, a.Timestamp, a.Value, 'good'
+FROM aquarius_staging a
+JOIN unnest(%s::text[], %s::int[]) AS m(TimeseriesID, SensorID) USING (TimeseriesID)
+WHERE a.Timestamp IS NOT NULL AND a.Value IS NOT NULL
+ORDER BY m.SensorID, a.Timestamp, a.RowNum DESC
+ON CONFLICT (SensorID, Timestamp) WHERE ScenarioID IS NULL
+DO UPDATE SET Value = EXCLUDED.Value, Quality = EXCLUDED.Quality
+WHERE sensor.SensorReadings.Value IS DISTINCT FROM EXCLUDED.Value
+   OR sensor.SensorReadings.Quality IS DISTINCT FROM EXCLUDED.Quality
+"""
+
+
+class FileResult(NamedTuple):
+    path: str
+    rows: int
+    written: int
+    created: int
+    skipped_series: List[str]
+    error: Optional[str] = None
+    already_imported: bool = False
+
+
+def read_header(f) -> List[str]:
+    return next(csv.reader([f.readline()]), [])
+
+
+def is_export(path: str) -> bool:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return read_header(f) == HEADER
+
+
+def find_files(paths: List[str]) -> List[str]:
+    """CSV files given directly, or Aquarius exports found below the given directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                candidates = (os.path.join(root, n) for n in names if n.lower().endswith(".csv"))
+                files.extend(c for c in candidates if is_export(c))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def series_label(timeseries_id: str) -> str:
+    """Label part of Parameter.Label@Location"""
+    name = timeseries_id.split("@", 1)[0]
+    return name.split(".", 1)[1] if "." in name else name
+
+
+# --- Pool workers ----------------------------------------------------------
+
+# Set in every worker by init_worker; each process keeps one connection
+_conn = None
+_location_id: Optional[int] = None
+_force = False
+
+
+def init_worker(dsn: Optional[str], timezone: str, location_id: int, force: bool):
+    global _conn, _location_id, _force
+    _conn = connect(dsn)
+    with _conn.cursor() as cur:
+        # Export timestamps carry no offset
+        cur.execute("SET TIME ZONE %s", (timezone,))
+    _conn.commit()
+    _location_id, _force = location_id, force
+
+
+def resolve_sensors(cur, series: Dict[str, str]) -> Tuple[Dict[str, int], int, List[str]]:
+    """TimeseriesID -> SensorID, creating sensors for known parameters
+
+    Returns the mapping, the number of sensors created and the series that
+    have neither a sensor nor a known parameter.
+    """
+    cur.execute(RESOLVE_SQL, (sorted(series),))
+    sensors = {row[0]: row[1] for row in cur.fetchall()}
+    created, unknown = 0, []
+    # Sorted, so concurrent workers wait on each other instead of deadlocking
+    for timeseries_id in sorted(set(series) - set(sensors)):
+        type_name = PARAMETER_TYPES.get(series[timeseries_id])
+        if not type_name:
+            unknown.append(timeseries_id)
+            continue
+        cur.execute(
+            CREATE_SENSOR_SQL,
+            {
+                "id": timeseries_id,
+                "label": series_label(timeseries_id),
+                "parameter": series[timeseries_id],
+                "type_name": type_name,
+                "location_id": _location_id,
+                "created_by": CREATED_BY,
+            },
+        )
+        row = cur.fetchone()
+        if row:
+            created += 1
+        else:
+            # Created by another worker in the meantime, or the type is missing
+            cur.execute(
+                "SELECT SensorID FROM sensor.Sensors WHERE ExternalMetadata->>'Identifier' = %s",
+                (timeseries_id,),
+            )
+            row = cur.fetchone()
+            if not row:
+                unknown.append(timeseries_id)
+                continue
+        sensors[timeseries_id] = row[0]
+    return sensors, created, unknown
+
+
+def import_file(path: str) -> FileResult:
+    try:
+        digest = file_hash(path)
+        with _conn.cursor() as cur:
+            if not _force:
+                cur.execute("SELECT 1 FROM sensor.AquariusImports WHERE FileHash = %s", (digest,))
+                if cur.fetchone():
+                    _conn.rollback()
+                    return FileResult(path, 0, 0, 0, [], already_imported=True)
+
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                header = read_header(f)
+                if header != HEADER:
+                    raise ValueError(f"unexpected header {header}")
+                cur.execute(STAGING_DDL)
+                cur.copy_expert(
+                    "COPY aquarius_staging (RowNum, Timestamp, Value, Parameter, TimeseriesID) "
+                    "FROM STDIN WITH (FORMAT CSV, NULL '')",
+                    f,
+                    size=1 << 20,
+                )
+            cur.execute("SELECT COUNT(*) FROM aquarius_staging")
+            rows = cur.fetchone()[0]
+            cur.execute("SELECT DISTINCT TimeseriesID, Parameter FROM aquarius_staging WHERE TimeseriesID IS NOT NULL")
+            series = {row[0]: row[1] for row in cur.fetchall()}
+
+            # Sensors are committed before the readings, so other workers are not
+            # blocked on a new sensor while this file is upserted
+            sensors, created, unknown = resolve_sensors(cur, series)
+            _conn.commit()
+
+            ids = sorted(sensors)
+            cur.execute(UPSERT_SQL, (ids, [sensors[i] for i in ids]))
+            written = cur.rowcount
+            cur.execute(
+                """
+                INSERT INTO sensor.AquariusImports (FileHash, FileName, RowCount, WrittenCount)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (FileHash) DO UPDATE SET
+                    FileName = EXCLUDED.FileName,
+                    RowCount = EXCLUDED.RowCount,
+                    WrittenCount = EXCLUDED.WrittenCount,
+                    ImportedAt = NOW()
+            """,
+                (digest, os.path.basename(path), rows, written),
+            )
+            cur.execute("DROP TABLE aquarius_staging")
+        _conn.commit()
+        return FileResult(path, rows, written, created, unknown)
+    except Exception as e:
+        _conn.rollback()
+        with _conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS aquarius_staging")
+        _conn.commit()
+        return FileResult(path, 0, 0, 0, [], error=str(e).strip())
+
+
+def location_id(dsn: Optional[str], name: str) -> int:
+    conn = connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT LocationID FROM shared.Locations WHERE LocationName = %s", (name,))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+    if not row:
+        raise SystemExit(f"❌ Location not found: {name}")
+    return row[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load Aquarius time series CSV exports in parallel")
+    parser.add_argument("paths", nargs="+", help="CSV files or directories to search for *.csv")
+    parser.add_argument("--location", default="EcoSense Forest Area", help="LocationName for new sensors")
+    parser.add_argument("--timezone", default="UTC", help="Time zone of the export timestamps")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Also load files that were imported before")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    args = parser.parse_args()
+
+    files = find_files(args.paths)
+    if not files:
+        raise SystemExit("❌ No CSV files found")
+    logger.info(f"🔎 {len(files):,} files")
+
+    started = time.perf_counter()
+    initargs = (args.dsn, args.timezone, location_id(args.dsn, args.location), args.force)
+    totals = {"files": 0, "rows": 0, "written": 0, "created": 0, "known": 0}
+    failed = 0
+    with Pool(min(args.workers, len(files)), initializer=init_worker, initargs=initargs) as pool:
+        for result in pool.imap_unordered(import_file, files):
+            name = os.path.basename(result.path)
+            if result.error:
+                failed += 1
+                logger.error(f"❌ {name}: {result.error}")
+                continue
+            if result.already_imported:
+                totals["known"] += 1
+                continue
+            for timeseries_id in result.skipped_series:
+                logger.warning(f"⚠️ {name}: no sensor and unknown parameter for {timeseries_id}, rows skipped")
+            totals["files"] += 1
+            totals["rows"] += result.rows
+            totals["written"] += result.written
+            totals["created"] += result.created
+            logger.info(f"📄 {name}: {result.rows:,} rows, {result.written:,} written")
+
+    logger.info(
+        f"✅ {totals['files']:,} files ({totals['known']:,} already imported), {totals['rows']:,} rows, "
+        f"{totals['written']:,} readings written, {totals['created']:,} sensors created "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Incremental loader for tree inventory CSV exports (EcoSense ODK, Mathisle)
+
+Loads the same two formats as docker/volumes/db/init/19-load-csv-data.sql, but
+against a running database and any number of times:
+
+  ecosense   fid, species, qr_code_id, ..., x_32632, y_32632, diameter_m,
+             tls_treeheight, plot_id, tree_id, full_id, elevation
+  mathisle   "", species_short, date_time, qr_code, tree_id_fallback,
+             gps_latitude, gps_longitude, gps_height, DBH, TreeID, species_label
+
+Every row is keyed (trees.Trees.SourceKey) on full_id (EcoSense) or qr_code
+(Mathisle), with fid:<fid> or measured:<date_time> for rows without one. When
+a key appears several times in a file, the last row wins. Keys new to the
+location are inserted, keys whose species, height, position or DBH changed are
+updated in place (the audit triggers record the old values), and keys that are
+unchanged or missing from the file are left alone.
+
+The file is read in batches. UTM coordinates are converted to WGS84 with a
+vectorized inverse transverse Mercator (Krueger series, sub-millimetre within
+the zone). Species are resolved by one dictionary join against shared.Species
+plus the aliases below. New trees and stems are written with COPY, changed ones
+with one UPDATE ... FROM each.
+
+Usage:
+  python tools/load_inventory.py data/ecosense_251020.csv
+  python tools/load_inventory.py data/mathisle_251015.csv --location "Mathisleweiher Forest Plot"
+  python tools/load_inventory.py export.csv --format ecosense --srid 32632 --dry-run
+"""
+
+import argparse
+import csv
+import logging
+import math
+import re
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from db import connect, copy_rows, reserve_ids
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+BATCH_ROWS = 50_000
+NULLS = {"", "NA"}
+# Changes smaller than this are rounding noise of the export
+POSITION_TOLERANCE_DEG = 1e-7
+
+# Names used in the exports -> scientific names in shared.Species
+SPECIES_ALIASES = {
+    "beech": "Fagus sylvatica",
+    "be": "Fagus sylvatica",
+    "douglas fir": "Pseudotsuga menziesii",
+    "df": "Pseudotsuga menziesii",
+    "silver fir": "Abies alba",
+    "fir": "Abies alba",
+    "esf": "Abies alba",
+    "spruce": "Picea abies",
+    "norway spruce": "Picea abies",
+    "ns": "Picea abies",
+    "larch": "Larix decidua",
+    "ela": "Larix decidua",
+    "oak": "Quercus robur",
+    "pine": "Pinus sylvestris",
+    "nom": "Acer platanoides",
+    "sy": "Acer pseudoplatanus",
+    "wch": "Prunus avium",
+    "wst": "Sorbus torminalis",
+}
+# "10 Beech (Fagus sylvatica )" -> Fagus sylvatica
+LABEL_SCIENTIFIC = re.compile(r"\(([^)]+)\)")
+
+
+class Format(NamedTuple):
+    name: str
+    created_by: str
+    location: str
+    null_tokens: frozenset
+
+
+FORMATS = {
+    "ecosense": Format("ecosense", "ecosense_csv_import", "EcoSense Forest Area", frozenset({""})),
+    "mathisle": Format("mathisle", "mathisle_csv_import", "Mathisleweiher Forest Plot", frozenset({"NA"})),
+}
+
+
+class Batch(NamedTuple):
+    keys: List[str]
+    species: List[Optional[str]]  # alias or scientific name, lower case
+    lon: np.ndarray
+    lat: np.ndarray
+    height_m: np.ndarray
+    dbh_cm: np.ndarray
+    notes: List[str]
+
+
+# --- Reprojection ----------------------------------------------------------
+
+
+def utm_to_wgs84(easting: np.ndarray, northing: np.ndarray, srid: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse UTM for EPSG:326zz (north) and 327zz (south) on WGS84; returns (lon, lat) in degrees"""
+    if not (32601 <= srid <= 32660 or 32701 <= srid <= 32760):
+        raise ValueError(f"EPSG:{srid} is not a WGS84 UTM zone")
+    zone, south = srid % 100, srid > 32700
+    a, f, k0 = 6378137.0, 1 / 298.257223563, 0.9996
+    n = f / (2 - f)
+    big_a = a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+    beta = (n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96, n ** 2 / 48 + n ** 3 / 15, 17 * n ** 3 / 480)
+    delta = (2 * n - 2 * n ** 2 / 3 - 2 * n ** 3, 7 * n ** 2 / 3 - 8 * n ** 3 / 5, 56 * n ** 3 / 15)
+
+    xi = (northing - (10_000_000.0 if south else 0.0)) / (k0 * big_a)
+    eta = (easting - 500_000.0) / (k0 * big_a)
+    xi_p, eta_p = xi.copy(), eta.copy()
+    for j, b in enumerate(beta, start=1):
+        xi_p -= b * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+        eta_p -= b * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+    chi = np.arcsin(np.sin(xi_p) / np.cosh(eta_p))
+    lat = chi.copy()
+    for j, d in enumerate(delta, start=1):
+        lat += d * np.sin(2 * j * chi)
+    lon = math.radians(zone * 6 - 183) + np.arctan2(np.sinh(eta_p), np.cos(xi_p))
+    return np.degrees(lon), np.degrees(lat)
+
+
+# --- CSV parsing -----------------------------------------------------------
+
+
+def detect_format(header: List[str]) -> str:
+    if "x_32632" in header and "full_id" in header:
+        return "ecosense"
+    if "qr_code" in header and "gps_latitude" in header:
+        return "mathisle"
+    raise ValueError(f"Unknown inventory format with columns {', '.join(header)}")
+
+
+def _number(values: List[Optional[str]]) -> np.ndarray:
+    return np.array([float(v) if v is not None else np.nan for v in values])
+
+
+def read_batches(path: str, fmt: Format, srid: int, batch_rows: int) -> Iterator[Batch]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = [
+                {k: (None if v in fmt.null_tokens else v) for k, v in row.items()}
+                for row in islice(reader, batch_rows)
+            ]
+            if not rows:
+                return
+            yield (_ecosense if fmt.name == "ecosense" else _mathisle)(rows, srid)
+
+
+def _ecosense(rows: List[Dict[str, Optional[str]]], srid: int) -> Batch:
+    lon, lat = utm_to_wgs84(
+        _number([r["x_32632"] for r in rows]), _number([r["y_32632"] for r in rows]), srid
+    )
+    notes = [
+        " | ".join(
+            part for part in (
+                f"FID: {r['fid']}",
+                f"Plot: {r['plot_id']}" if r["plot_id"] else None,
+                f"TreeID: {r['full_id']}" if r["full_id"] else None,
+                f"QR Code: {r['qr_code_id']}" if r["qr_code_id"] else None,
+                f"Comment: {r['comment']}" if r["comment"] else None,
+            ) if part
+        )
+        for r in rows
+    ]
+    return Batch(
+        keys=[r["full_id"] or f"fid:{r['fid']}" for r in rows],
+        species=[r["species"].strip().lower() if r["species"] else None for r in rows],
+        lon=lon,
+        lat=lat,
+        height_m=_number([r["tls_treeheight"] for r in rows]),
+        dbh_cm=_number([r["diameter_m"] for r in rows]) * 100,
+        notes=notes,
+    )
+
+
+def _mathisle(rows: List[Dict[str, Optional[str]]], srid: int) -> Batch:
+    species = []
+    for r in rows:
+        # The label carries the scientific name; the short code is the fallback
+        match = LABEL_SCIENTIFIC.search(r["species_label"] or "")
+        name = match.group(1) if match else r["species_short"]
+        species.append(" ".join(name.split()).lower() if name else None)
+    notes = [
+        " | ".join(
+            part for part in (
+                f"Row: {r['']}" if r.get("") else None,
+                f"TreeID: {r['TreeID']}" if r["TreeID"] else None,
+                f"QR Code: {r['qr_code'] or ''}",
+                f"Measured: {r['date_time']}",
+                f"Species: {r['species_label']}" if r["species_label"] else None,
+            ) if part
+        )
+        for r in rows
+    ]
+    return Batch(
+        keys=[r["qr_code"] or f"measured:{r['date_time']}" for r in rows],
+        species=species,
+        lon=_number([r["gps_longitude"] for r in rows]),
+        lat=_number([r["gps_latitude"] for r in rows]),
+        height_m=np.full(len(rows), np.nan),
+        dbh_cm=_number([r["DBH"] for r in rows]) * 100,
+        notes=notes,
+    )
+
+
+# --- Database --------------------------------------------------------------
+
+
+class Lookups(NamedTuple):
+    location_id: int
+    variant_type_id: int
+    status_id: Optional[int]
+    taper_type_id: Optional[int]
+    straightness_type_id: Optional[int]
+    species: Dict[str, int]  # lower-case scientific, common name or alias -> SpeciesID
+
+
+def load_lookups(cur, location: Optional[str], location_id: Optional[int]) -> Lookups:
+    if location_id is None:
+        cur.execute("SELECT LocationID FROM shared.Locations WHERE LocationName = %s", (location,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Location {location!r} does not exist; pass --location or --location-id")
+        location_id = row[0]
+
+    def one(query: str):
+        cur.execute(query)
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    cur.execute("SELECT SpeciesID, ScientificName, CommonName FROM shared.Species")
+    species: Dict[str, int] = {}
+    for species_id, scientific, common in cur.fetchall():
+        species[scientific.lower()] = species_id
+        if common:
+            species.setdefault(common.lower(), species_id)
+    for alias, scientific in SPECIES_ALIASES.items():
+        if scientific.lower() in species:
+            species.setdefault(alias, species[scientific.lower()])
+
+    return Lookups(
+        location_id,
+        one("SELECT VariantTypeID FROM shared.VariantTypes WHERE VariantTypeName = 'manual'"),
+        one("SELECT TreeStatusID FROM trees.TreeStatus WHERE TreeStatusName = 'healthy'"),
+        one("SELECT TaperTypeID FROM trees.TaperTypes WHERE TaperTypeName = 'Paraboloid'"),
+        one("SELECT StraightnessTypeID FROM trees.StraightnessTypes WHERE StraightnessName = 'Straight'"),
+        species,
+    )
+
+
+class Tree(NamedTuple):
+    species_id: Optional[int]
+    height_m: Optional[float]
+    lon: float
+    lat: float
+    dbh_cm: Optional[float]
+    notes: str
+
+
+def _rounded(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def read_file(path: str, fmt: Format, srid: int, lookups: Lookups, batch_rows: int) -> Tuple[Dict[str, Tree], Dict[str, int]]:
+    """Last row per key, with species resolved; also counts of skipped rows and unknown species"""
+    trees: Dict[str, Tree] = {}
+    stats = {"rows": 0, "skipped": 0, "duplicates": 0, "unknown_species": 0}
+    for batch in read_batches(path, fmt, srid, batch_rows):
+        stats["rows"] += len(batch.keys)
+        species_ids = [lookups.species.get(name) if name else None for name in batch.species]
+        valid = ~(np.isnan(batch.lon) | np.isnan(batch.lat))
+        for i, key in enumerate(batch.keys):
+            # Rows without species or position are skipped, as in the init import
+            if not valid[i] or batch.species[i] is None:
+                stats["skipped"] += 1
+                continue
+            if species_ids[i] is None:
+                stats["unknown_species"] += 1
+            if key in trees:
+                stats["duplicates"] += 1
+            dbh = _rounded(batch.dbh_cm[i])
+            trees[key] = Tree(
+                species_ids[i],
+                _rounded(batch.height_m[i]),
+                float(batch.lon[i]),
+                float(batch.lat[i]),
+                dbh if dbh and dbh > 0 else None,
+                batch.notes[i],
+            )
+    return trees, stats
+
+
+def existing_trees(cur, location_id: int) -> Dict[str, Tuple[int, Tree]]:
+    cur.execute(
+        """
+        SELECT t.SourceKey, t.VariantID, t.SpeciesID, t.Height_m, ST_X(t.Position), ST_Y(t.Position),
+               s.DBH_cm, t.FieldNotes
+        FROM trees.Trees t
+        LEFT JOIN trees.Stems s ON s.TreeVariantID = t.VariantID AND s.StemNumber = 1
+        WHERE t.LocationID = %s AND t.SourceKey IS NOT NULL
+    """,
+        (location_id,),
+    )
+    return {
+        key: (variant_id, Tree(species, _float(height), lon, lat, _float(dbh), notes or ""))
+        for key, variant_id, species, height, lon, lat, dbh, notes in cur.fetchall()
+    }
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def changed(old: Tree, new: Tree) -> bool:
+    return (
+        old.species_id != new.species_id
+        or old.height_m != new.height_m
+        or old.dbh_cm != new.dbh_cm
+        or abs(old.lon - new.lon) > POSITION_TOLERANCE_DEG
+        or abs(old.lat - new.lat) > POSITION_TOLERANCE_DEG
+    )
+
+
+def point_ewkt(lon: float, lat: float) -> str:
+    return f"SRID=4326;POINT({lon:.8f} {lat:.8f})"
+
+
+def insert_trees(cur, fmt: Format, lookups: Lookups, new: Dict[str, Tree]) -> int:
+    """COPY new trees and their main stems; returns stems written"""
+    first_id = reserve_ids(cur, "trees.Trees", "VariantID", len(new))
+    keys = list(new)
+    copy_rows(
+        cur,
+        "trees.Trees",
+        ["VariantID", "LocationID", "VariantTypeID", "SpeciesID", "TreeStatusID", "Height_m",
+         "Position", "FieldNotes", "CreatedBy", "SourceKey"],
+        (
+            (first_id + i, lookups.location_id, lookups.variant_type_id, new[k].species_id,
+             lookups.status_id, new[k].height_m, point_ewkt(new[k].lon, new[k].lat),
+             new[k].notes, fmt.created_by, k)
+            for i, k in enumerate(keys)
+        ),
+    )
+    stems = [
+        (first_id + i, 1, lookups.taper_type_id, lookups.straightness_type_id,
+         new[k].dbh_cm, new[k].height_m)
+        for i, k in enumerate(keys)
+        if new[k].dbh_cm is not None
+    ]
+    copy_rows(
+        cur,
+        "trees.Stems",
+        ["TreeVariantID", "StemNumber", "TaperTypeID", "StraightnessTypeID", "DBH_cm", "StemHeight_m"],
+        stems,
+    )
+    return len(stems)
+
+
+def update_trees(cur, fmt: Format, lookups: Lookups, updates: List[Tuple[int, Tree]]):
+    """Apply changed rows with one UPDATE per table"""
+    cur.execute(
+        """
+        CREATE TEMP TABLE changed_trees (
+            VariantID INTEGER PRIMARY KEY,
+            SpeciesID INTEGER,
+            Height_m NUMERIC(6, 2),
+            Position extensions.GEOMETRY(Point, 4326),
+            DBH_cm NUMERIC(6, 2),
+            FieldNotes TEXT
+        ) ON COMMIT DROP
+    """
+    )
+    copy_rows(
+        cur,
+        "changed_trees",
+        ["VariantID", "SpeciesID", "Height_m", "Position", "DBH_cm", "FieldNotes"],
+        (
+            (variant_id, t.species_id, t.height_m, point_ewkt(t.lon, t.lat), t.dbh_cm, t.notes)
+            for variant_id, t in updates
+        ),
+    )
+    cur.execute(
+        """
+        UPDATE trees.Trees t
+        SET SpeciesID = c.SpeciesID,
+            Height_m = c.Height_m,
+            Position = c.Position,
+            FieldNotes = c.FieldNotes,
+            UpdatedBy = %s
+        FROM changed_trees c
+        WHERE t.VariantID = c.VariantID
+    """,
+        (fmt.created_by,),
+    )
+    cur.execute(
+        """
+        UPDATE trees.Stems s
+        SET DBH_cm = c.DBH_cm, StemHeight_m = c.Height_m
+        FROM changed_trees c
+        WHERE s.TreeVariantID = c.VariantID AND s.StemNumber = 1 AND c.DBH_cm IS NOT NULL
+    """
+    )
+    cur.execute(
+        """
+        INSERT INTO trees.Stems (TreeVariantID, StemNumber, TaperTypeID, StraightnessTypeID, DBH_cm, StemHeight_m)
+        SELECT c.VariantID, 1, %s, %s, c.DBH_cm, c.Height_m
+        FROM changed_trees c
+        WHERE c.DBH_cm IS NOT NULL
+        ON CONFLICT (TreeVariantID, StemNumber) DO NOTHING
+    """,
+        (lookups.taper_type_id, lookups.straightness_type_id),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load an EcoSense or Mathisle inventory CSV incrementally")
+    parser.add_argument("path", help="CSV export")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="Export format (default: from the header)")
+    parser.add_argument("--location", help="LocationName of the plot (default: the format's plot)")
+    parser.add_argument("--location-id", type=int, help="LocationID of the plot")
+    parser.add_argument("--srid", type=int, default=32632, help="UTM EPSG code of x/y columns")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="CSV rows per batch")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    parser.add_argument("--dry-run", action="store_true", help="Compare with the database, without writing")
+    args = parser.parse_args()
+
+    with open(args.path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    fmt = FORMATS[args.format or detect_format(header)]
+
+    started = time.perf_counter()
+    conn = connect(args.dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            lookups = load_lookups(cur, args.location or fmt.location, args.location_id)
+            trees, stats = read_file(args.path, fmt, args.srid, lookups, args.batch_rows)
+            existing = existing_trees(cur, lookups.location_id)
+
+            new = {k: t for k, t in trees.items() if k not in existing}
+            updates = [
+                (existing[k][0], t) for k, t in trees.items() if k in existing and changed(existing[k][1], t)
+            ]
+            logger.info(
+                f"📄 {stats['rows']:,} rows ({fmt.name}): {len(trees):,} trees, {stats['duplicates']:,} repeated keys, "
+                f"{stats['skipped']:,} without species or position, {stats['unknown_species']:,} unknown species"
+            )
+            logger.info(
+                f"🌲 {len(new):,} new, {len(updates):,} changed, "
+                f"{len(trees) - len(new) - len(updates):,} unchanged, "
+                f"{len(set(existing) - set(trees)):,} only in the database"
+            )
+            if args.dry_run:
+                conn.rollback()
+                return
+            stems = insert_trees(cur, fmt, lookups, new) if new else 0
+            if updates:
+                update_trees(cur, fmt, lookups, updates)
+        logger.info(
+            f"✅ Inserted {len(new):,} trees ({stems:,} stems), updated {len(updates):,} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
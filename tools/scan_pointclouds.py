@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+LAS/LAZ/PLY header scanner that catalogues point clouds in pointclouds.PointClouds
+
+Only the file headers are read, with byte-range requests against S3 (the MinIO
+store from docker-compose.s3.yml by default) or from the local filesystem:
+
+  LAS/LAZ   public header block (LAS 1.0-1.4) and the VLRs that follow it, for
+            point count, bounds, creation date, system identifier and CRS
+            (GeoTIFF keys or OGC WKT). For LAZ the chunk table pointer and
+            chunk table header are read as well, so truncated uploads are
+            reported instead of catalogued.
+  PLY       text header, for the vertex count (no bounds)
+
+A few kilobytes per file are fetched, so thousands of scans can be catalogued
+without downloading point data. Files are scanned by a thread pool, then
+written in one statement: bounds are reprojected to EPSG:4326 with ST_Transform
+and rows are upserted on FilePath. Existing rows keep their location, name and
+variant type; PointCount, ScanBounds, FileSizeMB and ScanDate are refreshed.
+
+New rows are assigned to --location-id, or else to the plot whose boundary
+overlaps the scan bounds the most. Files with no matching plot are skipped.
+
+Usage:
+  python tools/scan_pointclouds.py s3://xr-forests-pointclouds/plot-a/
+  python tools/scan_pointclouds.py s3://stub/scans/ --location-id 3 --workers 64
+  python tools/scan_pointclouds.py /mnt/scans --s3-prefix s3://xr-forests-pointclouds/scans
+  python tools/scan_pointclouds.py s3://stub/ --dry-run
+"""
+
+import argparse
+import logging
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from db import connect, copy_rows
+from storage import DEFAULT_ENDPOINT, s3_client, split_uri
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (".las", ".laz", ".ply")
+# First request per file; covers the header and the usual VLRs
+HEAD_BYTES = 64 * 1024
+# Files whose VLRs run past this are not scanned further
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+DEFAULT_SRID = 32632
+
+# PointClouds.FilePath CHECK constraint
+S3_URI = re.compile(r"^s3://[a-z0-9][a-z0-9\-]*[a-z0-9]/.*\.(las|laz|ply)$")
+
+LAS_HEADER = struct.Struct("<4sHH16sBB32s32sHHHLLBHL20s12d")
+VLR_HEADER = struct.Struct("<H16sHH32s")
+GEOKEY_PROJECTED_CS = 3072
+GEOKEY_GEOGRAPHIC_CS = 2048
+EPSG_AUTHORITY = re.compile(r'(?:AUTHORITY|ID)\[\s*"EPSG"\s*,\s*"?(\d+)"?\s*\]')
+
+
+class ScanError(ValueError):
+    """The file is not a readable LAS/LAZ/PLY file"""
+
+
+class Header(NamedTuple):
+    uri: str
+    point_count: int
+    size_bytes: int
+    scan_date: Optional[date]
+    system: Optional[str]
+    bounds: Optional[Tuple[float, float, float, float]]  # min x, min y, max x, max y
+    srid: Optional[int]
+
+
+# --- Storage ---------------------------------------------------------------
+
+
+class LocalStore:
+    """Range reads from files under root, addressed by their S3 URI below prefix"""
+
+    def __init__(self, root: str, prefix: str):
+        self.root = os.path.abspath(root)
+        self.prefix = prefix.rstrip("/")
+
+    def list(self) -> Iterator[Tuple[str, int]]:
+        if os.path.isfile(self.root):
+            yield self.prefix + "/" + os.path.basename(self.root), os.path.getsize(self.root)
+            return
+        for directory, _, files in os.walk(self.root):
+            for name in sorted(files):
+                if name.lower().endswith(EXTENSIONS):
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    yield f"{self.prefix}/{relative}", os.path.getsize(path)
+
+    def _path(self, uri: str) -> str:
+        relative = uri[len(self.prefix) + 1:]
+        if os.path.isfile(self.root):
+            return self.root
+        return os.path.join(self.root, *relative.split("/"))
+
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        with open(self._path(uri), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class S3Store:
+    """Range reads with GetObject; one client is shared by all worker threads"""
+
+    def __init__(self, uri: str, endpoint: Optional[str], workers: int):
+        self.bucket, self.prefix = split_uri(uri)
+        self.client = s3_client(endpoint, workers)
+
+    def list(self) -> Iterator[Tuple[str, int]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                if item["Key"].lower().endswith(EXTENSIONS):
+                    yield f"s3://{self.bucket}/{item['Key']}", item["Size"]
+
+    def read(self, uri: str, offset: int, length: int) -> bytes:
+        key = uri[len(f"s3://{self.bucket}/"):]
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}"
+        )
+        return response["Body"].read()
+
+
+# --- Header parsing --------------------------------------------------------
+
+
+def _epsg_from_geokeys(payload: bytes) -> Optional[int]:
+    keys = struct.unpack(f"<{len(payload) // 2}H", payload[: len(payload) // 2 * 2])
+    if len(keys) < 4:
+        return None
+    found: Dict[int, int] = {}
+    for i in range(keys[3]):
+        entry = keys[4 + 4 * i: 8 + 4 * i]
+        if len(entry) < 4:
+            break
+        key_id, location, _, value = entry
+        # Location 0 means the value is stored inline
+        if location == 0:
+            found[key_id] = value
+    code = found.get(GEOKEY_PROJECTED_CS) or found.get(GEOKEY_GEOGRAPHIC_CS)
+    # 32767 is "user defined"
+    return code if code and code != 32767 else None
+
+
+def _epsg_from_wkt(payload: bytes) -> Optional[int]:
+    wkt = payload.rstrip(b"\x00").decode("utf-8", errors="replace").strip()
+    # In a compound CRS only the horizontal part matters; its authority is the last one inside it
+    for kind in ("PROJCS[", "PROJCRS[", "GEOGCS[", "GEOGCRS["):
+        start = wkt.find(kind)
+        if start < 0:
+            continue
+        depth = 0
+        for end in range(start, len(wkt)):
+            if wkt[end] == "[":
+                depth += 1
+            elif wkt[end] == "]":
+                depth -= 1
+                if depth == 0:
+                    break
+        codes = EPSG_AUTHORITY.findall(wkt[start: end + 1])
+        if codes:
+            return int(codes[-1])
+    return None
+
+
+def _text(raw: bytes) -> str:
+    return raw.split(b"\x00", 1)[0].decode("ascii", errors="replace").strip()
+
+
+def parse_las(store, uri: str, size: int, head: bytes) -> Header:
+    """Header of a LAS or LAZ file; head holds at least the first HEAD_BYTES (or the whole file)"""
+    if len(head) < LAS_HEADER.size or head[:4] != b"LASF":
+        raise ScanError("not a LAS/LAZ file")
+    (
+        _, _, _, _, major, minor, system, _, day, year, header_size, point_offset,
+        vlr_count, point_format, _, legacy_count, _, *doubles,
+    ) = LAS_HEADER.unpack_from(head)
+    _, _, _, _, _, _, max_x, min_x, max_y, min_y, _, _ = doubles
+
+    point_count = legacy_count
+    if (major, minor) >= (1, 4) and len(head) >= 255:
+        point_count = struct.unpack_from("<Q", head, 247)[0] or legacy_count
+
+    if point_offset + 8 > len(head) and point_offset + 8 <= size:
+        if point_offset + 8 > MAX_HEADER_BYTES:
+            raise ScanError(f"VLRs extend to byte {point_offset:,}")
+        head = store.read(uri, 0, point_offset + 8)
+
+    srid = None
+    laszip_chunk_size = None
+    position = header_size
+    for _ in range(vlr_count):
+        if position + VLR_HEADER.size > min(point_offset, len(head)):
+            break
+        _, user_id, record_id, length, _ = VLR_HEADER.unpack_from(head, position)
+        payload = head[position + VLR_HEADER.size: position + VLR_HEADER.size + length]
+        user_id = _text(user_id)
+        if user_id == "LASF_Projection" and record_id == 34735:
+            srid = srid or _epsg_from_geokeys(payload)
+        elif user_id == "LASF_Projection" and record_id == 2112:
+            srid = _epsg_from_wkt(payload) or srid
+        elif user_id == "laszip encoded" and record_id == 22204 and len(payload) >= 16:
+            laszip_chunk_size = struct.unpack_from("<I", payload, 12)[0]
+        position += VLR_HEADER.size + length
+
+    # Bit 7 (and bit 6 in some writers) of the point format marks compressed data
+    if point_format & 0xC0 or laszip_chunk_size is not None:
+        _check_chunk_table(store, uri, size, head, point_offset, point_count, laszip_chunk_size)
+
+    scan_date = None
+    if year and day:
+        try:
+            scan_date = date(year, 1, 1) + timedelta(days=day - 1)
+        except (ValueError, OverflowError):
+            pass
+
+    bounds = None
+    if point_count and min_x <= max_x and min_y <= max_y:
+        bounds = (min_x, min_y, max_x, max_y)
+    return Header(uri, point_count, size, scan_date, _text(system) or None, bounds, srid)
+
+
+def _check_chunk_table(store, uri, size, head, point_offset, point_count, chunk_size):
+    """Read the LAZ chunk table header; raises ScanError when it is missing or inconsistent"""
+    if point_count == 0:
+        return
+    if point_offset + 8 > size:
+        raise ScanError("truncated before point data")
+    (table_offset,) = struct.unpack_from("<q", head, point_offset)
+    if table_offset == -1:
+        # Streaming writers store the chunk table offset in the last 8 bytes of the file
+        (table_offset,) = struct.unpack("<q", store.read(uri, size - 8, 8))
+    if not point_offset + 8 <= table_offset <= size - 8:
+        raise ScanError(f"chunk table offset {table_offset:,} outside the file (truncated upload?)")
+    version, chunks = struct.unpack("<II", store.read(uri, table_offset, 8))
+    if version != 0 or chunks == 0:
+        raise ScanError(f"unreadable chunk table (version {version}, {chunks} chunks)")
+    # Fixed-size chunks bound the point count; 0xFFFFFFFF marks variable-size chunks
+    if chunk_size and chunk_size != 0xFFFFFFFF and point_count > chunks * chunk_size:
+        raise ScanError(f"{point_count:,} points do not fit in {chunks:,} chunks of {chunk_size:,}")
+
+
+def parse_ply(uri: str, size: int, head: bytes) -> Header:
+    end = head.find(b"end_header")
+    if not head.startswith(b"ply") or end < 0:
+        raise ScanError("not a PLY file, or header longer than the first read")
+    point_count = 0
+    for line in head[:end].decode("ascii", errors="replace").splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "element" and parts[1] == "vertex":
+            point_count = int(parts[2])
+    return Header(uri, point_count, size, None, None, None, None)
+
+
+def scan(store, uri: str, size: int) -> Header:
+    head = store.read(uri, 0, min(HEAD_BYTES, size))
+    if uri.lower().endswith(".ply"):
+        return parse_ply(uri, size, head)
+    return parse_las(store, uri, size, head)
+
+
+def scan_all(store, files: List[Tuple[str, int]], workers: int) -> Tuple[List[Header], int]:
+    """Scan files in parallel; returns the headers and the number of files that failed"""
+    headers: List[Header] = []
+    failed = 0
+
+    def task(item: Tuple[str, int]):
+        uri, size = item
+        try:
+            return scan(store, uri, size)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (uri, _), result in zip(files, pool.map(task, files)):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.warning(f"⚠️  {uri}: {result}")
+            else:
+                headers.append(result)
+            done = len(headers) + failed
+            if done % 1000 == 0:
+                logger.info(f"📄 Scanned {done:,}/{len(files):,} files")
+    return headers, failed
+
+
+# --- Database --------------------------------------------------------------
+
+
+def variant_name(uri: str) -> str:
+    return os.path.splitext(uri.rsplit("/", 1)[-1])[0][:300]
+
+
+def upsert(cur, headers: List[Header], default_srid: int, location_id: Optional[int]) -> Tuple[int, int]:
+    """Write the headers to pointclouds.PointClouds; returns (rows changed, files without a plot)"""
+    cur.execute(
+        """
+        CREATE TEMP TABLE scan_headers (
+            FilePath TEXT PRIMARY KEY,
+            VariantName VARCHAR(300),
+            PointCount BIGINT,
+            FileSizeMB NUMERIC(12, 2),
+            ScanDate TIMESTAMPTZ,
+            SensorModel VARCHAR(200),
+            MinX DOUBLE PRECISION,
+            MinY DOUBLE PRECISION,
+            MaxX DOUBLE PRECISION,
+            MaxY DOUBLE PRECISION,
+            SRID INTEGER
+        ) ON COMMIT DROP
+    """
+    )
+    copy_rows(
+        cur,
+        "scan_headers",
+        ["FilePath", "VariantName", "PointCount", "FileSizeMB", "ScanDate", "SensorModel",
+         "MinX", "MinY", "MaxX", "MaxY", "SRID"],
+        (
+            (
+                h.uri,
+                variant_name(h.uri),
+                h.point_count,
+                round(h.size_bytes / (1024 * 1024), 2),
+                datetime(h.scan_date.year, h.scan_date.month, h.scan_date.day, tzinfo=timezone.utc)
+                if h.scan_date else None,
+                h.system[:200] if h.system else None,
+                *(h.bounds or (None, None, None, None)),
+                h.srid or default_srid,
+            )
+            for h in headers
+        ),
+    )
+    # The envelope is densified before reprojection so the WGS84 outline follows its curved edges
+    cur.execute(
+        """
+        WITH scans AS (
+            SELECT h.*,
+                   ST_Transform(
+                       ST_Segmentize(
+                           ST_MakeEnvelope(h.MinX, h.MinY, h.MaxX, h.MaxY, h.SRID),
+                           GREATEST(h.MaxX - h.MinX, h.MaxY - h.MinY, 1e-9) / 16
+                       ),
+                       4326
+                   ) AS Bounds
+            FROM scan_headers h
+        ),
+        located AS (
+            SELECT s.*, COALESCE(%(location_id)s, existing.LocationID, plot.LocationID) AS LocationID
+            FROM scans s
+            LEFT JOIN pointclouds.PointClouds existing ON existing.FilePath = s.FilePath
+            LEFT JOIN LATERAL (
+                SELECT l.LocationID
+                FROM shared.Locations l
+                WHERE l.Boundary && s.Bounds AND ST_Intersects(l.Boundary, s.Bounds)
+                ORDER BY ST_Area(ST_Intersection(l.Boundary, s.Bounds)) DESC
+                LIMIT 1
+            ) plot ON TRUE
+        )
+        INSERT INTO pointclouds.PointClouds (
+            LocationID, VariantTypeID, VariantName, ScanDate, SensorModel,
+            ScanBounds, FilePath, PointCount, FileSizeMB, CreatedBy
+        )
+        SELECT LocationID,
+               (SELECT VariantTypeID FROM shared.VariantTypes WHERE VariantTypeName = 'original'),
+               VariantName, ScanDate, SensorModel, Bounds, FilePath, PointCount, FileSizeMB,
+               'scan_pointclouds'
+        FROM located
+        WHERE LocationID IS NOT NULL
+        ON CONFLICT (FilePath) DO UPDATE SET
+            PointCount = EXCLUDED.PointCount,
+            FileSizeMB = EXCLUDED.FileSizeMB,
+            ScanBounds = COALESCE(EXCLUDED.ScanBounds, PointClouds.ScanBounds),
+            ScanDate = COALESCE(EXCLUDED.ScanDate, PointClouds.ScanDate),
+            SensorModel = COALESCE(PointClouds.SensorModel, EXCLUDED.SensorModel),
+            UpdatedAt = NOW(),
+            UpdatedBy = 'scan_pointclouds'
+        WHERE (PointClouds.PointCount, PointClouds.FileSizeMB, PointClouds.ScanBounds, PointClouds.ScanDate)
+              IS DISTINCT FROM
+              (EXCLUDED.PointCount, EXCLUDED.FileSizeMB,
+               COALESCE(EXCLUDED.ScanBounds, PointClouds.ScanBounds),
+               COALESCE(EXCLUDED.ScanDate, PointClouds.ScanDate))
+    """,
+        {"location_id": location_id},
+    )
+    written = cur.rowcount
+    cur.execute(
+        """
+        SELECT COUNT(*) FROM scan_headers h
+        WHERE NOT EXISTS (SELECT 1 FROM pointclouds.PointClouds p WHERE p.FilePath = h.FilePath)
+    """
+    )
+    return written, cur.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalogue LAS/LAZ/PLY files in pointclouds.PointClouds")
+    parser.add_argument("source", help="s3://bucket/prefix, or a local file or directory")
+    parser.add_argument("--s3-prefix", help="S3 URI under which a local source is stored (required for local sources)")
+    parser.add_argument(
+        "--endpoint",
+        default=DEFAULT_ENDPOINT,
+        help="S3 endpoint (default: S3_ENDPOINT_URL or the docker compose MinIO)",
+    )
+    parser.add_argument("--location-id", type=int, help="Plot for new rows (default: plot overlapping the scan)")
+    parser.add_argument("--srid", type=int, default=DEFAULT_SRID, help="EPSG code for files without CRS records")
+    parser.add_argument("--workers", type=int, default=32, help="Parallel header reads")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    parser.add_argument("--dry-run", action="store_true", help="Scan and report, without writing")
+    args = parser.parse_args()
+
+    if args.source.startswith("s3://"):
+        store = S3Store(args.source, args.endpoint, args.workers)
+    else:
+        if not args.s3_prefix:
+            parser.error("--s3-prefix is required for local sources")
+        store = LocalStore(args.source, args.s3_prefix)
+
+    started = time.perf_counter()
+    files = []
+    for uri, size in store.list():
+        if S3_URI.match(uri):
+            files.append((uri, size))
+        else:
+            logger.warning(f"⚠️  {uri}: not a valid PointClouds FilePath, skipped")
+    logger.info(f"🔎 {len(files):,} point cloud files under {args.source}")
+
+    headers, failed = scan_all(store, files, args.workers)
+    points = sum(h.point_count for h in headers)
+    logger.info(
+        f"📄 Read {len(headers):,} headers ({points:,} points, {failed:,} failed) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    if args.dry_run or not headers:
+        return
+
+    conn = connect(args.dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            written, unplaced = upsert(cur, headers, args.srid, args.location_id)
+    finally:
+        conn.close()
+    if unplaced:
+        logger.warning(f"⚠️  {unplaced:,} files overlap no plot; rerun with --location-id")
+    logger.info(f"✅ Inserted or updated {written:,} point clouds in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
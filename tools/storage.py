@@ -0,0 +1,39 @@
+"""
+Shared object storage helpers for the command-line tools
+
+Clients default to the MinIO of docker-compose.s3.yml; AWS_ACCESS_KEY_ID,
+AWS_SECRET_ACCESS_KEY, AWS_DEFAULT_REGION and S3_ENDPOINT_URL override it.
+boto3 is imported lazily so tools that never touch S3 do not need it.
+"""
+
+import os
+from typing import Optional, Tuple
+
+DEFAULT_ENDPOINT = os.getenv("S3_ENDPOINT_URL", "http://localhost:9000")
+
+
+def s3_client(endpoint: Optional[str] = DEFAULT_ENDPOINT, max_connections: int = 10):
+    """S3 client with path-style addressing; safe to share between threads"""
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID", "supa-storage"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY", "secret1234"),
+        region_name=os.getenv("AWS_DEFAULT_REGION", "stub"),
+        config=Config(
+            max_pool_connections=max_connections,
+            s3={"addressing_style": "path"},
+            retries={"max_attempts": 5, "mode": "standard"},
+        ),
+    )
+
+
+def split_uri(uri: str) -> Tuple[str, str]:
+    """s3://bucket/key -> (bucket, key)"""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
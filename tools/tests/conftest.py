@@ -0,0 +1,6 @@
+"""Shared test setup: the tools are scripts that import each other by plain name"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,66 @@
+import io
+
+from db import LineStream, copy_line, copy_rows
+
+
+class CopyCursor:
+    """Records what copy_expert would send to the server"""
+
+    def copy_expert(self, sql, stream, size):
+        self.sql = sql
+        self.data = b"".join(iter(lambda: stream.read(size), b""))
+
+
+def read_all(stream: io.RawIOBase, size: int) -> bytes:
+    parts = []
+    target = bytearray(size)
+    while True:
+        n = stream.readinto(target)
+        if not n:
+            return b"".join(parts)
+        parts.append(bytes(target[:n]))
+
+
+def test_line_stream_empty():
+    assert read_all(LineStream([]), 16) == b""
+
+
+def test_line_stream_small_reads_split_lines_and_characters():
+    lines = [f"{i}\tBaden-Württemberg\n" for i in range(10)]
+    expected = "".join(lines).encode("utf-8")
+    for size in (1, 3, 7, 64, 1 << 16):
+        assert read_all(LineStream(lines), size) == expected
+
+
+def test_line_stream_spans_many_chunks():
+    count = LineStream.LINES_PER_CHUNK * 3 + 5
+    lines = (f"{i}\n" for i in range(count))
+    data = read_all(LineStream(lines), 1000)
+    assert data.decode().splitlines() == [str(i) for i in range(count)]
+
+
+def test_line_stream_is_lazy():
+    consumed = []
+
+    def lines():
+        for i in range(LineStream.LINES_PER_CHUNK * 4):
+            consumed.append(i)
+            yield "x\n"
+
+    stream = LineStream(lines())
+    stream.readinto(bytearray(10))
+    assert len(consumed) <= LineStream.LINES_PER_CHUNK + 1
+
+
+def test_copy_value_escapes():
+    assert copy_line([1, None, True, "a\tb\\c\nd"]) == "1\t\\N\tt\ta\\tb\\\\c\\nd\n"
+
+
+def test_copy_rows_streams_all_rows():
+    cur = CopyCursor()
+    rows = [(i, f"tree {i}", None) for i in range(10_000)]
+    copy_rows(cur, "trees.Trees", ["TreeID", "Label", "Height_m"], rows)
+    assert cur.sql == (
+        "COPY trees.Trees (TreeID, Label, Height_m) FROM STDIN WITH (FORMAT text)"
+    )
+    assert cur.data.decode() == "".join(copy_line(row) for row in rows)
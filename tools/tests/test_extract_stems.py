@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from extract_stems import CLUSTER_CELL_M, fit_circles, label_clusters
+
+
+def ring(cx: float, cy: float, radius: float, count: int, start=0.0, stop=2 * np.pi, noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    angle = np.linspace(start, stop, count, endpoint=False)
+    r = radius + rng.normal(0, noise, count)
+    return cx + r * np.cos(angle), cy + r * np.sin(angle)
+
+
+def batch(*rings):
+    x = np.concatenate([r[0] for r in rings])
+    y = np.concatenate([r[1] for r in rings])
+    cluster = np.concatenate([np.full(len(r[0]), i) for i, r in enumerate(rings)])
+    return x, y, cluster
+
+
+def test_fit_circles_recovers_several_stems():
+    stems = fit_circles(batch(
+        ring(412_000.0, 5_316_000.0, 0.15, 200, noise=0.002, seed=1),
+        ring(412_010.0, 5_316_003.0, 0.40, 300, noise=0.002, seed=2),
+    ))
+    assert stems.x == pytest.approx([412_000.0, 412_010.0], abs=0.005)
+    assert stems.y == pytest.approx([5_316_000.0, 5_316_003.0], abs=0.005)
+    assert stems.dbh_cm == pytest.approx([30.0, 80.0], abs=0.5)
+    assert np.all(stems.rmse_cm < 0.5)
+    assert stems.coverage_deg.tolist() == [360.0, 360.0]
+    assert stems.points.tolist() == [200, 300]
+
+
+def test_fit_circles_drops_outliers():
+    x, y = ring(5.0, 5.0, 0.2, 200, noise=0.002)
+    # A branch sticking out of the stem
+    x = np.r_[x, np.linspace(5.25, 5.5, 10)]
+    y = np.r_[y, np.full(10, 5.0)]
+    stems = fit_circles((x, y, np.zeros(len(x), dtype=np.int64)))
+    assert stems.dbh_cm[0] == pytest.approx(40.0, abs=0.5)
+    assert stems.points[0] == 200
+
+
+def test_fit_circles_reports_partial_coverage():
+    stems = fit_circles(batch(ring(0.0, 0.0, 0.25, 100, stop=np.pi)))
+    assert stems.dbh_cm[0] == pytest.approx(50.0, abs=0.1)
+    assert stems.coverage_deg[0] == pytest.approx(180.0, abs=360 / 36)
+
+
+def test_fit_circles_tolerates_degenerate_cluster():
+    x = np.linspace(0.0, 0.3, 50)
+    stems = fit_circles((x, np.zeros(50), np.zeros(50, dtype=np.int64)))
+    assert np.all(np.isfinite(stems.dbh_cm))
+
+
+def test_label_clusters_separates_stems():
+    x = np.r_[ring(1.0, 1.0, 0.2, 100)[0], ring(3.0, 1.0, 0.2, 100)[0]]
+    y = np.r_[ring(1.0, 1.0, 0.2, 100)[1], ring(3.0, 1.0, 0.2, 100)[1]]
+    labels = label_clusters(x, y)
+    assert len(np.unique(labels[:100])) == 1
+    assert len(np.unique(labels[100:])) == 1
+    assert labels[0] != labels[100]
+
+
+def test_label_clusters_connects_diagonal_cells():
+    step = CLUSTER_CELL_M
+    x = np.array([0.5, 1.5, 3.5]) * step
+    y = np.array([0.5, 1.5, 0.5]) * step
+    labels = label_clusters(x, y)
+    assert labels[0] == labels[1] != labels[2]
+
+
+def test_label_clusters_long_chain_and_negative_coordinates():
+    # A snake through 500 cells needs many propagation rounds without pointer jumping
+    x = (np.arange(500) - 250.5) * CLUSTER_CELL_M
+    y = np.where(np.arange(500) % 2 == 0, -0.05, 0.05)
+    labels = label_clusters(x[::-1], y[::-1])
+    assert len(np.unique(labels)) == 1
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+from load_inventory import utm_to_wgs84
+
+
+def wgs84_to_utm(lon: float, lat: float, zone: int, south: bool = False):
+    """Forward Krueger series, independent of the inverse under test"""
+    a, f, k0 = 6378137.0, 1 / 298.257223563, 0.9996
+    n = f / (2 - f)
+    big_a = a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+    alpha = (n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16, 13 * n ** 2 / 48 - 3 * n ** 3 / 5, 61 * n ** 3 / 240)
+    phi, dlam = math.radians(lat), math.radians(lon - (zone * 6 - 183))
+    e = 2 * math.sqrt(n) / (1 + n)
+    t = math.sinh(math.atanh(math.sin(phi)) - e * math.atanh(e * math.sin(phi)))
+    xi = math.atan2(t, math.cos(dlam))
+    eta = math.atanh(math.sin(dlam) / math.sqrt(1 + t * t))
+    easting = eta + sum(al * math.cos(2 * j * xi) * math.sinh(2 * j * eta) for j, al in enumerate(alpha, 1))
+    northing = xi + sum(al * math.sin(2 * j * xi) * math.cosh(2 * j * eta) for j, al in enumerate(alpha, 1))
+    return 500_000 + k0 * big_a * easting, (10_000_000 if south else 0) + k0 * big_a * northing
+
+
+def test_central_meridian_on_equator():
+    lon, lat = utm_to_wgs84(np.array([500_000.0]), np.array([0.0]), 32632)
+    assert lon[0] == pytest.approx(9.0)
+    assert lat[0] == pytest.approx(0.0, abs=1e-12)
+
+
+def test_meridian_arc_at_45_degrees():
+    # Published UTM northing of 45N on a central meridian
+    lon, lat = utm_to_wgs84(np.array([500_000.0]), np.array([4_982_950.40]), 32631)
+    assert lon[0] == pytest.approx(3.0)
+    assert lat[0] == pytest.approx(45.0, abs=1e-7)
+
+
+@pytest.mark.parametrize(
+    "lon, lat, srid",
+    [
+        (7.85, 47.99, 32632),  # Freiburg
+        (6.01, 48.4, 32632),  # western edge of the zone
+        (11.9, 54.7, 32632),  # eastern edge
+        (-70.65, -33.45, 32719),  # Santiago de Chile
+    ],
+)
+def test_round_trip_is_sub_millimetre(lon, lat, srid):
+    easting, northing = wgs84_to_utm(lon, lat, srid % 100, south=srid > 32700)
+    got_lon, got_lat = utm_to_wgs84(np.array([easting]), np.array([northing]), srid)
+    # 1e-8 degrees is about a millimetre
+    assert got_lon[0] == pytest.approx(lon, abs=1e-8)
+    assert got_lat[0] == pytest.approx(lat, abs=1e-8)
+
+
+def test_vectorized():
+    easting = np.array([400_000.0, 500_000.0, 600_000.0])
+    northing = np.full(3, 5_300_000.0)
+    lon, lat = utm_to_wgs84(easting, northing, 32632)
+    assert lon.shape == lat.shape == (3,)
+    # Mirror image about the central meridian
+    assert lon[0] + lon[2] == pytest.approx(2 * 9.0)
+    assert lat[0] == pytest.approx(lat[2])
+
+
+@pytest.mark.parametrize("srid", [4326, 32600, 32661, 32700, 25832])
+def test_rejects_non_utm_srid(srid):
+    with pytest.raises(ValueError):
+        utm_to_wgs84(np.array([500_000.0]), np.array([0.0]), srid)
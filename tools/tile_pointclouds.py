@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Splits registered point clouds into LAZ tiles for partial retrieval
+
+A pointclouds.PointClouds row references one .las/.laz object. This tool
+downloads it once, streams its points in chunks and writes them into tiles:
+
+  grid     square tiles of --tile-size metres in the source CRS (Level 0)
+  octree   cube cells split until a cell holds at most --max-points points or
+           reaches --max-depth; dense parts of the scan get smaller tiles
+
+Each tile is a LAZ file (compressed in chunks, so it can be range-read on its
+own) uploaded next to the source as <source>_tiles/L<level>/<x>_<y>_<z>.laz and
+registered in pointclouds.PointCloudTiles with its point count, elevation
+range and the WGS84 extent of its points. Tiling a variant again replaces its
+tiles and removes objects that are no longer referenced.
+
+Clients then call pointclouds.tiles_for_tree(tree, buffer_m) or
+pointclouds.tiles_intersecting(geometry, buffer_m) and fetch only those tiles.
+
+Usage:
+  python tools/tile_pointclouds.py 12
+  python tools/tile_pointclouds.py 12 13 14 --tile-size 10
+  python tools/tile_pointclouds.py 12 --scheme octree --max-points 2000000
+"""
+
+import argparse
+import copy
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from db import connect, copy_rows
+from scan_pointclouds import LocalStore, scan
+from storage import DEFAULT_ENDPOINT, s3_client, split_uri
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+CHUNK_POINTS = 2_000_000
+DEFAULT_SRID = 32632
+# Octree cell coordinates are packed into one int64 key, 21 bits per axis
+MAX_OCTREE_DEPTH = 21
+
+Cell = Tuple[int, int, int, int]  # level, x, y, z
+
+
+class TileStats(NamedTuple):
+    points: int
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
+    min_z: float
+    max_z: float
+
+
+# --- Tile assignment -------------------------------------------------------
+
+
+class GridPlan:
+    """Fixed-size square tiles; every point's tile follows from its coordinates"""
+
+    scheme = "grid"
+
+    def __init__(self, mins: np.ndarray, tile_size: float):
+        self.origin = mins
+        self.tile_size = tile_size
+
+    def assign(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, List[Cell]]:
+        """(tile index per point, cells by tile index) for one chunk"""
+        ix = np.maximum(np.floor((x - self.origin[0]) / self.tile_size), 0).astype(np.int64)
+        iy = np.maximum(np.floor((y - self.origin[1]) / self.tile_size), 0).astype(np.int64)
+        keys, inverse = np.unique(ix << 32 | iy, return_inverse=True)
+        return inverse, [(0, int(k >> 32), int(k & 0xFFFFFFFF), 0) for k in keys]
+
+
+class OctreePlan:
+    """Adaptive octree: leaves hold at most max_points points, or sit at max_depth"""
+
+    scheme = "octree"
+
+    def __init__(self, mins: np.ndarray, maxs: np.ndarray, max_points: int, max_depth: int):
+        self.origin = mins
+        # Cubic root cell, slightly enlarged so the maxima fall inside the last cell
+        self.side = float(np.max(maxs - mins)) * (1 + 1e-9) or 1.0
+        self.max_points = max_points
+        self.depth = max_depth
+        self.counts: Dict[int, int] = {}
+        self.leaves: Dict[int, Cell] = {}
+
+    def _keys(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+        cells = 1 << self.depth
+        scale = cells / self.side
+        ix = np.clip(((x - self.origin[0]) * scale).astype(np.int64), 0, cells - 1)
+        iy = np.clip(((y - self.origin[1]) * scale).astype(np.int64), 0, cells - 1)
+        iz = np.clip(((z - self.origin[2]) * scale).astype(np.int64), 0, cells - 1)
+        return ix << (2 * MAX_OCTREE_DEPTH) | iy << MAX_OCTREE_DEPTH | iz
+
+    @staticmethod
+    def _unpack(key: int) -> Tuple[int, int, int]:
+        mask = (1 << MAX_OCTREE_DEPTH) - 1
+        return key >> (2 * MAX_OCTREE_DEPTH), (key >> MAX_OCTREE_DEPTH) & mask, key & mask
+
+    def count(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        """First pass: points per cell at max_depth"""
+        keys, counts = np.unique(self._keys(x, y, z), return_counts=True)
+        for key, n in zip(keys.tolist(), counts.tolist()):
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def build(self):
+        """Choose the leaf cells and map every occupied finest cell to its leaf"""
+        finest = {key: self._unpack(key) for key in self.counts}
+        per_level: List[Dict[Tuple[int, int, int], int]] = []
+        for level in range(self.depth + 1):
+            shift = self.depth - level
+            totals: Dict[Tuple[int, int, int], int] = {}
+            for key, (x, y, z) in finest.items():
+                node = (x >> shift, y >> shift, z >> shift)
+                totals[node] = totals.get(node, 0) + self.counts[key]
+            per_level.append(totals)
+
+        for key, (x, y, z) in finest.items():
+            for level in range(self.depth + 1):
+                shift = self.depth - level
+                node = (x >> shift, y >> shift, z >> shift)
+                if level == self.depth or per_level[level][node] <= self.max_points:
+                    self.leaves[key] = (level, *node)
+                    break
+
+    def assign(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, List[Cell]]:
+        keys, inverse = np.unique(self._keys(x, y, z), return_inverse=True)
+        cells = [self.leaves[k] for k in keys.tolist()]
+        # Several finest cells usually share a leaf; index by distinct leaf
+        distinct = sorted(set(cells))
+        position = {cell: i for i, cell in enumerate(distinct)}
+        return np.array([position[c] for c in cells], dtype=np.int64)[inverse], distinct
+
+
+# --- Tiling ----------------------------------------------------------------
+
+
+def tile_path(source_uri: str, cell: Cell) -> str:
+    stem = os.path.splitext(source_uri)[0]
+    level, x, y, z = cell
+    return f"{stem}_tiles/L{level}/{x}_{y}_{z}.laz"
+
+
+def spill_path(work_dir: str, cell: Cell) -> str:
+    return os.path.join(work_dir, "L{}_{}_{}_{}.points".format(*cell))
+
+
+def write_tiles(source: str, plan, work_dir: str) -> Dict[Cell, TileStats]:
+    """Split the source into one LAZ file per tile; returns the statistics per tile
+
+    The first pass appends each chunk's raw point records to an uncompressed spill
+    file per tile, opened only for the append. The second pass compresses one tile
+    at a time. Open files and compressor state stay bounded however many tiles a
+    large scan produces, at the cost of scratch space for the uncompressed points.
+    """
+    import laspy
+
+    stats: Dict[Cell, TileStats] = {}
+    with laspy.open(source) as reader:
+        header = reader.header
+        for points in reader.chunk_iterator(CHUNK_POINTS):
+            x, y, z = np.asarray(points.x), np.asarray(points.y), np.asarray(points.z)
+            tile_of_point, cells = plan.assign(x, y, z)
+            order = np.argsort(tile_of_point, kind="stable")
+            bounds = np.searchsorted(tile_of_point[order], np.arange(len(cells) + 1))
+            records = points.array[order]
+            for i, cell in enumerate(cells):
+                a, b = bounds[i], bounds[i + 1]
+                if a == b:
+                    continue
+                with open(spill_path(work_dir, cell), "ab") as f:
+                    records[a:b].tofile(f)
+                idx = order[a:b]
+                stats[cell] = _merge(stats.get(cell), x[idx], y[idx], z[idx])
+            dtype = points.array.dtype
+
+    for cell in stats:
+        spill = spill_path(work_dir, cell)
+        records = np.memmap(spill, dtype=dtype, mode="r")
+        path = os.path.join(work_dir, "L{}_{}_{}_{}.laz".format(*cell))
+        with laspy.open(path, mode="w", header=copy.deepcopy(header), do_compress=True) as writer:
+            for a in range(0, len(records), CHUNK_POINTS):
+                chunk = np.array(records[a: a + CHUNK_POINTS])
+                writer.write_points(laspy.PackedPointRecord(chunk, header.point_format))
+        del records
+        os.remove(spill)
+    return stats
+
+
+def _merge(current: Optional[TileStats], x, y, z) -> TileStats:
+    chunk = TileStats(len(x), x.min(), y.min(), x.max(), y.max(), z.min(), z.max())
+    if current is None:
+        return chunk
+    return TileStats(
+        current.points + chunk.points,
+        min(current.min_x, chunk.min_x),
+        min(current.min_y, chunk.min_y),
+        max(current.max_x, chunk.max_x),
+        max(current.max_y, chunk.max_y),
+        min(current.min_z, chunk.min_z),
+        max(current.max_z, chunk.max_z),
+    )
+
+
+def register(cur, variant_id: int, scheme: str, srid: int, tiles: List[Tuple[Cell, TileStats, str, int]]) -> List[str]:
+    """Replace the variant's rows in pointclouds.PointCloudTiles; returns FilePaths no longer used"""
+    cur.execute(
+        "SELECT FilePath FROM pointclouds.PointCloudTiles WHERE VariantID = %s FOR UPDATE",
+        (variant_id,),
+    )
+    previous = {row[0] for row in cur.fetchall()}
+    cur.execute("DELETE FROM pointclouds.PointCloudTiles WHERE VariantID = %s", (variant_id,))
+    cur.execute(
+        """
+        CREATE TEMP TABLE new_tiles (
+            Level SMALLINT, TileX INTEGER, TileY INTEGER, TileZ INTEGER,
+            PointCount BIGINT, FilePath TEXT, FileSizeMB NUMERIC(12, 2),
+            MinX DOUBLE PRECISION, MinY DOUBLE PRECISION, MaxX DOUBLE PRECISION, MaxY DOUBLE PRECISION,
+            MinZ DOUBLE PRECISION, MaxZ DOUBLE PRECISION
+        ) ON COMMIT DROP
+    """
+    )
+    copy_rows(
+        cur,
+        "new_tiles",
+        ["Level", "TileX", "TileY", "TileZ", "PointCount", "FilePath", "FileSizeMB",
+         "MinX", "MinY", "MaxX", "MaxY", "MinZ", "MaxZ"],
+        (
+            (*cell, s.points, uri, round(size / (1024 * 1024), 2),
+             s.min_x, s.min_y, s.max_x, s.max_y, s.min_z, s.max_z)
+            for cell, s, uri, size in tiles
+        ),
+    )
+    # Point extents can be a line or a single point; ST_Expand keeps them polygons
+    cur.execute(
+        """
+        INSERT INTO pointclouds.PointCloudTiles (
+            VariantID, Scheme, Level, TileX, TileY, TileZ, Bounds,
+            MinZ, MaxZ, PointCount, FilePath, FileSizeMB
+        )
+        SELECT %(variant_id)s, %(scheme)s, Level, TileX, TileY, TileZ,
+               ST_Transform(ST_Expand(ST_MakeEnvelope(MinX, MinY, MaxX, MaxY, %(srid)s), 0.001), 4326),
+               MinZ, MaxZ, PointCount, FilePath, FileSizeMB
+        FROM new_tiles
+    """,
+        {"variant_id": variant_id, "scheme": scheme, "srid": srid},
+    )
+    return sorted(previous - {uri for _, _, uri, _ in tiles})
+
+
+def tile_variant(conn, client, variant_id: int, args) -> int:
+    """Tile one point cloud variant; returns the number of tiles"""
+    import laspy
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT FilePath FROM pointclouds.PointClouds WHERE VariantID = %s", (variant_id,))
+        row = cur.fetchone()
+    conn.rollback()
+    if row is None:
+        raise ValueError(f"Point cloud variant {variant_id} does not exist")
+    source_uri = row[0]
+    if source_uri.lower().endswith(".ply"):
+        raise ValueError(f"{source_uri}: only LAS/LAZ clouds can be tiled")
+    bucket, key = split_uri(source_uri)
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        source = os.path.join(work_dir, "source" + os.path.splitext(key)[1].lower())
+        client.download_file(bucket, key, source)
+        logger.info(
+            f"⬇️  {source_uri}: {os.path.getsize(source) / 1024 ** 2:,.0f} MB "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        header = scan(LocalStore(source, ""), source_uri, os.path.getsize(source))
+        srid = header.srid or args.srid
+
+        with laspy.open(source) as reader:
+            mins, maxs = np.array(reader.header.mins), np.array(reader.header.maxs)
+            if args.scheme == "grid":
+                plan = GridPlan(mins, args.tile_size)
+            else:
+                plan = OctreePlan(mins, maxs, args.max_points, args.max_depth)
+                for points in reader.chunk_iterator(CHUNK_POINTS):
+                    plan.count(np.asarray(points.x), np.asarray(points.y), np.asarray(points.z))
+                plan.build()
+
+        tiles_dir = os.path.join(work_dir, "tiles")
+        os.makedirs(tiles_dir)
+        stats = write_tiles(source, plan, tiles_dir)
+        logger.info(
+            f"🧩 {source_uri}: {sum(s.points for s in stats.values()):,} points in "
+            f"{len(stats):,} {plan.scheme} tiles after {time.perf_counter() - started:.1f}s"
+        )
+
+        def upload(cell: Cell) -> Tuple[Cell, TileStats, str, int]:
+            path = os.path.join(tiles_dir, "L{}_{}_{}_{}.laz".format(*cell))
+            uri = tile_path(source_uri, cell)
+            client.upload_file(path, *split_uri(uri))
+            return cell, stats[cell], uri, os.path.getsize(path)
+
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            tiles = list(pool.map(upload, sorted(stats)))
+
+    with conn, conn.cursor() as cur:
+        stale = register(cur, variant_id, plan.scheme, srid, tiles)
+    for uri in stale:
+        client.delete_object(**dict(zip(("Bucket", "Key"), split_uri(uri))))
+    logger.info(
+        f"✅ {source_uri}: registered {len(tiles):,} tiles, removed {len(stale):,} old ones "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return len(tiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split point clouds into registered LAZ tiles")
+    parser.add_argument("variant_ids", type=int, nargs="+", help="pointclouds.PointClouds VariantIDs")
+    parser.add_argument("--scheme", choices=["grid", "octree"], default="grid", help="Tiling scheme")
+    parser.add_argument("--tile-size", type=float, default=20.0, help="Grid tile size in source CRS units")
+    parser.add_argument("--max-points", type=int, default=5_000_000, help="Octree: most points per tile")
+    parser.add_argument("--max-depth", type=int, default=8, help="Octree: deepest level")
+    parser.add_argument("--srid", type=int, default=DEFAULT_SRID, help="EPSG code for files without CRS records")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel tile uploads")
+    parser.add_argument("--work-dir", help="Scratch directory for the download and tiles (default: system temp)")
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT, help="S3 endpoint")
+    parser.add_argument("--dsn", help="Connection string (default: DB_* environment variables)")
+    args = parser.parse_args()
+    if not 0 <= args.max_depth <= MAX_OCTREE_DEPTH:
+        parser.error(f"--max-depth must be between 0 and {MAX_OCTREE_DEPTH}")
+
+    client = s3_client(args.endpoint, args.workers)
+    conn = connect(args.dsn)
+    failed = 0
+    try:
+        for variant_id in args.variant_ids:
+            try:
+                tile_variant(conn, client, variant_id, args)
+            except Exception as e:
+                failed += 1
+                logger.error(f"❌ Variant {variant_id}: {e}")
+    finally:
+        conn.close()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()